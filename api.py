@@ -0,0 +1,423 @@
+# api.py
+# JSON API: health check, hospital listings and search, availability (single,
+# batch and push stream), nearest free bed, bookings (including batched
+# reservations for dispatch), admin tools.
+import hashlib
+import json
+import time
+
+from flask import Blueprint, current_app, request, jsonify, abort, Response, stream_with_context
+from flask_login import login_required, current_user
+
+from models import db, BED_TYPES, Hospital, Booking
+from cache import hospital_cache
+from pagination import clamp_limit, InvalidCursor
+from feed import availability_feed, RESYNC
+from bedindex import bed_index
+from geo import geo_index
+from lifecycle import TransitionError
+from reservations import reserve_batch
+from querycount import query_budget
+from dbrouting import read_replica
+from rendering import fragment_cache
+from listings import hospital_page, booking_page, live_hospital
+import auth
+import lifecycle
+import rollups
+import search
+
+bp = Blueprint("api", __name__)
+
+
+# --- HEALTH CHECK ---
+@bp.route("/ping")
+def ping():
+    return jsonify({"status": "ok", "app": "hospital_bed_system"}), 200
+
+
+@bp.route("/api/hospitals")
+@read_replica
+def api_hospitals():
+    view = "all" if request.args.get("order") == "id" else "index"
+    try:
+        hospitals, next_cursor = hospital_page(view, request.args.get("city"), request.args.get("cursor"),
+                                               clamp_limit(request.args.get("limit")))
+    except InvalidCursor:
+        return jsonify({"error": "invalid cursor"}), 400
+    return jsonify({
+        "hospitals": [{k: v for k, v in h.items() if k != "created_at"} for h in hospitals],
+        "next_cursor": next_cursor,
+    })
+
+
+@bp.route("/api/hospitals/search")
+@read_replica
+def api_hospital_search():
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 20, type=int)
+    rows, has_next = search.search_hospitals(
+        city=request.args.get("city"), q=request.args.get("q"), page=page, per_page=per_page
+    )
+    return jsonify({
+        "page": page,
+        "has_next": has_next,
+        "hospitals": [
+            {"id": h.id, "name": h.name, "city": h.city, "address": h.address,
+             **{t: getattr(h, f"{t}_available") or 0 for t in BED_TYPES}}
+            for h in rows
+        ],
+    })
+
+
+# API: realtime availability
+@bp.route("/api/hospital/<int:id>/availability")
+@read_replica
+@query_budget(1)
+def api_availability(id):
+    # name from the snapshot cache, counters from the shared index: no query once both are warm
+    h = live_hospital(id)
+    if not h:
+        return jsonify({"error": "hospital not found"}), 404
+    return jsonify({
+        "id": h["id"],
+        "name": h["name"],
+        "icu": h["icu_available"] or 0,
+        "oxygen": h["oxygen_available"] or 0,
+        "normal": h["normal_available"] or 0,
+        "ventilator": h["ventilator_available"] or 0,
+    })
+
+
+@bp.route("/api/cache/stats")
+@login_required
+def api_cache_stats():
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(dict(hospital_cache.stats(), fragments=fragment_cache.stats()))
+
+
+# API: batch availability + push stream
+
+def parse_id_list(raw):
+    """Parse "1,2,3" into a list of ints, ignoring junk."""
+    ids = []
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if part.isdigit():
+            ids.append(int(part))
+    return ids
+
+
+def availability_snapshot(ids=None, city=None):
+    """Return {hospital_id: {bed_type: available}}.
+
+    Counters come from the shared bed index; a city scope only costs the query
+    that resolves it to ids. Ids the index doesn't know fall back to a
+    column-only query (no ORM objects).
+    """
+    if city:
+        q = db.session.query(Hospital.id)
+        if ids:
+            q = q.filter(Hospital.id.in_(ids))
+        ids = [row[0] for row in search.filter_city(q, city).all()]
+    snapshot = bed_index.availability(ids)
+    missing = [hid for hid in ids if hid not in snapshot]
+    if missing:
+        cols = [getattr(Hospital, f"{t}_available") for t in BED_TYPES]
+        rows = db.session.query(Hospital.id, *cols).filter(Hospital.id.in_(missing)).all()
+        snapshot.update((row[0], {t: row[i + 1] or 0 for i, t in enumerate(BED_TYPES)}) for row in rows)
+    return snapshot
+
+
+def availability_version(snapshot):
+    """Stable short hash of a snapshot, used as ETag and SSE event id."""
+    payload = json.dumps(sorted(snapshot.items()), separators=(",", ":"))
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def availability_diff(old, new):
+    """Only the counters that changed between two snapshots."""
+    changed = {}
+    for hid, counts in new.items():
+        prev = old.get(hid, {})
+        delta = {t: v for t, v in counts.items() if prev.get(t) != v}
+        if delta:
+            changed[hid] = delta
+    return changed
+
+
+def availability_scope():
+    """Read ids/city from the query string; returns (ids, city, error_response)."""
+    ids = parse_id_list(request.args.get("ids"))
+    city = request.args.get("city")
+    if not ids and not city:
+        return None, None, (jsonify({"error": "ids or city required"}), 400)
+    if len(ids) > current_app.config["AVAILABILITY_BATCH_LIMIT"]:
+        return None, None, (jsonify({"error": "too many ids"}), 400)
+    return ids, city, None
+
+
+@bp.route("/api/availability")
+@read_replica
+@query_budget(3)  # city scope: prefix probe + id lookup; ids alone run none once indexed
+def api_availability_batch():
+    ids, city, error = availability_scope()
+    if error:
+        return error
+    snapshot = availability_snapshot(ids, city)
+    version = availability_version(snapshot)
+    resp = jsonify({"version": version, "hospitals": snapshot})
+    resp.set_etag(version)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+
+def sse_event(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+@bp.route("/api/availability/stream")
+@read_replica
+def api_availability_stream():
+    if not current_app.config["AVAILABILITY_STREAM"]:
+        # sync/gthread workers: a stream would hold the worker; clients poll /api/availability
+        return jsonify({"error": "streaming disabled on this server; poll /api/availability"}), 503
+    ids, city, error = availability_scope()
+    if error:
+        return error
+    last_version = request.headers.get("Last-Event-ID") or request.args.get("since")
+    deadline = time.monotonic() + current_app.config["AVAILABILITY_STREAM_TIMEOUT"]
+    # subscribe before reading the scope so no change can slip in between
+    seq = availability_feed.subscribe()
+    if city:
+        q = search.filter_city(db.session.query(Hospital.id), city)
+        if ids:
+            q = q.filter(Hospital.id.in_(ids))
+        ids = [hid for (hid,) in q.all()]
+    # the loop below only talks to the in-process feed; give the connection back now
+    db.session.remove()
+    scope = set(ids)
+
+    def generate():
+        nonlocal seq
+        try:
+            yield "retry: 3000\n\n"
+            snapshot = availability_feed.view(scope)
+            version = availability_version(snapshot)
+            # client reconnecting with the current version already has everything
+            if version != last_version:
+                yield sse_event("snapshot", {"version": version, "hospitals": snapshot}, version)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                seq, changes = availability_feed.wait(seq, min(15, remaining))
+                if changes is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if changes == RESYNC:
+                    changes = availability_feed.view(scope)
+                changed = availability_diff(snapshot, {h: c for h, c in changes.items() if h in scope})
+                if changed:
+                    for hid, delta in changed.items():
+                        snapshot.setdefault(hid, {}).update(delta)
+                    version = availability_version(snapshot)
+                    yield sse_event("update", {"version": version, "hospitals": changed}, version)
+        finally:
+            availability_feed.unsubscribe()
+
+    resp = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+# API: nearest free bed
+@bp.route("/api/beds/nearest")
+@read_replica
+@query_budget(3)  # dirty-row reload + result details (+ user)
+def api_beds_nearest():
+    config = current_app.config
+    bed_type = request.args.get("type", "icu")
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    k = request.args.get("k", 5, type=int)
+    radius = request.args.get("radius_km", config["GEO_MAX_RADIUS_KM"], type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"error": "lat and lon required (degrees)"}), 400
+    if bed_type not in BED_TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(BED_TYPES)}"}), 400
+    if not 1 <= k <= config["GEO_MAX_K"]:
+        return jsonify({"error": f"k must be between 1 and {config['GEO_MAX_K']}"}), 400
+    radius = max(0.0, min(radius, config["GEO_MAX_RADIUS_KM"]))
+
+    found = geo_index.nearest(lat, lon, k, availability_snapshot, bed_type, radius)
+    rows = {}
+    if found:
+        rows = {r.id: r for r in db.session.query(
+            Hospital.id, Hospital.name, Hospital.city, Hospital.address, Hospital.contact,
+            Hospital.latitude, Hospital.longitude,
+        ).filter(Hospital.id.in_([hid for _, hid, _ in found]))}
+    return jsonify({
+        "type": bed_type,
+        "hospitals": [
+            {"id": hid, "name": rows[hid].name, "city": rows[hid].city, "address": rows[hid].address,
+             "contact": rows[hid].contact, "latitude": rows[hid].latitude, "longitude": rows[hid].longitude,
+             "distance_km": round(distance, 2), "available": free}
+            for distance, hid, free in found if hid in rows
+        ],
+    })
+
+
+# BOOKINGS
+@bp.route("/api/my_bookings")
+@read_replica
+@login_required
+def api_my_bookings():
+    try:
+        bookings, next_cursor = booking_page(current_user.id, request.args.get("cursor"),
+                                             clamp_limit(request.args.get("limit")))
+    except InvalidCursor:
+        return jsonify({"error": "invalid cursor"}), 400
+    return jsonify({
+        "bookings": [
+            {"id": b.id, "hospital_id": b.hospital_id, "bed_type": b.bed_type, "status": b.status,
+             "created_at": b.created_at.isoformat() if b.created_at else None}
+            for b in bookings
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+def json_body():
+    """JSON request body; JSON-only POSTs can't be forged by a plain cross-site form."""
+    if not request.is_json:
+        abort(415)
+    return request.get_json(silent=True) or {}
+
+
+# name -> max length of the optional booking fields a batch item may carry
+BOOKING_FIELDS = {"name": 150, "contact": 50, "symptoms": 2000, "id_proof": 255}
+
+
+def booking_item(raw):
+    """Validate one batch item; returns (item, error)."""
+    if not isinstance(raw, dict):
+        return None, "item must be an object"
+    key = raw.get("key")
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        return None, "key must be a string of 1-64 characters"
+    hospital_id, doctor_id = raw.get("hospital_id"), raw.get("doctor_id")
+    if not isinstance(hospital_id, int) or isinstance(hospital_id, bool):
+        return None, "hospital_id must be an integer"
+    if raw.get("bed_type") not in BED_TYPES:
+        return None, "bed_type must be one of " + ", ".join(BED_TYPES)
+    if doctor_id is not None and (not isinstance(doctor_id, int) or isinstance(doctor_id, bool)):
+        return None, "doctor_id must be an integer"
+    fields = {}
+    for name, max_len in BOOKING_FIELDS.items():
+        value = raw.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, str) or len(value) > max_len:
+            return None, f"{name} must be a string of at most {max_len} characters"
+        fields[name] = value
+    return {"key": key, "hospital_id": hospital_id, "bed_type": raw["bed_type"],
+            "doctor_id": doctor_id, "fields": fields}, None
+
+
+@bp.route("/api/bookings/batch", methods=["POST"])
+@login_required
+@query_budget(600)  # worst case: BOOKING_BATCH_LIMIT items at as many hospitals, ~6 statements each
+def api_booking_batch():
+    """Reserve many beds in one call: {"items": [{"key", "hospital_id", "bed_type", ...}]}.
+
+    Each item gets its own result ("created", "replayed" or "failed"); a
+    failed item doesn't fail the batch. Resending a batch is safe: items whose
+    key already has a booking return it instead of booking again. Dispatch and
+    partner integrations only: admin accounts.
+    """
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    raw = json_body().get("items")
+    if not isinstance(raw, list) or not raw:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(raw) > current_app.config["BOOKING_BATCH_LIMIT"]:
+        return jsonify({"error": f"at most {current_app.config['BOOKING_BATCH_LIMIT']} items per batch"}), 400
+    results, valid = [None] * len(raw), []
+    for n, entry in enumerate(raw):
+        item, error = booking_item(entry)
+        if error:
+            key = entry.get("key") if isinstance(entry, dict) else None
+            results[n] = {"key": key, "outcome": "failed", "error": error}
+        else:
+            valid.append((n, item))
+    for (n, _), result in zip(valid, reserve_batch(current_user.id, [item for _, item in valid])):
+        results[n] = result
+    counts = {outcome: sum(r["outcome"] == outcome for r in results) for outcome in ("created", "replayed", "failed")}
+    return jsonify({"results": results, **counts})
+
+
+@bp.route("/api/bookings/<int:booking_id>/<any(cancel, discharge):action>", methods=["POST"])
+@login_required
+@query_budget(20)  # includes waitlist allocation for the freed bed
+def api_booking_transition(booking_id, action):
+    json_body()
+    b = Booking.query.get_or_404(booking_id)
+    allowed = auth.can_manage_booking(b) or (action == "cancel" and b.patient_id == current_user.id)
+    if not allowed:
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        lifecycle.transition(b.id, "cancelled" if action == "cancel" else "discharged")
+    except TransitionError as e:
+        return jsonify({"error": e.message}), 409
+    return jsonify({"id": b.id, "status": b.status})
+
+
+@bp.route("/api/hospital/<int:id>/discharge", methods=["POST"])
+@login_required
+@query_budget(20)
+def api_discharge_ward(id):
+    """Bulk discharge: {"bed_type": "icu", "booking_ids": [...optional...]}."""
+    data = json_body()
+    h = Hospital.query.get_or_404(id)
+    if not (current_user.role == "admin" or (current_user.role == "hospital" and current_user.hospital_id == h.id)):
+        return jsonify({"error": "forbidden"}), 403
+    bed_type = data.get("bed_type")
+    if bed_type not in BED_TYPES:
+        return jsonify({"error": "bed_type must be one of " + ", ".join(BED_TYPES)}), 400
+    ids = data.get("booking_ids")
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, int) for i in ids)):
+        return jsonify({"error": "booking_ids must be a list of integers"}), 400
+    n = lifecycle.discharge_ward(h.id, bed_type, ids)
+    return jsonify({"hospital_id": h.id, "bed_type": bed_type, "discharged": n})
+
+
+@bp.route("/api/admin/reconcile", methods=["GET", "POST"])
+@login_required
+def api_reconcile():
+    """GET reports drift; POST (JSON) also fixes it."""
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    fix = request.method == "POST"
+    if fix:
+        json_body()
+    drift = lifecycle.reconcile(fix=fix)
+    return jsonify({"fixed": fix, "drift": drift})
+
+
+# ADMIN ANALYTICS
+@bp.route("/api/admin/analytics")
+@login_required
+@query_budget(20)
+def api_admin_analytics():
+    if current_user.role != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    hours = min(max(request.args.get("hours", 48, type=int), 1), 24 * 14)
+    rollups.compact_if_stale(current_app.config["ROLLUP_MAX_AGE"])
+    return jsonify(rollups.dashboard(hours))
@@ -0,0 +1,227 @@
+# auth.py
+# Authentication helpers: cached session users and password hashing.
+#
+# Session users: Flask-Login's user_loader runs on every authenticated
+# request. Instead of a User row per request, load_user() returns a
+# SessionUser (id, name, email, role, hospital_id - what views and templates
+# read) from a small TTL + LRU cache. Committed changes to a user's role,
+# hospital, email or password invalidate the entry, locally and on the cache
+# bus (CACHE_BUS_URL, channel "user-cache") for other workers; without a shared
+# bus other workers see the change after AUTH_CACHE_TTL seconds. Code that
+# modifies the logged-in user loads the User row explicitly.
+#
+# Passwords: PASSWORD_HASH_METHOD picks werkzeug's method and cost (e.g.
+# "scrypt:16384:8:1", "pbkdf2:sha256:600000"). With AUTH_REHASH_ON_LOGIN=1 a
+# successful login re-hashes a password stored with different parameters.
+# Hashing is deliberately expensive, so each process runs at most
+# AUTH_HASH_CONCURRENCY hashes at once; a login burst queues behind them
+# instead of starving every other request of CPU.
+#
+# Emails are stored stripped and lower-cased and looked up by plain equality on
+# the unique index (legacy mixed-case rows are matched too), so the lookup
+# never needs a case-folding function or collation conversion on the column.
+import os
+import threading
+import uuid
+
+from flask_login import LoginManager, UserMixin, current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from models import db, User
+from cache import TTLCache, LocalBus, make_bus
+import dbrouting
+
+SESSION_FIELDS = ("id", "name", "email", "role", "hospital_id")
+# changes to these must reach cached session users (password: so a reset isn't masked)
+WATCHED_FIELDS = ("name", "email", "role", "hospital_id", "password")
+
+
+class SessionUser(UserMixin):
+    """Detached, read-only view of the logged-in user."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return f"<SessionUser {self.id} {self.role}>"
+
+
+class UserCache:
+    def __init__(self, maxsize=4096, ttl=30.0):
+        self.store = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.origin = uuid.uuid4().hex
+        self.generation = 0
+        self.enabled = True
+        self.bus = LocalBus()
+
+    def init_app(self, app):
+        app.config.setdefault("AUTH_CACHE", os.environ.get("AUTH_CACHE", "1") == "1")
+        app.config.setdefault("AUTH_CACHE_TTL", float(os.environ.get("AUTH_CACHE_TTL", 30)))
+        app.config.setdefault("AUTH_CACHE_SIZE", int(os.environ.get("AUTH_CACHE_SIZE", 4096)))
+        self.enabled = app.config["AUTH_CACHE"]
+        self.store.ttl = app.config["AUTH_CACHE_TTL"]
+        self.store.maxsize = app.config["AUTH_CACHE_SIZE"]
+        self.bus = make_bus(app.config.get("CACHE_BUS_URL"), channel="user-cache")
+        self.bus.subscribe(self._on_message)
+
+    def get(self, user_id, loader):
+        value = self.store.get(user_id) if self.enabled else None
+        if value is None:
+            generation = self.generation
+            value = loader(user_id)
+            if value is not None and self.enabled and generation == self.generation:
+                self.store.set(user_id, value)
+        return value
+
+    def invalidate(self, user_id):
+        self._apply({"id": user_id})
+        try:
+            self.bus.publish({"id": user_id, "origin": self.origin})
+        except Exception:
+            pass  # entries still expire after AUTH_CACHE_TTL
+
+    def _on_message(self, message):
+        if message.get("origin") != self.origin:
+            self._apply(message)
+
+    def _apply(self, message):
+        self.generation += 1
+        self.store.delete(message["id"])
+
+    def after_fork(self):
+        self.origin = uuid.uuid4().hex  # see HospitalCache.after_fork
+        self.bus.after_fork()
+
+    def stats(self):
+        return self.store.stats()
+
+
+user_cache = UserCache()
+login_manager = LoginManager()
+login_manager.login_view = "pages.login"
+
+
+def _load_session_user(user_id):
+    with dbrouting.primary():  # a lagging replica must not resurrect an old role
+        row = db.session.query(*[getattr(User, f) for f in SESSION_FIELDS]).filter(User.id == user_id).first()
+    return dict(row._mapping) if row else None
+
+
+def load_user(user_id):
+    fields = user_cache.get(user_id, _load_session_user)
+    return SessionUser(**fields) if fields else None
+
+
+@login_manager.user_loader
+def _session_user(user_id):
+    try:
+        return load_user(int(user_id))
+    except Exception:
+        return None
+
+
+def can_manage_booking(b):
+    """Admins, or staff of the booking's hospital."""
+    return current_user.role == "admin" or (
+        current_user.role == "hospital" and current_user.hospital_id == b.hospital_id
+    )
+
+
+# --- invalidation: after commit, so a concurrent reload can't cache the old row ---
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[f].history.has_changes() for f in WATCHED_FIELDS):
+        _mark(target)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _mark(target)
+
+
+def _mark(target):
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault("auth_dirty_users", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop("auth_dirty_users", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("auth_dirty_users", None)
+
+
+# --- emails ---
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def find_user_by_email(email):
+    """User with this email (stored normalized; legacy rows may keep their original case)."""
+    normalized = normalize_email(email)
+    candidates = {normalized, (email or "").strip()}
+    return User.query.filter(User.email.in_(candidates)).order_by(User.id).first()
+
+
+# --- passwords ---
+class PasswordHasher:
+    def __init__(self):
+        self.method = "scrypt"
+        self.rehash = False
+        self._slots = threading.BoundedSemaphore(1)
+        self._prefix = None
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_METHOD", os.environ.get("PASSWORD_HASH_METHOD", "scrypt"))
+        app.config.setdefault("AUTH_REHASH_ON_LOGIN", os.environ.get("AUTH_REHASH_ON_LOGIN", "0") == "1")
+        app.config.setdefault("AUTH_HASH_CONCURRENCY", int(os.environ.get("AUTH_HASH_CONCURRENCY", 1)))
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.rehash = app.config["AUTH_REHASH_ON_LOGIN"]
+        self._slots = threading.BoundedSemaphore(max(1, app.config["AUTH_HASH_CONCURRENCY"]))
+        self._prefix = None
+
+    def hash(self, password):
+        with self._slots:
+            return generate_password_hash(password, method=self.method)
+
+    def verify(self, stored, password):
+        with self._slots:
+            return check_password_hash(stored, password)
+
+    @property
+    def prefix(self):
+        """The method/cost part ("scrypt:32768:8:1") of hashes made with the current settings."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash("", method=self.method).split("$", 1)[0]
+        return self._prefix
+
+    def needs_rehash(self, stored):
+        return stored.split("$", 1)[0] != self.prefix
+
+
+hasher = PasswordHasher()
+
+
+def authenticate(email, password):
+    """The User for these credentials, or None; upgrades the stored hash if configured to."""
+    user = find_user_by_email(email)
+    if user is None or not hasher.verify(user.password, password):
+        return None
+    if hasher.rehash and hasher.needs_rehash(user.password):
+        user.password = hasher.hash(password)
+        db.session.commit()
+    return user
+
+
+def init_app(app):
+    login_manager.init_app(app)
+    user_cache.init_app(app)
+    hasher.init_app(app)
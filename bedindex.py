@@ -0,0 +1,335 @@
+# bedindex.py
+# Compact bed-count index shared by all workers through a memory-mapped file.
+#
+# The availability API and the listing counters only need eight small
+# integers per hospital (total and available per bed type). They live in a
+# flat int32 array indexed by hospital id:
+#
+#   header  [magic, layout, capacity, boot, built_at, 0, 0, 0]
+#   record  [seq, present, icu_total, ..., ventilator_total, icu_available, ..., ventilator_available]
+#
+# so a lookup is an offset computation and a few int reads - no DB round
+# trip, no ORM object. Every gunicorn worker maps the same file
+# (BED_INDEX_PATH), so one process's update is immediately visible to all.
+#
+# Updates ride the hospital cache invalidation bus, which every booking,
+# cancel/discharge, capacity edit and ingest already publishes to after
+# commit: the record is re-read from the primary while holding a lock on its
+# byte range, so concurrent refreshes can't leave an older value behind
+# (whoever reads last has seen every earlier commit) while refreshes of other
+# hospitals go ahead. Rebuilds and growing the file lock the whole file. Readers use a per-record seqlock: the
+# writer makes seq odd while it writes and even again afterwards, and a reader
+# retries if it saw an odd or changed seq.
+#
+# The index is rebuilt from the DB the first time a new server generation
+# (gunicorn master, i.e. our parent pid) opens it, on "invalidate all" events
+# (bulk ingestion) and once it is BED_INDEX_RESYNC seconds old - which also
+# catches writes the bus never saw: other hosts on a LocalBus, manual SQL,
+# `flask bookings reconcile --fix`. `flask bedindex check [--fix]` compares it
+# with the hospitals table.
+#
+# The file sits next to a SQLite database (so a benchmark's throwaway database
+# takes its index with it) and in the instance folder otherwise.
+import hashlib
+import mmap
+import os
+import threading
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+
+from models import db, BED_TYPES, Hospital
+from cache import hospital_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows dev server: single process, the thread lock is enough
+    fcntl = None
+
+MAGIC = 0x53444542  # "BEDS"
+LAYOUT = 1
+HEADER = 8
+FIELDS = [f"{t}_total" for t in BED_TYPES] + [f"{t}_available" for t in BED_TYPES]
+STRIDE = 2 + len(FIELDS)
+INT = 4
+MIN_CAPACITY = 1024
+
+
+class BedIndex:
+    def __init__(self):
+        self.app = None
+        self.path = None
+        self._fd = None
+        self._mm = None
+        self._ints = None
+        self._capacity = 0
+        self._resync_after = 0.0  # backoff after a failed resync
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        enabled = os.environ.get("BED_INDEX", "1") == "1"
+        app.config.setdefault("BED_INDEX", enabled)
+        hospital_cache.live_counts = app.config["BED_INDEX"]
+        if not app.config["BED_INDEX"]:
+            return
+        app.config.setdefault("BED_INDEX_RESYNC", float(os.environ.get("BED_INDEX_RESYNC", 60)))
+        # one file per database, so a benchmark's temp DB never reads the real index
+        uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        digest = hashlib.sha1(uri.encode()).hexdigest()[:12]
+        url = make_url(uri)
+        folder = app.instance_path
+        if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+            folder = os.path.dirname(os.path.join(app.instance_path, url.database))
+        app.config.setdefault("BED_INDEX_PATH", os.environ.get(
+            "BED_INDEX_PATH", os.path.join(folder, f"bed_index.{digest}.bin")))
+        self.app = app
+        self.path = app.config["BED_INDEX_PATH"]
+        hospital_cache.bus.subscribe(self._on_invalidate)
+        app.cli.add_command(bedindex_cli)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    # --- file handling ---
+    def _flock(self, exclusive, start=0, length=0):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN, length, start)
+
+    def _map(self):
+        size = os.fstat(self._fd).st_size
+        self._mm = mmap.mmap(self._fd, size)
+        self._ints = memoryview(self._mm).cast("i")
+        self._capacity = self._ints[2]
+
+    def _open(self):
+        """Map the file, creating or rebuilding it for a new server generation."""
+        if self._ints is not None:
+            return
+        with self._lock:
+            if self._ints is not None:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._flock(True)
+            try:
+                if os.fstat(self._fd).st_size < HEADER * INT:
+                    os.ftruncate(self._fd, (HEADER + MIN_CAPACITY * STRIDE) * INT)
+                self._map()
+                h = self._ints
+                if h[0] != MAGIC or h[1] != LAYOUT or h[3] != os.getppid():
+                    h[0], h[1], h[2], h[3] = MAGIC, LAYOUT, (len(h) - HEADER) // STRIDE, os.getppid()
+                    self._capacity = h[2]
+                    self._rebuild_locked()
+            finally:
+                self._flock(False)
+
+    def _ensure_capacity(self, hospital_id):
+        """Grow the file (under the whole-file lock) so hospital_id fits; remap if another worker grew it."""
+        if hospital_id < self._capacity:
+            return
+        if hospital_id < self._ints[2]:
+            self._map()
+            return
+        capacity = self._capacity
+        while capacity <= hospital_id:
+            capacity *= 2
+        os.ftruncate(self._fd, (HEADER + capacity * STRIDE) * INT)
+        # the old mapping stays valid for readers still holding it; it is freed with them
+        self._map()
+        self._ints[2] = self._capacity = capacity
+
+    # --- reads ---
+    def get(self, hospital_id):
+        """{field: value} for one hospital, or None if it isn't indexed."""
+        if not self.enabled or hospital_id < 0:
+            return None
+        self._open()
+        self._resync_if_due()
+        if hospital_id >= self._capacity:
+            if hospital_id >= self._ints[2]:
+                return None
+            with self._lock:
+                self._map()
+        ints = self._ints
+        base = HEADER + hospital_id * STRIDE
+        for _ in range(100):
+            seq = ints[base]
+            if seq & 1:
+                continue
+            present = ints[base + 1]
+            values = ints[base + 2:base + STRIDE].tolist()
+            if ints[base] == seq:
+                return dict(zip(FIELDS, values)) if present else None
+        return None  # a writer kept the record busy; callers fall back to the DB
+
+    def availability(self, ids):
+        """{hospital_id: {bed_type: available}} for the indexed ids; missing ids are left out."""
+        out = {}
+        for hid in ids:
+            rec = self.get(hid)
+            if rec is not None:
+                out[hid] = {t: rec[f"{t}_available"] for t in BED_TYPES}
+        return out
+
+    def overlay(self, snapshot):
+        """Copy of a cached hospital snapshot with live counters from the index."""
+        rec = self.get(snapshot["id"]) if snapshot else None
+        return dict(snapshot, **rec) if rec else snapshot
+
+    # --- writes ---
+    def _write(self, hospital_id, row):
+        self._ensure_capacity(hospital_id)
+        ints = self._ints
+        base = HEADER + hospital_id * STRIDE
+        ints[base] += 1
+        if row is None:
+            ints[base + 1] = 0
+        else:
+            for i, f in enumerate(FIELDS):
+                ints[base + 2 + i] = row[f] or 0
+            ints[base + 1] = 1
+        ints[base] += 1
+
+    def _load(self, conn, ids=None):
+        q = select(Hospital.id, *[getattr(Hospital, f) for f in FIELDS])
+        if ids is not None:
+            q = q.where(Hospital.id.in_(ids))
+        return conn.execute(q)
+
+    def refresh(self, ids):
+        """Re-read these hospitals from the primary and store them."""
+        if not self.enabled:
+            return
+        self._open()
+        ids = sorted(set(ids))
+        if not ids:
+            return
+        with self._lock:
+            if ids[-1] >= self._capacity:
+                self._flock(True)  # growing (or remapping) needs the whole file
+                try:
+                    self._ensure_capacity(ids[-1])
+                finally:
+                    self._flock(False)
+            # just these records' bytes, in id order so two refreshes can't deadlock;
+            # a rebuild's whole-file lock still excludes them
+            ranges = [((HEADER + hid * STRIDE) * INT, STRIDE * INT) for hid in ids]
+            locked = []
+            try:
+                for start, length in ranges:
+                    self._flock(True, start, length)
+                    locked.append((start, length))
+                with self.app.app_context(), db.engine.connect() as conn:
+                    rows = {r.id: r._mapping for r in self._load(conn, ids)}
+                for hid in ids:
+                    self._write(hid, rows.get(hid))
+            finally:
+                for start, length in locked:
+                    self._flock(False, start, length)
+
+    def _rebuild_locked(self):
+        seen = set()
+        with self.app.app_context(), db.engine.connect() as conn:
+            for r in self._load(conn).yield_per(5000):
+                self._write(r.id, r._mapping)
+                seen.add(r.id)
+        ints = self._ints
+        for hid in range(self._capacity):
+            if ints[HEADER + hid * STRIDE + 1] and hid not in seen:
+                self._write(hid, None)
+        ints[4] = int(time.time())
+
+    def rebuild(self):
+        if not self.enabled:
+            return
+        self._open()
+        with self._lock:
+            self._flock(True)
+            try:
+                self._rebuild_locked()
+            finally:
+                self._flock(False)
+
+    def _resync_due(self):
+        resync = self.app.config["BED_INDEX_RESYNC"]
+        return resync > 0 and time.time() - self._ints[4] > resync and time.monotonic() > self._resync_after
+
+    def _resync_if_due(self):
+        """Rebuild once the index is BED_INDEX_RESYNC seconds old; the first worker to notice does it."""
+        if not self._resync_due() or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._flock(True)
+            try:
+                if self._resync_due():  # another worker may have just rebuilt it
+                    self._rebuild_locked()
+            finally:
+                self._flock(False)
+        except Exception:
+            # keep serving the old counters and try again in a while
+            self._resync_after = time.monotonic() + self.app.config["BED_INDEX_RESYNC"]
+            self.app.logger.exception("bed index resync failed")
+        finally:
+            self._lock.release()
+
+    def _on_invalidate(self, message):
+        try:
+            if message.get("op") == "hospital":
+                self.refresh([message["id"]])
+            else:
+                self.rebuild()
+        except Exception:
+            # never fail the write that triggered this; `flask bedindex check --fix` repairs
+            self.app.logger.exception("bed index refresh failed")
+
+    # --- consistency ---
+    def check(self, fix=False):
+        """Compare every indexed record with the hospitals table; returns a list of mismatches."""
+        self._open()
+        mismatches = []
+        seen = set()
+        with self.app.app_context(), db.engine.connect() as conn:
+            for r in self._load(conn).yield_per(5000):
+                seen.add(r.id)
+                rec = self.get(r.id)
+                expected = {f: r._mapping[f] or 0 for f in FIELDS}
+                if rec != expected:
+                    mismatches.append({"hospital_id": r.id, "index": rec, "db": expected})
+        for hid in range(self._capacity):
+            if hid not in seen and self.get(hid) is not None:
+                mismatches.append({"hospital_id": hid, "index": self.get(hid), "db": None})
+        if fix and mismatches:
+            self.refresh([m["hospital_id"] for m in mismatches])
+        return mismatches
+
+
+bed_index = BedIndex()
+
+
+@click.group("bedindex")
+def bedindex_cli():
+    """Shared bed-count index."""
+
+
+@bedindex_cli.command("rebuild")
+@with_appcontext
+def rebuild_command():
+    """Reload every hospital's counters from the database."""
+    started = time.perf_counter()
+    bed_index.rebuild()
+    click.echo(f"rebuilt {bed_index.path} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+@bedindex_cli.command("check")
+@click.option("--fix", is_flag=True, help="refresh mismatched records from the database")
+@with_appcontext
+def check_command(fix):
+    """Compare the index with the hospitals table."""
+    mismatches = bed_index.check(fix=fix)
+    for m in mismatches[:50]:
+        click.echo(f"hospital {m['hospital_id']}: index={m['index']} db={m['db']}")
+    click.echo(f"{len(mismatches)} mismatched records{' fixed' if fix and mismatches else ''}")
@@ -0,0 +1,89 @@
+# bench_auth.py
+# Cost of the authentication path: per-request user loading and login hashing.
+#
+#   python bench_auth.py --requests 2000
+#   python bench_auth.py --methods scrypt,scrypt:16384:8:1,pbkdf2:sha256:600000
+#
+# Part 1 requests the home page (whose layout reads current_user) anonymously
+# and as a logged-in user, with the session-user cache (auth.py) off and on;
+# the difference to the anonymous run is the per-request auth overhead.
+# Part 2 times one login (hash check) per PASSWORD_HASH_METHOD.
+# Without DATABASE_URL a throwaway SQLite file is used.
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+if not os.environ.get("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="bench_auth_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["QUERY_STATS_HEADERS"] = "1"
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app import app, db, User, Hospital
+from auth import user_cache
+
+PASSWORD = "bench-pass"
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        if not User.query.filter_by(email="bench@example.com").first():
+            db.session.add(User(name="Bench", email="bench@example.com", role="patient",
+                                password=generate_password_hash(PASSWORD)))
+            db.session.add(Hospital(name="Bench Hospital", city="Pune", icu_total=5, icu_available=5))
+            db.session.commit()
+
+
+def drive(client, path, n):
+    samples, queries = [], []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resp = client.get(path)
+        samples.append((time.perf_counter() - t0) * 1000)
+        queries.append(int(resp.headers.get("X-Query-Count", 0)))
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)], statistics.mean(queries)
+
+
+def main(args):
+    seed()
+    path = "/"
+    anonymous = app.test_client()
+    drive(anonymous, path, 50)
+    results = {"anonymous": drive(anonymous, path, args.requests)}
+    app.config["WTF_CSRF_ENABLED"] = False
+    for enabled in (False, True):
+        user_cache.enabled = enabled
+        client = app.test_client()
+        resp = client.post("/login", data={"email": "bench@example.com", "password": PASSWORD})
+        assert resp.status_code == 302, "login failed"
+        drive(client, path, 50)
+        results[f"logged in, cache {'on' if enabled else 'off'}"] = drive(client, path, args.requests)
+    user_cache.enabled = app.config["AUTH_CACHE"]
+
+    base = results["anonymous"][0]
+    print(f"database: {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}  requests: {args.requests}")
+    print(f"{'client':<24}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'auth ms':>9}")
+    for name, (p50, p95, q) in results.items():
+        print(f"{name:<24}{p50:>9.3f}{p95:>9.3f}{q:>9.1f}{p50 - base:>9.3f}")
+
+    print(f"\n{'PASSWORD_HASH_METHOD':<26}{'login ms':>10}{'logins/s/core':>15}")
+    for method in args.methods.split(","):
+        stored = generate_password_hash(PASSWORD, method=method)
+        t0 = time.perf_counter()
+        for _ in range(args.logins):
+            check_password_hash(stored, PASSWORD)
+        ms = (time.perf_counter() - t0) * 1000 / args.logins
+        print(f"{stored.split('$', 1)[0]:<26}{ms:>10.1f}{1000 / ms:>15.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Authentication path benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--logins", type=int, default=10, help="hash checks per method")
+    parser.add_argument("--methods", default="scrypt,scrypt:16384:8:1,pbkdf2:sha256:600000,pbkdf2:sha256:100000")
+    main(parser.parse_args())
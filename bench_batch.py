@@ -0,0 +1,135 @@
+# bench_batch.py
+# Booking throughput: the HTML form (one bed per POST /book/<id>) against the
+# batch API (POST /api/bookings/batch).
+#
+#   python bench_batch.py --bookings 2000 --batch-size 50 --concurrency 4
+#   DATABASE_URL=mysql+mysqlconnector://... python bench_batch.py
+#
+# Seeds hospitals with bench_routes.seed(), logs `--concurrency` sessions in
+# through the real form and makes --bookings bookings each way, spread over
+# random hospitals (the sessions are admin accounts, which the batch API
+# requires); a batch spans --batch-hospitals hospitals (one transaction
+# each). Reports bookings/s, request latency and SQL queries per booking, then
+# resends every batch to check that the idempotency keys replay instead of
+# booking again, and that reconciliation finds no counter drift.
+# Without DATABASE_URL a throwaway SQLite file is used.
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+import bench_routes  # sets up the throwaway database before the app is imported
+from bench_routes import app, db, seed, TestClientSession, login
+
+from sqlalchemy import func, select, update
+
+from models import Booking, User
+import lifecycle
+
+
+def run(sessions, jobs, send):
+    """Send jobs from all sessions in parallel; returns (seconds, [latency ms], [queries], errors)."""
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    todo = iter(jobs)
+
+    def worker(session, token):
+        while True:
+            with lock:
+                job = next(todo, None)
+            if job is None:
+                return
+            started = time.perf_counter()
+            ok, count = send(session, token, job)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                queries.append(count)
+                if not ok:
+                    errors.append(job)
+
+    threads = [threading.Thread(target=worker, args=s) for s in sessions]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, latencies, queries, errors
+
+
+def send_form(session, token, hospital_id):
+    data = {"csrf_token": token, "name": "Bench", "contact": "0", "bed_type": "normal", "doctor_id": "0"}
+    status, headers, _ = session.request("POST", f"/book/{hospital_id}", data)
+    return status == 302, int(headers.get("X-Query-Count", 0))
+
+
+sent = []  # (session, items): keys are per account, so a batch is resent by the session that sent it
+
+
+def send_batch(session, token, items):
+    sent.append((session, items))
+    resp = session.client.post("/api/bookings/batch", json={"items": items})
+    ok = resp.status_code == 200 and resp.json["failed"] == 0
+    return ok, int(resp.headers.get("X-Query-Count", 0))
+
+
+def report(label, bookings, seconds, latencies, queries, errors):
+    latencies.sort()
+    print(f"{label:<22}{bookings / seconds:>12.0f}{statistics.median(latencies):>10.1f}"
+          f"{latencies[int(len(latencies) * 0.95)]:>10.1f}{sum(queries) / bookings:>11.1f}{len(errors):>8}")
+
+
+def main(args):
+    tag = format(os.getpid(), "x")
+    hospital_ids, emails = seed(args.hospitals, 0, args.concurrency, 0, tag)
+    with app.app_context():
+        # the batch API is for dispatch accounts, which are admins
+        db.session.execute(update(User).where(User.email.in_(emails)).values(role="admin"))
+        db.session.commit()
+    sessions = []
+    for email in emails[:args.concurrency]:
+        s = TestClientSession()
+        sessions.append((s, login(s, email)))
+    rng = random.Random(7)
+
+    print(f"database: {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}  bookings: {args.bookings}  "
+          f"batch: {args.batch_size} items over {args.batch_hospitals} hospitals  concurrency: {args.concurrency}")
+    print(f"{'path':<22}{'bookings/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'q/booking':>11}{'errors':>8}")
+
+    form_jobs = [rng.choice(hospital_ids) for _ in range(args.bookings)]
+    report("form POST /book", args.bookings, *run(sessions, form_jobs, send_form))
+
+    batches = []
+    for b in range(args.bookings // args.batch_size):
+        targets = rng.sample(hospital_ids, args.batch_hospitals)
+        batches.append([{"key": f"{tag}-{b}-{i}", "hospital_id": targets[i % len(targets)], "bed_type": "normal",
+                         "name": "Bench", "contact": "0"} for i in range(args.batch_size)])
+    made = len(batches) * args.batch_size
+    report(f"batch x{args.batch_size}", made, *run(sessions, batches, send_batch))
+
+    # resend every batch, as a client would after a timeout
+    with app.app_context():
+        before = db.session.execute(select(func.count(Booking.id))).scalar()
+    replays = {"replayed": 0, "other": 0}
+    for session, items in sent:
+        for r in session.client.post("/api/bookings/batch", json={"items": items}).json["results"]:
+            replays["replayed" if r["outcome"] == "replayed" else "other"] += 1
+    with app.app_context():
+        after = db.session.execute(select(func.count(Booking.id))).scalar()
+        drift = lifecycle.reconcile()
+    print(f"\nresent {len(batches)} batches: {replays['replayed']} items replayed, {replays['other']} not, "
+          f"{after - before} new bookings; reconcile drift: {len(drift)}")
+    return 1 if replays["other"] or after != before or drift else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Form vs batch booking throughput")
+    parser.add_argument("--hospitals", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--batch-hospitals", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+# bench_geo.py
+# Nearest-free-bed lookup: grid index (geo.py) vs a distance scan over every row.
+#
+#   python bench_geo.py --hospitals 100000 --queries 500
+#   DATABASE_URL=mysql+mysqlconnector://... python bench_geo.py
+#
+# Hospitals are clustered around Indian cities (plus a rural sprinkle), a third
+# of them with no free ICU bed. Each query asks for the k=5 closest hospitals
+# with a free ICU bed; both methods must return the same ids. Queries at high
+# latitudes, far from every hospital, check that a search with nothing in
+# range still stops at GEO_MAX_RADIUS_KM. Without DATABASE_URL a throwaway
+# SQLite file is used.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+if not os.environ.get("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="bench_geo_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import insert, func
+
+from app import app, db, Hospital
+from api import availability_snapshot
+from bedindex import bed_index
+from geo import geo_index, haversine_km
+import search
+
+CITIES = [("Pune", 18.52, 73.86), ("Mumbai", 19.08, 72.88), ("New Delhi", 28.61, 77.21),
+          ("Bengaluru", 12.97, 77.59), ("Chennai", 13.08, 80.27), ("Kolkata", 22.57, 88.36),
+          ("Hyderabad", 17.39, 78.49), ("Ahmedabad", 23.02, 72.57), ("Jaipur", 26.91, 75.79),
+          ("Lucknow", 26.85, 80.95), ("Nagpur", 21.15, 79.09), ("Patna", 25.59, 85.14)]
+BBOX = (8.0, 33.0, 69.0, 92.0)  # lat_min, lat_max, lon_min, lon_max
+FAR_POINTS = [(60.0, 5.0), (75.0, -40.0), (89.95, 120.0), (-85.0, 0.0)]  # nothing within the radius
+FAR_LIMIT_MS = 1000
+
+
+def seed(n, batch=5000):
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        if db.session.query(func.count(Hospital.id)).scalar() >= n:
+            return
+        with db.engine.begin() as conn:
+            for start in range(0, n, batch):
+                rows = []
+                for i in range(start, min(n, start + batch)):
+                    if i % 5:
+                        city, clat, clon = rng.choice(CITIES)
+                        lat, lon = rng.gauss(clat, 0.3), rng.gauss(clon, 0.3)
+                    else:
+                        city, lat, lon = "Rural", rng.uniform(*BBOX[:2]), rng.uniform(*BBOX[2:])
+                    rows.append({"name": f"Hospital {i}", "city": city, "city_norm": search.normalize(city),
+                                 "latitude": lat, "longitude": lon,
+                                 "icu_total": 4, "icu_available": 0 if i % 3 == 0 else 1 + i % 4})
+                conn.execute(insert(Hospital), rows)
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def scan_nearest(lat, lon, k=5):
+    """The baseline: distance to every hospital with a free ICU bed, then sort."""
+    rows = db.session.query(Hospital.id, Hospital.latitude, Hospital.longitude).filter(
+        Hospital.icu_available > 0, Hospital.latitude.isnot(None)).all()
+    return [hid for _, hid in sorted((haversine_km(lat, lon, a, b), hid) for hid, a, b in rows)[:k]]
+
+
+def timed(fn, args_list):
+    samples, results = [], []
+    for args in args_list:
+        t0 = time.perf_counter()
+        results.append(fn(*args))
+        samples.append((time.perf_counter() - t0) * 1000)
+    return results, samples
+
+
+def main(n, queries, k):
+    seed(n)
+    rng = random.Random(11)
+    points = [(rng.uniform(*BBOX[:2]), rng.uniform(*BBOX[2:])) if i % 2 else
+              (lambda c: (rng.gauss(c[1], 0.2), rng.gauss(c[2], 0.2)))(rng.choice(CITIES))
+              for i in range(queries)]
+    print(f"hospitals: {n}  queries: {queries}  k: {k}  "
+          f"database: {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}")
+    with app.test_request_context():
+        t0 = time.perf_counter()
+        bed_index.rebuild()
+        print(f"bed index rebuild : {(time.perf_counter() - t0) * 1000:8.1f} ms")
+        t0 = time.perf_counter()
+        geo_index.sync()
+        print(f"geo index build   : {(time.perf_counter() - t0) * 1000:8.1f} ms "
+              f"({len(geo_index.points)} points in {len(geo_index.cells)} cells)")
+
+        def grid(lat, lon):
+            return [hid for _, hid, _ in geo_index.nearest(lat, lon, k, availability_snapshot, "icu", 20000)]
+
+        grid_ids, grid_ms = timed(grid, points)
+        scan_ids, scan_ms = timed(lambda lat, lon: scan_nearest(lat, lon, k), points[:max(1, queries // 10)])
+        radius = app.config["GEO_MAX_RADIUS_KM"]
+        far_ids, far_ms = timed(lambda lat, lon: geo_index.nearest(lat, lon, k, availability_snapshot, "icu", radius),
+                                FAR_POINTS)
+    same = sum(a == b for a, b in zip(grid_ids, scan_ids))
+    print(f"{'method':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, samples in (("grid", grid_ms), ("full scan", scan_ms)):
+        print(f"{name:<12}{statistics.median(samples):>10.2f}{percentile(samples, 95):>10.2f}{max(samples):>10.2f}")
+    print(f"speedup (p50): {statistics.median(scan_ms) / statistics.median(grid_ms):.0f}x  "
+          f"identical results: {same}/{len(scan_ids)}")
+    far_ok = not any(far_ids) and max(far_ms) < FAR_LIMIT_MS
+    print(f"no match within {radius:g} km at lat {', '.join(f'{lat:g}' for lat, _ in FAR_POINTS)}: "
+          f"max {max(far_ms):.2f} ms{'' if far_ok else '  FAILED'}")
+
+    client = app.test_client()
+    _, api_ms = timed(lambda lat, lon: client.get(f"/api/beds/nearest?lat={lat}&lon={lon}&type=icu&k={k}"),
+                      points)
+    print(f"GET /api/beds/nearest p50 {statistics.median(api_ms):.2f} ms  p95 {percentile(api_ms, 95):.2f} ms")
+    return 0 if same == len(scan_ids) and far_ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nearest-bed lookup benchmark")
+    parser.add_argument("--hospitals", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    raise SystemExit(main(args.hospitals, args.queries, args.k))
@@ -0,0 +1,81 @@
+# bench_ingest.py
+# Rows/sec for the bulk ingestion pipeline (ingest.py).
+#
+# Writes synthetic hospital, doctor and capacity feeds to a temp dir, then
+# times a dry run, the initial load (inserts), a re-load (updates), a
+# capacity feed and a doctor feed.
+#
+#   python bench_ingest.py --hospitals 50000 --doctors 100000
+#   DATABASE_URL=mysql+mysqlconnector://... python bench_ingest.py
+#
+# Without DATABASE_URL a throwaway SQLite file is used.
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_ingest_")
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from app import app, db
+from ingest import ingest
+
+CITIES = ["Pune", "Mumbai", "New Delhi", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Jaipur"]
+
+
+def write_feeds(hospitals, doctors):
+    rng = random.Random(7)
+    paths = {k: os.path.join(_tmpdir, f"{k}.{ext}") for k, ext in
+             [("hospitals", "csv"), ("capacity", "csv"), ("doctors", "jsonl")]}
+    cols = ["name", "city", "address", "contact", "icu_total", "oxygen_total", "normal_total", "ventilator_total"]
+    with open(paths["hospitals"], "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(cols)
+        for i in range(hospitals):
+            w.writerow([f"Hospital {i}", CITIES[i % len(CITIES)], f"{i} Main Road", f"+91-{i:08d}",
+                        rng.randint(0, 20), rng.randint(0, 40), rng.randint(0, 100), rng.randint(0, 10)])
+    with open(paths["capacity"], "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["name", "city", "icu_total", "normal_total"])
+        for i in range(hospitals):
+            w.writerow([f"Hospital {i}", CITIES[i % len(CITIES)], rng.randint(0, 20), rng.randint(0, 100)])
+    with open(paths["doctors"], "w") as f:
+        for i in range(doctors):
+            h = rng.randrange(hospitals)
+            f.write(json.dumps({"hospital_name": f"Hospital {h}", "hospital_city": CITIES[h % len(CITIES)],
+                                "name": f"Dr {i}", "specialization": "General", "experience": i % 30}) + "\n")
+    return paths
+
+
+def run(label, kind, path, batch_size, dry_run=False):
+    fmt = "jsonl" if path.endswith(".jsonl") else "csv"
+    with open(path, newline="") as stream:
+        stats = ingest(kind, stream, fmt, batch_size, dry_run)
+    print(f"{label:<22}{stats['rows']:>9}{stats['seconds']:>10.2f}{stats['rows_per_sec']:>14,.0f}"
+          f"   +{stats['inserted']} ~{stats['updated']} !{stats['invalid'] + stats['missing']}")
+
+
+def main(hospitals, doctors, batch_size):
+    paths = write_feeds(hospitals, doctors)
+    print(f"database: {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}  batch size: {batch_size}")
+    print(f"{'step':<22}{'rows':>9}{'seconds':>10}{'rows/sec':>14}   inserted/updated/rejected")
+    with app.app_context():
+        db.create_all()
+        run("hospitals (dry run)", "hospitals", paths["hospitals"], batch_size, dry_run=True)
+        run("hospitals (insert)", "hospitals", paths["hospitals"], batch_size)
+        run("hospitals (update)", "hospitals", paths["hospitals"], batch_size)
+        run("capacity", "capacity", paths["capacity"], batch_size)
+        run("doctors (insert)", "doctors", paths["doctors"], batch_size)
+        run("doctors (update)", "doctors", paths["doctors"], batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk ingestion benchmark")
+    parser.add_argument("--hospitals", type=int, default=20000)
+    parser.add_argument("--doctors", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.hospitals, args.doctors, args.batch_size)
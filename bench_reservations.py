@@ -0,0 +1,102 @@
+# bench_reservations.py
+# Concurrent load test for reservations.reserve_bed().
+#
+# N threads hammer one hospital that has fewer beds than attempts and we check
+# that exactly `beds` bookings succeed, the counter ends at 0 and never goes
+# negative, then report bookings/sec.
+#
+#   python bench_reservations.py --workers 32 --attempts 2000 --beds 500
+#   DATABASE_URL=mysql+mysqlconnector://... python bench_reservations.py
+#
+# Without DATABASE_URL a throwaway SQLite file is used.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+if not os.environ.get("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="bench_reservations_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from app import app, db, Hospital, User, Doctor, Booking
+from reservations import reserve_bed, ReservationError
+
+
+def setup(beds, doctor_slots):
+    with app.app_context():
+        db.create_all()
+        user = User(name="Bench", email=f"bench-{time.time_ns()}@example.com", password="x", role="patient")
+        h = Hospital(name="Bench Hospital", city="Bench", icu_total=beds, icu_available=beds)
+        db.session.add_all([user, h])
+        db.session.flush()
+        doc = Doctor(name="Dr Bench", hospital_id=h.id, available=doctor_slots)
+        db.session.add(doc)
+        db.session.commit()
+        return h.id, user.id, doc.id
+
+
+def run(workers, attempts, beds, use_doctor):
+    hospital_id, user_id, doctor_id = setup(beds, beds)
+    counter = iter(range(attempts))
+    lock = threading.Lock()
+    stats = {"ok": 0, "rejected": 0, "errors": 0}
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        return
+                try:
+                    reserve_bed(hospital_id, "icu", patient_id=user_id,
+                                doctor_id=doctor_id if use_doctor else None, name="load")
+                    key = "ok"
+                except ReservationError:
+                    key = "rejected"
+                except Exception as exc:
+                    print("error:", exc, file=sys.stderr)
+                    key = "errors"
+                with lock:
+                    stats[key] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        h = db.session.get(Hospital, hospital_id)
+        booked = Booking.query.filter_by(hospital_id=hospital_id).count()
+        doc_left = db.session.get(Doctor, doctor_id).available
+
+    print(f"database         : {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}")
+    print(f"workers/attempts : {workers}/{attempts}, beds={beds}, doctor={use_doctor}")
+    print(f"accepted         : {stats['ok']}  rejected: {stats['rejected']}  errors: {stats['errors']}")
+    print(f"booking rows     : {booked}")
+    print(f"icu_available    : {h.icu_available}  doctor slots left: {doc_left}")
+    print(f"elapsed          : {elapsed:.3f}s  ({stats['ok'] / elapsed:.1f} bookings/sec, "
+          f"{attempts / elapsed:.1f} attempts/sec)")
+
+    expected = min(beds, attempts)
+    oversold = booked > beds or h.icu_available < 0 or doc_left < 0
+    consistent = booked == stats["ok"] == expected and h.icu_available == beds - booked
+    if oversold or not consistent:
+        print("FAIL: counters and bookings disagree")
+        return 1
+    print("OK: no overselling")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent reservation load test")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=1000)
+    parser.add_argument("--beds", type=int, default=300)
+    parser.add_argument("--doctor", action="store_true", help="also reserve a doctor slot per booking")
+    args = parser.parse_args()
+    sys.exit(run(args.workers, args.attempts, args.beds, args.doctor))
@@ -0,0 +1,327 @@
+# bench_routes.py
+# Latency/throughput benchmark for the main Flask routes.
+#
+# Seeds a synthetic dataset (hospitals and doctors through ingest.py, users and
+# booking history with bulk inserts), then drives each route with N requests
+# from `--concurrency` logged-in sessions and reports p50/p95/p99 latency,
+# throughput, SQL queries and template render time per request (from the
+# X-Query-Count / X-Render-Time-ms headers).
+#
+#   python bench_routes.py --hospitals 5000 --users 500 --bookings 50000 --concurrency 8
+#   python bench_routes.py --gunicorn --workers 4 --output results/$(git rev-parse --short HEAD).json
+#   DATABASE_URL=mysql+mysqlconnector://... python bench_routes.py
+#
+# By default requests go through the Flask test client (no network, one
+# process); --gunicorn starts a local gunicorn on the same database and drives
+# it over HTTP. Results go to stdout as JSON (or --output), the summary table to
+# stderr. Without DATABASE_URL a throwaway SQLite file is used; point it at a
+# scratch database, since seeding adds rows.
+import argparse
+import http.cookiejar
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+
+if not os.environ.get("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="bench_routes_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["QUERY_STATS_HEADERS"] = "1"
+
+from sqlalchemy import insert, select, func
+from werkzeug.security import generate_password_hash
+
+from app import app, db, User, Hospital, Booking
+from ingest import ingest
+import rollups
+
+CITIES = ["Pune", "Mumbai", "New Delhi", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Jaipur"]
+PASSWORD = "bench-pass"
+ROUTES = ["index", "hospitals", "beds", "availability", "book", "my_bookings"]
+_csrf = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+# --- dataset ---
+def seed(hospitals, doctors, users, bookings, tag):
+    rng = random.Random(11)
+    with app.app_context():
+        db.create_all()
+        first_id = (db.session.execute(select(func.max(Hospital.id))).scalar() or 0) + 1
+        feed = io.StringIO()
+        feed.write("name,city,address,contact,icu_total,oxygen_total,normal_total,ventilator_total\n")
+        for i in range(hospitals):
+            # plenty of normal beds so /book keeps booking instead of waitlisting
+            feed.write(f"Bench {tag} Hospital {i},{CITIES[i % len(CITIES)]},{i} Ring Road,+91-{i:08d},"
+                       f"{rng.randint(0, 20)},{rng.randint(0, 40)},{rng.randint(5000, 10000)},{rng.randint(0, 10)}\n")
+        feed.seek(0)
+        ingest("hospitals", feed, "csv", batch_size=5000)
+        hospital_ids = db.session.execute(
+            select(Hospital.id).where(Hospital.id >= first_id, Hospital.name.like(f"Bench {tag} %"))
+        ).scalars().all()
+
+        feed = io.StringIO()
+        for i in range(doctors):
+            h = rng.randrange(hospitals)
+            feed.write(json.dumps({"hospital_name": f"Bench {tag} Hospital {h}", "hospital_city": CITIES[h % len(CITIES)],
+                                   "name": f"Dr {i}", "specialization": "General", "available": 5}) + "\n")
+        feed.seek(0)
+        ingest("doctors", feed, "jsonl", batch_size=5000)
+
+        password = generate_password_hash(PASSWORD)  # hashed once, shared by every bench user
+        emails = [f"bench-{tag}-{i}@example.com" for i in range(users)]
+        db.session.execute(insert(User), [
+            {"name": f"Bench User {i}", "email": e, "password": password, "role": "patient"} for i, e in enumerate(emails)
+        ])
+        user_ids = db.session.execute(select(User.id).where(User.email.in_(emails))).scalars().all()
+        now = rollups.db_now().replace(microsecond=0)  # created_at is in the database's zone
+        for start in range(0, bookings, 5000):
+            db.session.execute(insert(Booking), [
+                {"patient_id": rng.choice(user_ids), "hospital_id": rng.choice(hospital_ids),
+                 "bed_type": rng.choice(("icu", "oxygen", "normal", "ventilator")), "status": "discharged",
+                 "name": "Bench", "contact": "0",
+                 "created_at": now - timedelta(seconds=rng.randrange(30 * 86400))}
+                for _ in range(min(5000, bookings - start))
+            ])
+        db.session.commit()
+    return hospital_ids, emails
+
+
+# --- clients ---
+class TestClientSession:
+    """One logged-in user on the Flask test client."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        resp = self.client.open(path, method=method, data=data)
+        body = resp.get_data(as_text=True)
+        return resp.status_code, resp.headers, body
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    """One logged-in user talking to a real server over HTTP."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                return resp.status, resp.headers, resp.read().decode()
+        except urllib.error.HTTPError as exc:  # includes the 302s we don't follow
+            return exc.code, exc.headers, exc.read().decode(errors="replace")
+
+
+def login(session, email):
+    """Log in through the real form (CSRF included); returns the session's CSRF token."""
+    _, _, page = session.request("GET", "/login")
+    token = _csrf.search(page).group(1)
+    status, _, _ = session.request("POST", "/login", {"csrf_token": token, "email": email, "password": PASSWORD})
+    if status != 302:
+        raise RuntimeError(f"login failed for {email}: HTTP {status}")
+    return token
+
+
+# --- gunicorn ---
+def start_gunicorn(port, workers, worker_class):
+    cmd = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+           "-k", worker_class, "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=dict(os.environ), cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited; is it installed? (pip install gunicorn)")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not come up within 30s")
+
+
+# --- measurement ---
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def make_request(route, hospital_ids, token, rng):
+    """(method, path, form data, expected statuses) for one request of a route."""
+    if route == "index":
+        return "GET", "/", None, (200,)
+    if route == "hospitals":
+        return "GET", "/hospitals", None, (200,)
+    if route == "beds":
+        return "GET", f"/hospital/{rng.choice(hospital_ids)}/beds", None, (200,)
+    if route == "availability":
+        return "GET", f"/api/hospital/{rng.choice(hospital_ids)}/availability", None, (200,)
+    if route == "my_bookings":
+        return "GET", "/my_bookings", None, (200,)
+    if route == "book":
+        data = {"csrf_token": token, "name": "Bench", "contact": "0", "bed_type": "normal", "doctor_id": "0"}
+        return "POST", f"/book/{rng.choice(hospital_ids)}", data, (302,)
+    raise ValueError(route)
+
+
+def run_route(route, sessions, requests, warmup, hospital_ids):
+    latencies, queries, renders, errors = [], [], [], []
+    lock = threading.Lock()
+    counter = iter(range(warmup + requests))
+
+    def worker(n, session, token):
+        rng = random.Random(n)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, path, data, ok = make_request(route, hospital_ids, token, rng)
+            started = time.perf_counter()
+            status, headers, _ = session.request(method, path, data)
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                if headers.get("X-Query-Count") is not None:
+                    queries.append(int(headers["X-Query-Count"]))
+                if headers.get("X-Render-Time-ms") is not None:
+                    renders.append(float(headers["X-Render-Time-ms"]))
+                if status not in ok:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker, args=(n, s, t)) for n, (s, t) in enumerate(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_statuses": sorted(set(errors)),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else None,
+        "p50_ms": round(percentile(ms, 50), 3) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 3) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 3) if ms else None,
+        "max_ms": round(ms[-1], 3) if ms else None,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "render_ms_mean": round(sum(renders) / len(renders), 3) if renders else None,
+        "render_ms_p95": round(percentile(sorted(renders), 95), 3) if renders else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(args):
+    tag = format(time.time_ns(), "x")[-8:]
+    routes = args.routes.split(",") if args.routes else ROUTES
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        sys.exit(f"unknown routes: {', '.join(sorted(unknown))} (choose from {', '.join(ROUTES)})")
+    started = time.perf_counter()
+    hospital_ids, emails = seed(args.hospitals, args.doctors, max(args.users, args.concurrency), args.bookings, tag)
+    seed_seconds = time.perf_counter() - started
+
+    server = None
+    if args.gunicorn:
+        server = start_gunicorn(args.port, args.workers, args.worker_class)
+        make_session = lambda: HTTPSession(f"http://127.0.0.1:{args.port}")  # noqa: E731
+    else:
+        make_session = TestClientSession
+    try:
+        sessions = []
+        for email in emails[:args.concurrency]:
+            s = make_session()
+            sessions.append((s, login(s, email)))
+        results = {route: run_route(route, sessions, args.requests, args.warmup, hospital_ids) for route in routes}
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "commit": git_commit(),
+        "database": app.config["SQLALCHEMY_DATABASE_URI"].split("://")[0],
+        "mode": f"gunicorn/{args.worker_class}x{args.workers}" if args.gunicorn else "test-client",
+        "python": platform.python_version(),
+        "scale": {"hospitals": args.hospitals, "doctors": args.doctors, "users": len(emails),
+                  "bookings": args.bookings},
+        "seed_seconds": round(seed_seconds, 2),
+        "concurrency": args.concurrency,
+        "requests_per_route": args.requests,
+        "routes": results,
+    }
+
+    out = sys.stderr
+    print(f"{report['database']} {report['mode']} concurrency={args.concurrency} commit={report['commit']}", file=out)
+    print(f"{'route':<14}{'req':>6}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'render ms':>11}", file=out)
+    for route, r in results.items():
+        print(f"{route:<14}{r['requests']:>6}{r['errors']:>5}{r['throughput_rps'] or 0:>9.1f}{r['p50_ms'] or 0:>9.2f}"
+              f"{r['p95_ms'] or 0:>9.2f}{r['p99_ms'] or 0:>9.2f}{r['queries_per_request'] or 0:>9.1f}"
+              f"{r['render_ms_mean'] or 0:>11.2f}", file=out)
+
+    text = json.dumps(report, indent=2)
+    if args.output and args.output != "-":
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any(r["errors"] for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Route latency and throughput benchmark")
+    parser.add_argument("--hospitals", type=int, default=2000)
+    parser.add_argument("--doctors", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent logged-in sessions")
+    parser.add_argument("--routes", help=f"comma-separated subset of {','.join(ROUTES)}")
+    parser.add_argument("--gunicorn", action="store_true", help="drive a local gunicorn instead of the test client")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--worker-class", default="sync", help="gunicorn worker class")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="-", help="JSON results file ('-' = stdout)")
+    sys.exit(main(parser.parse_args()))
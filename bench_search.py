@@ -0,0 +1,82 @@
+# bench_search.py
+# Compare the old `city ILIKE '%city%'` scan with the indexed search in search.py.
+#
+#   python bench_search.py --hospitals 100000 --repeat 50
+#   DATABASE_URL=mysql+mysqlconnector://... python bench_search.py
+#
+# Without DATABASE_URL a throwaway SQLite file is used.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+if not os.environ.get("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="bench_search_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import insert, select, func
+
+from app import app, db, Hospital
+import search
+
+CITIES = ["Pune", "Mumbai", "New Delhi", "Bengaluru", "Chennai", "Kolkata", "Hyderabad", "Ahmedabad",
+          "Jaipur", "Lucknow", "Kanpur", "Nagpur", "Indore", "Thane", "Bhopal", "Visakhapatnam",
+          "Patna", "Vadodara", "Ghaziabad", "Ludhiana", "Agra", "Nashik", "Faridabad", "Meerut"]
+
+
+def seed(n, batch=5000):
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        if db.session.query(func.count(Hospital.id)).scalar() >= n:
+            return
+        with db.engine.begin() as conn:
+            for start in range(0, n, batch):
+                rows = []
+                for i in range(start, min(n, start + batch)):
+                    city = f"{rng.choice(CITIES)} {i % 400}" if i % 3 else rng.choice(CITIES)
+                    rows.append({"name": f"Hospital {i}", "address": f"{i} Main Road", "city": city,
+                                 "city_norm": search.normalize(city), "icu_available": i % 7})
+                conn.execute(insert(Hospital), rows)
+            ids = conn.execute(select(Hospital.id, Hospital.name, Hospital.address, Hospital.city)).all()
+            for start in range(0, len(ids), batch):
+                search.index_rows(conn, ids[start:start + batch])
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return result, statistics.median(samples), max(samples)
+
+
+def main(n, repeat):
+    seed(n)
+    cases = ["Pune", "new del", "delhi", "Visakhapatnam 12"]
+    print(f"hospitals: {n}  database: {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}")
+    # ids only, so we time the lookup rather than ORM object construction
+    print(f"{'city':<20}{'rows':>8}{'ilike ms':>12}{'indexed ms':>12}{'speedup':>10}")
+    with app.app_context():
+        for city in cases:
+            old_rows, old_ms, _ = timed(
+                lambda: Hospital.query.with_entities(Hospital.id)
+                .filter(Hospital.city.ilike(f"%{city}%")).all(),
+                repeat)
+            new_rows, new_ms, _ = timed(
+                lambda: search.filter_city(Hospital.query, city).with_entities(Hospital.id).all(),
+                repeat)
+            print(f"{city:<20}{len(new_rows):>8}{old_ms:>12.2f}{new_ms:>12.2f}{old_ms / new_ms:>9.1f}x")
+        _, q_ms, _ = timed(lambda: search.search_hospitals(q="hospital 4242")[0], repeat)
+        print(f"token search 'hospital 4242': {q_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="City search benchmark")
+    parser.add_argument("--hospitals", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.hospitals, args.repeat)
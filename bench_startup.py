@@ -0,0 +1,176 @@
+# bench_startup.py
+# Cold-start cost: interpreter + imports + app construction, per entry point.
+#
+#   python bench_startup.py --runs 7
+#   python bench_startup.py --ref HEAD~1          # compare with an older revision
+#   python bench_startup.py --gunicorn --workers 4
+#
+# Every measurement runs in a fresh interpreter (a cold start after
+# autoscaling or a worker restart); the median wall time of --runs is
+# reported. "import app" is what gunicorn's app:app, the flask CLI and the
+# scripts paid before the app factory, when importing app.py built the whole
+# app. --ref exports that revision with `git archive` and times it too. The
+# slowest top-level imports come from `python -X importtime`. With --gunicorn
+# the server is started with and without WEB_PRELOAD and timed until it
+# answers /ping, and the proportional memory (PSS) of master and workers is
+# summed after some traffic.
+# Without DATABASE_URL a throwaway SQLite file is used.
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_tmpdir = tempfile.mkdtemp(prefix="bench_startup_")
+ENV = dict(os.environ, DATABASE_URL=os.environ.get("DATABASE_URL")
+           or f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+
+ENTRY_POINTS = [
+    ("import app", "import app"),
+    ("scripts: create_app(views=False)", "import app; app.create_app(views=False)"),
+    ("web: create_app()", "import app; app.create_app()"),
+    ("web: create_app() + first GET /", "import app; app.create_app().test_client().get('/')"),
+]
+
+
+def wall_ms(code, cwd, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=cwd, env=ENV, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def slowest_imports(code, n):
+    """Modules imported by app.py or by create_app(), by cumulative import time (ms).
+
+    -X importtime lists a module after everything it imported, nested two
+    spaces deeper, so app.py's own imports are the depth-1 lines just before
+    the "app" line, and top-level lines after it were imported by create_app().
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE, env=ENV,
+                         capture_output=True, text=True, check=True).stderr
+    top, pending, after_app = [], [], False
+    for line in out.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        if not m:
+            continue
+        entry, depth = (int(m[1]) / 1000, m[3]), len(m[2]) // 2
+        if depth == 1:
+            pending.append(entry)
+        elif depth == 0:
+            if entry[1] == "app":
+                top.extend(pending)
+                after_app = True
+            elif after_app:
+                top.append(entry)
+            pending = []
+    return sorted(top, reverse=True)[:n]
+
+
+def export(ref):
+    directory = tempfile.mkdtemp(prefix="bench_startup_ref_")
+    archive = subprocess.run(["git", "archive", ref], cwd=HERE, capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+    return directory
+
+
+# --- gunicorn ---
+def children(master):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == master:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return pids
+
+
+def pss_kb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def gunicorn_start(port, workers, preload):
+    env = dict(ENV, WEB_PRELOAD="1" if preload else "0", WEB_WORKER_CLASS="sync", WEB_CONCURRENCY=str(workers))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app", "--config", "gunicorn.conf.py",
+                             "--bind", f"127.0.0.1:{port}", "--log-level", "warning"], env=env, cwd=HERE)
+    deadline = time.time() + 60
+    try:
+        while True:
+            if proc.poll() is not None or time.time() > deadline:
+                raise RuntimeError("gunicorn did not come up; is it installed? (pip install gunicorn)")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        first_ms = (time.perf_counter() - t0) * 1000
+        for _ in range(workers * 10):  # warm every worker before measuring memory
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5).read()
+        pss = sum(pss_kb(pid) for pid in children(proc.pid)) + pss_kb(proc.pid)
+        return first_ms, pss
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(args):
+    print(f"python {sys.version.split()[0]}  runs: {args.runs}  database: {ENV['DATABASE_URL'].split('://')[0]}")
+    trees = [("working tree", HERE)]
+    if args.ref:
+        trees.append((args.ref, export(args.ref)))
+    # schema for the first-request and gunicorn runs; also fills the template bytecode cache
+    subprocess.run([sys.executable, "-c", "import app; a = app.create_app(); a.app_context().push(); app.db.create_all()"],
+                   cwd=HERE, env=ENV, check=True)
+    print(f"{'entry point':<36}" + "".join(f"{name:>16}" for name, _ in trees))
+    print(f"{'python -c pass':<36}" + "".join(f"{wall_ms('pass', d, args.runs):>13.0f} ms" for _, d in trees))
+    for label, code in ENTRY_POINTS:
+        cells = []
+        for name, directory in trees:
+            # an old tree has no factory: importing app.py already built the app
+            if directory != HERE and "create_app" in code:
+                cells.append(f"{'-':>16}")
+            else:
+                cells.append(f"{wall_ms(code, directory, args.runs):>13.0f} ms")
+        print(f"{label:<36}" + "".join(cells))
+
+    print("\nslowest imports of app.py and create_app() (cumulative):")
+    for ms, module in slowest_imports("import app; app.create_app()", args.top):
+        print(f"  {module:<28}{ms:>8.1f} ms")
+    print("modules a script (views=False) no longer imports: "
+          + ", ".join(m for m in ("wtforms", "flask_wtf", "email_validator", "views", "api", "forms")
+                      if m not in subprocess.run(
+                          [sys.executable, "-c", "import sys, app; app.create_app(views=False); print(*sys.modules)"],
+                          cwd=HERE, env=ENV, capture_output=True, text=True, check=True).stdout.split()))
+
+    if args.gunicorn:
+        print(f"\ngunicorn sync x{args.workers}   ready ms   server PSS MB")
+        for preload in (False, True):
+            first_ms, pss = gunicorn_start(args.port, args.workers, preload)
+            print(f"  WEB_PRELOAD={int(preload)}        {first_ms:>9.0f}   {pss / 1024:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup / import-time benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ref", help="also time this git revision (e.g. HEAD~1)")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--gunicorn", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8767)
+    main(parser.parse_args())
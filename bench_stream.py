@@ -0,0 +1,199 @@
+# bench_stream.py
+# How many idle availability streams one gunicorn worker holds, and at what cost.
+#
+# Starts gunicorn on a throwaway SQLite database, opens --connections SSE
+# streams (/api/availability/stream) from a single selector loop, and reports
+# connections held, server RSS per connection, and how long one counter change
+# takes to reach every subscriber.
+#
+#   python bench_stream.py --worker-class gevent --connections 8000
+#   python bench_stream.py --worker-class gthread --threads 64 --connections 500
+#
+# Client and server share the box, so each connection costs two file
+# descriptors; raise `ulimit -n` above twice the target. Linux only (reads
+# /proc for RSS).
+import argparse
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_stream_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import update
+
+from app import app, db, Hospital
+
+HOSPITALS = 200
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Hospital(name=f"Stream {i}", city="Pune", icu_total=50, icu_available=50)
+                            for i in range(HOSPITALS)])
+        db.session.commit()
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def server_rss_kb(master):
+    """RSS of the gunicorn master plus its workers."""
+    total = rss_kb(master)
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == master:
+                        total += rss_kb(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return total
+
+
+def start_server(port, worker_class, workers, threads):
+    env = dict(os.environ, AVAILABILITY_STREAM="1", AVAILABILITY_STREAM_TIMEOUT="3600", AVAILABILITY_FEED_RESYNC="1",
+               WEB_WORKER_CLASS=worker_class, WEB_CONCURRENCY=str(workers), WEB_THREADS=str(threads),
+               PORT=str(port))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app", "--config", "gunicorn.conf.py",
+                             "--bind", f"127.0.0.1:{port}", "--backlog", "4096", "--log-level", "warning"],
+                            env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited (is gunicorn, and gevent for --worker-class gevent, installed?)")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/ping", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not come up within 30s")
+
+
+class Streams:
+    """Many SSE connections driven by one selector; counts the events each has received."""
+
+    def __init__(self, port):
+        self.port = port
+        self.sel = selectors.DefaultSelector()
+        self.events = {}  # socket -> number of SSE events seen
+        self.failed = 0
+
+    def open(self, n, hospital_ids):
+        for i in range(n):
+            s = socket.socket()
+            s.setblocking(False)
+            s.connect_ex(("127.0.0.1", self.port))
+            ids = ",".join(str(h) for h in hospital_ids[i % len(hospital_ids)])
+            request = (f"GET /api/availability/stream?ids={ids} HTTP/1.1\r\nHost: bench\r\n"
+                       f"Accept: text/event-stream\r\n\r\n").encode()
+            self.sel.register(s, selectors.EVENT_WRITE, request)
+            self.events[s] = 0
+
+    def pump(self, until, timeout):
+        """Run the loop until until() is true or timeout seconds pass."""
+        deadline = time.monotonic() + timeout
+        while not until() and time.monotonic() < deadline:
+            for key, mask in self.sel.select(0.05):
+                s = key.fileobj
+                if mask & selectors.EVENT_WRITE:
+                    try:
+                        s.send(key.data)
+                        self.sel.modify(s, selectors.EVENT_READ)
+                    except OSError:
+                        self._drop(s)
+                    continue
+                try:
+                    chunk = s.recv(65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    self._drop(s)
+                    continue
+                self.events[s] += chunk.count(b"\nevent: ")
+
+    def _drop(self, s):
+        self.sel.unregister(s)
+        s.close()
+        del self.events[s]
+        self.failed += 1
+
+    def count(self, at_least):
+        return sum(1 for n in self.events.values() if n >= at_least)
+
+    def close(self):
+        for s in list(self.events):
+            self.sel.unregister(s)
+            s.close()
+
+
+def main(args):
+    seed()
+    server = start_server(args.port, args.worker_class, args.workers, args.threads)
+    streams = Streams(args.port)
+    try:
+        time.sleep(1)
+        base_kb = server_rss_kb(server.pid)
+        # every client watches a page of 20 hospitals, hospital 1 is on every page
+        pages = [[1] + list(range(2 + (p * 19) % (HOSPITALS - 20), 21 + (p * 19) % (HOSPITALS - 20)))
+                 for p in range(50)]
+        started = time.perf_counter()
+        opened = 0
+        while opened < args.connections:
+            batch = min(args.ramp, args.connections - opened)
+            streams.open(batch, pages)
+            opened += batch
+            streams.pump(lambda: streams.count(1) >= opened - streams.failed, timeout=30)
+        connect_s = time.perf_counter() - started
+        held = streams.count(1)
+        time.sleep(2)
+        streams.pump(lambda: False, timeout=0.5)
+        held_kb = server_rss_kb(server.pid)
+
+        # one change to hospital 1; every subscriber should get exactly one update
+        with app.app_context():
+            db.session.execute(update(Hospital).where(Hospital.id == 1).values(icu_available=Hospital.icu_available - 1))
+            db.session.commit()
+        changed = time.perf_counter()
+        streams.pump(lambda: streams.count(2) >= held, timeout=30)
+        fanout_s = time.perf_counter() - changed
+        delivered = streams.count(2)
+    finally:
+        streams.close()
+        server.terminate()
+        server.wait()
+
+    per_conn = (held_kb - base_kb) * 1024 / held if held else 0
+    print(f"server          : gunicorn {args.worker_class} x{args.workers}"
+          + (f" ({args.threads} threads)" if args.worker_class == "gthread" else ""))
+    print(f"connections     : {held} held of {args.connections} opened ({streams.failed} failed) in {connect_s:.1f}s")
+    print(f"server RSS      : {base_kb / 1024:.1f} MiB idle -> {held_kb / 1024:.1f} MiB held "
+          f"({per_conn / 1024:.1f} KiB per connection)")
+    print(f"update fan-out  : {delivered}/{held} subscribers in {fanout_s:.2f}s "
+          f"(includes up to AVAILABILITY_FEED_RESYNC=1s until the feed sees the direct SQL write)")
+    return 0 if held == args.connections and delivered == held else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Idle availability stream capacity benchmark")
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--worker-class", default="gevent", choices=["sync", "gthread", "gevent"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=32, help="gthread threads per worker")
+    parser.add_argument("--ramp", type=int, default=500, help="connections opened per step")
+    parser.add_argument("--port", type=int, default=8766)
+    sys.exit(main(parser.parse_args()))
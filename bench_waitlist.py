@@ -0,0 +1,99 @@
+# bench_waitlist.py
+# Throughput of waitlist matching under churn.
+#
+# Part 1 drives the in-memory WaitlistIndex alone: a large standing queue
+# plus a random mix of enqueues, cancellations and release matches.
+# Part 2 runs the full engine against a database: patients queue up across
+# cities, hospitals release beds and every match books through reserve_bed().
+#
+#   python bench_waitlist.py --waiting 200000 --ops 500000 --db-entries 2000
+import argparse
+import os
+import random
+import tempfile
+import time
+
+if not os.environ.get("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="bench_waitlist_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from app import app, db, Hospital, User, BED_TYPES
+from waitlist import WaitlistIndex, WaitlistEngine
+
+CITIES = [f"city{i}" for i in range(50)] + [""]
+
+
+def bench_index(waiting, ops):
+    rng = random.Random(1)
+    index = WaitlistIndex()
+    next_id = 0
+    t0 = time.perf_counter()
+    for _ in range(waiting):
+        next_id += 1
+        index.push(next_id, rng.choice(BED_TYPES), rng.choice(CITIES), rng.choice((0, 0, 0, 1, 5)))
+    fill = time.perf_counter() - t0
+
+    counts = {"enqueue": 0, "cancel": 0, "match": 0, "miss": 0}
+    t0 = time.perf_counter()
+    for _ in range(ops):
+        r = rng.random()
+        if r < 0.4:
+            next_id += 1
+            index.push(next_id, rng.choice(BED_TYPES), rng.choice(CITIES), rng.choice((0, 0, 0, 1, 5)))
+            counts["enqueue"] += 1
+        elif r < 0.55:
+            index.remove(rng.randint(1, next_id))
+            counts["cancel"] += 1
+        else:
+            hit = index.pop(rng.choice(BED_TYPES), rng.choice(CITIES[:-1]))
+            counts["match" if hit else "miss"] += 1
+    elapsed = time.perf_counter() - t0
+    print(f"index: filled {waiting} entries in {fill:.2f}s; {ops} churn ops in {elapsed:.2f}s "
+          f"({ops / elapsed:,.0f} ops/s), left waiting: {len(index)}")
+    print(f"       {counts}")
+
+
+def bench_engine(entries, hospitals):
+    rng = random.Random(2)
+    with app.app_context():
+        db.create_all()
+        users = [User(name=f"u{i}", email=f"wl{i}-{time.time_ns()}@example.com", password="x") for i in range(50)]
+        db.session.add_all(users)
+        hs = [Hospital(name=f"WL {i}", city=CITIES[i % 50]) for i in range(hospitals)]
+        db.session.add_all(hs)
+        db.session.commit()
+        engine = WaitlistEngine()
+        t0 = time.perf_counter()
+        for i in range(entries):
+            engine.enqueue(users[i % 50].id, rng.choice(BED_TYPES), city=rng.choice(CITIES), name=f"p{i}")
+        enqueue_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        engine.rebuild()
+        rebuild_s = time.perf_counter() - t0
+
+        allocated = 0
+        t0 = time.perf_counter()
+        for _ in range(entries // 2):
+            h = rng.choice(hs)
+            bed_type = rng.choice(BED_TYPES)
+            col = getattr(Hospital, f"{bed_type}_available")
+            db.session.query(Hospital).filter(Hospital.id == h.id).update({col: col + 1})
+            db.session.commit()
+            allocated += len(engine.release(h.id, [bed_type]))
+        release_s = time.perf_counter() - t0
+    print(f"engine: {entries} enqueues in {enqueue_s:.2f}s; rebuild {rebuild_s * 1000:.1f} ms; "
+          f"{entries // 2} release events in {release_s:.2f}s ({(entries // 2) / release_s:,.0f} events/s), "
+          f"{allocated} allocations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Waitlist matching benchmark")
+    parser.add_argument("--waiting", type=int, default=200000)
+    parser.add_argument("--ops", type=int, default=500000)
+    parser.add_argument("--db-entries", type=int, default=2000)
+    parser.add_argument("--hospitals", type=int, default=200)
+    args = parser.parse_args()
+    bench_index(args.waiting, args.ops)
+    if args.db_entries:
+        bench_engine(args.db_entries, args.hospitals)
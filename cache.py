@@ -0,0 +1,249 @@
+# cache.py
+# In-process cache for hospital snapshots and hospital lists.
+#
+# Entries are plain dicts (never ORM objects, which are bound to a session) held
+# in a TTL + LRU map. Code that changes a hospital calls
+# hospital_cache.invalidate_hospital(id, kind) after committing; the
+# invalidation is applied locally right away and broadcast on a bus so other
+# gunicorn workers drop their copies too. kind="counts" (bookings, discharges)
+# only drops the hospital's own entry while the bed index is on: lists aren't
+# filtered by availability and take their counters from the index. Without
+# it, and for "details" (name, city, a new hospital), every cached list goes. Without CACHE_BUS_URL the LocalBus is used, which only
+# reaches caches in the same process (enough for tests and a single worker).
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # optional, only needed for CACHE_BUS_URL=redis://...
+    redis = None
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class LocalBus:
+    """In-process stand-in for a shared bus: delivers to every subscriber in this process."""
+
+    def __init__(self):
+        self._handlers = []
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def publish(self, message):
+        for handler in list(self._handlers):
+            handler(message)
+
+    def after_fork(self):
+        pass
+
+
+class RedisBus:
+    """Broadcasts invalidations to all workers through a Redis pub/sub channel."""
+
+    def __init__(self, url, channel="hospital-cache"):
+        if redis is None:
+            raise RuntimeError("CACHE_BUS_URL needs the 'redis' package installed")
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._handlers = []
+        self._thread = None
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, daemon=True)
+            self._thread.start()
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message))
+
+    def after_fork(self):
+        """In a forked worker: the listener thread didn't survive the fork, start a new one."""
+        self.client.connection_pool.reset()
+        self._thread = None
+        if self._handlers:
+            self._thread = threading.Thread(target=self._listen, daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for item in pubsub.listen():
+                    message = json.loads(item["data"])
+                    for handler in list(self._handlers):
+                        handler(message)
+            except Exception:
+                # connection dropped; entries still expire by TTL, so just reconnect
+                time.sleep(1)
+
+
+def make_bus(url=None, channel="hospital-cache"):
+    if url and url.startswith("redis"):
+        return RedisBus(url, channel)
+    return LocalBus()
+
+
+class HospitalCache:
+    """Snapshot cache keyed by ("hospital", id) and ("list", view, city, page)."""
+
+    def __init__(self, maxsize=1024, ttl=30.0, bus=None):
+        self.store = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.origin = uuid.uuid4().hex
+        # bumped on every invalidation so a load that raced with one isn't stored
+        self.generation = 0
+        # set by bedindex.py when listings overlay live counters from the bed index
+        self.live_counts = False
+        self.bus = None
+        self.set_bus(bus or LocalBus())
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_TTL", float(os.environ.get("CACHE_TTL", 30)))
+        app.config.setdefault("CACHE_MAXSIZE", int(os.environ.get("CACHE_MAXSIZE", 1024)))
+        app.config.setdefault("CACHE_BUS_URL", os.environ.get("CACHE_BUS_URL"))
+        self.store.ttl = app.config["CACHE_TTL"]
+        self.store.maxsize = app.config["CACHE_MAXSIZE"]
+        self.set_bus(make_bus(app.config["CACHE_BUS_URL"]))
+        app.extensions["hospital_cache"] = self
+
+    def set_bus(self, bus):
+        self.bus = bus
+        bus.subscribe(self._on_message)
+
+    def after_fork(self):
+        # a preloaded app is forked into every worker: each needs its own origin,
+        # or peers would drop each other's invalidations as their own
+        self.origin = uuid.uuid4().hex
+        self.bus.after_fork()
+
+    # --- reads ---
+    def get_hospital(self, hospital_id, loader):
+        """Return the cached snapshot for a hospital, calling loader(id) on a miss."""
+        key = ("hospital", hospital_id)
+        value = self.store.get(key)
+        if value is None:
+            generation = self.generation
+            value = loader(hospital_id)
+            if value is not None and generation == self.generation:
+                self.store.set(key, value)
+        return value
+
+    def get_list(self, view, city, loader, page=None):
+        """Return a cached listing (or one page of it, keyed by `page`), calling loader() on a miss."""
+        key = ("list", view, (city or "").strip().lower(), page)
+        value = self.store.get(key)
+        if value is None:
+            generation = self.generation
+            value = loader()
+            if generation == self.generation:
+                self.store.set(key, value)
+        return value
+
+    # --- invalidation ---
+    def invalidate_hospital(self, hospital_id, kind="details"):
+        """kind: "counts" if only bed/doctor counters changed, "details" for anything a listing shows."""
+        message = {"op": "hospital", "id": hospital_id, "kind": kind}
+        self._apply(message)
+        self._broadcast(message)
+
+    def invalidate_all(self):
+        self._apply({"op": "all"})
+        self._broadcast({"op": "all"})
+
+    def _broadcast(self, message):
+        try:
+            self.bus.publish(dict(message, origin=self.origin))
+        except Exception:
+            # a dead bus must never fail a booking; peers fall back to TTL expiry
+            pass
+
+    def _on_message(self, message):
+        if message.get("origin") != self.origin:
+            self._apply(message)
+
+    def _apply(self, message):
+        self.generation += 1
+        if message.get("op") == "hospital":
+            self.store.delete(("hospital", message["id"]))
+            if message.get("kind") != "counts" or not self.live_counts:
+                # a name/city change or a new hospital can move it in/out of any list
+                self.store.delete_where(lambda k: k[0] == "list")
+        else:
+            self.store.clear()
+
+    def stats(self):
+        return self.store.stats()
+
+
+def hospital_snapshot(h):
+    """Detached, template-friendly copy of a Hospital row."""
+    if h is None:
+        return None
+    return {c.name: getattr(h, c.name) for c in h.__table__.columns}
+
+
+hospital_cache = HospitalCache()
@@ -1,8 +1,10 @@
 # check_db.py
-from app import app
+from app import create_app
 from app import db
 from app import Hospital
 
+app = create_app(views=False)
+
 with app.app_context():
     print("SQLALCHEMY_DATABASE_URI =", app.config.get('SQLALCHEMY_DATABASE_URI'))
     try:
@@ -0,0 +1,9 @@
+# create_tables.py
+# Create or upgrade the schema of DATABASE_URL; same as `flask --app app db upgrade`.
+from app import create_app
+import migrations
+
+app = create_app(views=False)
+
+with app.app_context():
+    migrations.upgrade()
@@ -0,0 +1,120 @@
+# dbrouting.py
+# Connection pool settings and read-replica routing.
+#
+# Pool: each gunicorn worker process has its own pool, so the database sees up
+# to workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections per engine; size
+# DB_POOL_SIZE to the worker's thread count. Connections are recycled after
+# DB_POOL_RECYCLE seconds (below MySQL's wait_timeout) instead of being pinged
+# on every checkout; set DB_POOL_PRE_PING=1 if the network drops idle
+# connections earlier than that.
+#
+# Replicas: DATABASE_REPLICA_URLS (comma-separated) become extra binds. Views
+# marked @read_replica send their SELECTs to one replica, picked per request.
+# Everything else - writes, unmarked views, CLI commands - uses the primary.
+# After a request writes, the user's session is pinned to the primary for
+# DB_STICKY_SECONDS so they read their own writes (e.g. "My bookings" right
+# after booking) despite replica lag. Hospital and list cache fills use the
+# request's replica too: the cached rows only fix names, cities and order (so
+# replica lag costs at most lag + CACHE_TTL), while bed counters are overlaid
+# from the bed index. primary() is for reads that must be current, like the
+# session user.
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select, CompoundSelect
+
+REPLICA_PREFIX = "replica_"
+
+
+def read_replica(view):
+    """Allow this view's reads to go to a replica."""
+    view.read_replica = True
+    return view
+
+
+@contextmanager
+def primary():
+    """Route reads inside the block to the primary."""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get("db_replica")
+    g.db_replica = None
+    try:
+        yield
+    finally:
+        g.db_replica = previous
+
+
+class RoutingSession(Session):
+    """Sends SELECTs to the request's replica (if any); everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if not self._flushing and isinstance(clause, (Select, CompoundSelect)):
+                key = g.get("db_replica")
+                if key and not g.get("db_wrote"):
+                    return self._db.engines[key]
+            else:
+                g.db_wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def async_workers():
+    """True in a gevent-patched process (gunicorn's gevent workers build the app after patching)."""
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched("socket")
+
+
+def engine_options(url):
+    options = {"pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "0") == "1"}
+    if not url.startswith("sqlite"):
+        # SQLite connections are in-process file handles; the defaults are fine there
+        options.update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+            pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 280)),
+        )
+    if "mysqlconnector" in url and (async_workers() or os.environ.get("WEB_WORKER_CLASS") == "gevent"):
+        # the C extension blocks the whole gevent hub while it waits on MySQL
+        options["connect_args"] = {"use_pure": True}
+    return options
+
+
+def replica_keys(app):
+    return [k for k in app.config.get("SQLALCHEMY_BINDS", {}) if k.startswith(REPLICA_PREFIX)]
+
+
+def init_app(app):
+    """Call before db.init_app(app): fills in engine options and replica binds."""
+    url = app.config["SQLALCHEMY_DATABASE_URI"]
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(url))
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    replicas = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    for i, replica_url in enumerate(replicas):
+        binds.setdefault(f"{REPLICA_PREFIX}{i}", {"url": replica_url, **engine_options(replica_url)})
+    app.config.setdefault("DB_STICKY_SECONDS", float(os.environ.get("DB_STICKY_SECONDS", 10)))
+
+    @app.before_request
+    def _pick_replica():
+        g.db_replica = None
+        view = app.view_functions.get(request.endpoint)
+        if not getattr(view, "read_replica", False):
+            return
+        keys = replica_keys(app)
+        if keys and session.get("db_primary_until", 0) < time.time():
+            g.db_replica = random.choice(keys)
+
+    @app.after_request
+    def _stick_to_primary(response):
+        if g.get("db_wrote"):
+            session["db_primary_until"] = time.time() + app.config["DB_STICKY_SECONDS"]
+        return response
@@ -0,0 +1,221 @@
+# explain_routes.py
+# EXPLAIN every SQL statement the routes run and flag full table scans.
+#
+#   python explain_routes.py                      # throwaway SQLite, seeded like bench_routes
+#   DATABASE_URL=mysql+mysqlconnector://... python explain_routes.py --hospitals 20000
+#   python explain_routes.py --verbose            # print every plan, not just the findings
+#
+# Seeds a dataset with bench_routes.seed(), then drives each route once as a
+# patient, as hospital staff and as an admin (bookings are made and cancelled,
+# so use a scratch database). Every SELECT/UPDATE/DELETE executed while a
+# request is handled is recorded under its endpoint and explained afterwards
+# with the same parameters: EXPLAIN QUERY PLAN on SQLite, EXPLAIN on MySQL.
+#
+#   full scan   SQLite "SCAN <table>" without an index, MySQL type=ALL
+#   index scan  every entry of an index is read (SQLite "SCAN ... USING INDEX",
+#               MySQL type=index); reported, not failed
+#
+# A SQLite scan that is already in ORDER BY order (rowid or index, no temp
+# b-tree sort) and stops at a LIMIT reads one page of rows, not the table,
+# and isn't reported.
+#
+# Scans that are the point of the statement (reconciliation and rollup
+# rebuilds read every hospital) are listed in EXPECTED_SCANS. Any other full
+# scan makes the script exit with status 1, so it can gate a migration.
+import argparse
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+
+import bench_routes  # sets up the throwaway database before the app is imported
+from bench_routes import app, db, seed, TestClientSession, login, PASSWORD
+
+from flask import has_request_context, request
+from sqlalchemy import event, insert, update, select
+from sqlalchemy.engine import Engine
+from werkzeug.security import generate_password_hash
+
+from models import User, Hospital, Booking
+from bedindex import bed_index
+from geo import geo_index
+
+# (endpoint, table): why reading the whole table is intended
+EXPECTED_SCANS = {
+    ("api.api_reconcile", "hospitals"): "compares every hospital's counters",
+    ("pages.admin_dashboard", "occupancy_rollup"): "dashboard totals over all cities",
+    ("pages.admin_dashboard", "utilization_samples"): "small hourly series",
+    ("api.api_admin_analytics", "occupancy_rollup"): "dashboard totals over all cities",
+    ("api.api_admin_analytics", "utilization_samples"): "small hourly series",
+}
+LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+STATEMENT = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class Recorder:
+    """Distinct statements per endpoint, with the parameters of their first execution."""
+
+    def __init__(self):
+        self.statements = defaultdict(dict)  # endpoint -> {statement: parameters}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or not STATEMENT.match(statement):
+            return
+        if executemany:
+            parameters = parameters[0]
+        self.statements[request.endpoint or "unmatched"].setdefault(statement, parameters)
+
+
+def explain(conn, statement, parameters):
+    """[(table, kind, detail)] for one statement; kind is "full", "index" or None."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        bounded = LIMIT.search(statement) and not any("TEMP B-TREE" in row[-1] for row in rows)
+        steps = []
+        for row in rows:
+            detail = row[-1]
+            m = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if m is None or m[1] == "CONSTANT":
+                steps.append((None, None, detail))
+            elif bounded:
+                steps.append((m[1], None, detail + " (stops at LIMIT)"))
+            elif "INDEX" in detail:
+                steps.append((m[1], "index", detail))
+            else:
+                steps.append((m[1], "full", detail))
+        return steps
+    if dialect == "mysql":
+        result = conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+        steps = []
+        for row in result.mappings():
+            kind = {"ALL": "full", "index": "index"}.get(row["type"])
+            steps.append((row["table"], kind, f"type={row['type']} key={row['key']} rows={row['rows']}"))
+        return steps
+    raise SystemExit(f"EXPLAIN is not supported for {dialect}")
+
+
+def users(hospital_id, tag):
+    """A hospital staff member and an admin, besides bench_routes' patients."""
+    password = generate_password_hash(PASSWORD)
+    emails = {"hospital": f"staff-{tag}@example.com", "admin": f"admin-{tag}@example.com"}
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"name": role, "email": email, "password": password, "role": role,
+             "hospital_id": hospital_id if role == "hospital" else None}
+            for role, email in emails.items()
+        ])
+        db.session.commit()
+    return emails
+
+
+def drive(sessions, hospital_ids):
+    """Every route once; returns the [(method, path, status)] it made."""
+    patient, staff, admin = sessions
+    hid = hospital_ids[0]
+    ids = ",".join(map(str, hospital_ids[:20]))
+    made = []
+
+    def call(session, method, path, data=None, json_body=None):
+        client, token = session
+        if json_body is not None:
+            resp = client.client.open(path, method=method, json=json_body)
+            status = resp.status_code
+        else:
+            status, _, _ = client.request(method, path, dict(data, csrf_token=token) if data is not None else None)
+        made.append((method, path, status))
+        return status
+
+    for path in ("/", "/?city=Pune", "/hospitals", "/hospitals?city=mumbai", f"/hospital/{hid}/beds",
+                 f"/book/{hid}", "/my_bookings", "/api/hospitals", "/api/hospitals?order=id&city=pune",
+                 "/api/hospitals/search?city=pu&q=ring", f"/api/hospital/{hid}/availability",
+                 f"/api/availability?ids={ids}", "/api/availability?city=Mumbai", "/api/my_bookings",
+                 "/api/beds/nearest?lat=18.5&lon=73.8&type=normal&k=5", "/ping"):
+        call(patient, "GET", path)
+    call(patient, "POST", f"/book/{hid}", {"name": "Explain", "contact": "0", "bed_type": "normal", "doctor_id": "0"})
+    with app.app_context():
+        booking_id = db.session.execute(select(Booking.id).order_by(Booking.id.desc()).limit(1)).scalar()
+    call(patient, "GET", f"/booking/success/{booking_id}")
+    call(patient, "POST", f"/api/bookings/{booking_id}/cancel", json_body={})
+    call(patient, "POST", f"/book/{hid}", {"name": "Explain", "contact": "0", "bed_type": "normal", "doctor_id": "0"})
+    items = [{"key": f"explain-{i}", "hospital_id": h, "bed_type": "normal"}
+             for i, h in enumerate((hid, hid, hospital_ids[1]))]
+    call(admin, "POST", "/api/bookings/batch", json_body={"items": items})
+    call(staff, "GET", f"/hospital/{hid}/edit")
+    call(staff, "POST", f"/api/hospital/{hid}/discharge", json_body={"bed_type": "normal"})
+    for path in ("/admin", "/api/admin/analytics", "/api/admin/reconcile", "/api/cache/stats"):
+        call(admin, "GET", path)
+    return made
+
+
+def main(args):
+    tag = format(os.getpid(), "x")
+    hospital_ids, emails = seed(args.hospitals, args.doctors, args.users, args.bookings, tag)
+    staff = users(hospital_ids[0], tag)
+    with app.app_context():
+        # a few located hospitals for /api/beds/nearest
+        db.session.execute(update(Hospital).where(Hospital.id.in_(hospital_ids[:200]))
+                           .values(latitude=18.5, longitude=73.8))
+        db.session.commit()
+        # process-wide indexes load once per worker, not per route; don't count them against one
+        with app.test_request_context():
+            bed_index.rebuild()
+            geo_index.sync()
+
+    sessions = []
+    for email in (emails[0], staff["hospital"], staff["admin"]):
+        s = TestClientSession()
+        sessions.append((s, login(s, email)))
+
+    recorder = Recorder()
+    event.listen(Engine, "before_cursor_execute", recorder)
+    try:
+        made = drive(sessions, hospital_ids)
+    finally:
+        event.remove(Engine, "before_cursor_execute", recorder)
+    failed = [m for m in made if m[2] >= 400]
+    if failed:
+        print("requests that failed:", failed, file=sys.stderr)
+
+    findings = []
+    with app.app_context(), db.engine.connect() as conn:
+        print(f"database: {conn.dialect.name}  hospitals: {args.hospitals}  bookings: {args.bookings}")
+        for endpoint, statements in sorted(recorder.statements.items()):
+            for statement, parameters in statements.items():
+                steps = explain(conn, statement, parameters)
+                flagged = [(table, kind, detail) for table, kind, detail in steps if kind]
+                for table, kind, detail in flagged:
+                    findings.append({"endpoint": endpoint, "table": table, "kind": kind, "plan": detail,
+                                     "expected": EXPECTED_SCANS.get((endpoint, table)),
+                                     "statement": " ".join(statement.split())[:160]})
+                if args.verbose:
+                    print(f"\n[{endpoint}] {' '.join(statement.split())[:200]}")
+                    for _, kind, detail in steps:
+                        print(f"    {detail}" + (f"   <-- {kind} scan" if kind else ""))
+
+    unexpected = [f for f in findings if f["kind"] == "full" and not f["expected"]]
+    print(f"\n{'endpoint':<28}{'table':<22}{'scan':<7}statement")
+    for f in findings:
+        mark = "  (expected: " + f["expected"] + ")" if f["expected"] else ""
+        print(f"{f['endpoint']:<28}{f['table']:<22}{f['kind']:<7}{f['statement'][:80]}{mark}")
+    endpoints = len(recorder.statements)
+    statements = sum(len(s) for s in recorder.statements.values())
+    print(f"\n{endpoints} endpoints, {statements} distinct statements, "
+          f"{sum(f['kind'] == 'full' for f in findings)} full scans ({len(unexpected)} unexpected), "
+          f"{sum(f['kind'] == 'index' for f in findings)} index scans")
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"requests": made, "findings": findings}, fh, indent=2)
+    return 1 if unexpected or failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN the SQL behind each route and flag full scans")
+    parser.add_argument("--hospitals", type=int, default=2000)
+    parser.add_argument("--doctors", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--verbose", action="store_true", help="print every statement's plan")
+    parser.add_argument("--output", help="also write the findings as JSON")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,171 @@
+# feed.py
+# Shared availability feed for the SSE stream.
+#
+# Every open /api/availability/stream used to run its own query loop, so N
+# browser tabs meant N/interval queries per second and one DB session each.
+# Now each process runs a single poller that keeps the counters of all
+# hospitals in memory and publishes numbered change sets; subscribers only
+# wait on a Condition and filter changes to their own hospitals, never touching
+# the database after the initial scope lookup. An idle subscriber costs a
+# parked thread/greenlet and a small dict, which is what lets a gevent worker
+# hold tens of thousands of them (see gunicorn.conf.py and bench_stream.py).
+#
+# The poller wakes as soon as a hospital is invalidated in the cache (bookings,
+# cancellations, edits - including other workers' when CACHE_BUS_URL points at
+# Redis) and reloads just those rows; a full reload every
+# AVAILABILITY_FEED_RESYNC seconds picks up anything else (bulk ingestion,
+# manual SQL, workers without a shared bus). It only runs while somebody is
+# subscribed.
+#
+# AVAILABILITY_STREAM says whether pages should open the stream at all. It
+# defaults to on only in gevent workers: under sync or gthread workers each
+# open tab would hold a whole worker (or thread) for the stream's lifetime, so
+# base.html tells main.js to poll /api/availability instead and the stream
+# endpoint refuses.
+import os
+import threading
+import time
+from collections import deque
+
+from models import db, BED_TYPES, Hospital
+from cache import hospital_cache
+from dbrouting import async_workers
+
+RESYNC = "resync"  # returned by wait() when a subscriber fell too far behind
+
+
+class AvailabilityFeed:
+    def __init__(self, history=256):
+        self.seq = 0
+        self.snapshot = {}  # hospital_id -> {bed_type: available}
+        self.changes = deque(maxlen=history)  # (seq, {hospital_id: {bed_type: available}})
+        self.subscribers = 0
+        self.app = None
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._dirty = set()
+        self._full = False
+        self._ready = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        app.config.setdefault("AVAILABILITY_FEED_RESYNC", float(os.environ.get("AVAILABILITY_FEED_RESYNC", 10)))
+        app.config.setdefault("AVAILABILITY_FEED_DEBOUNCE", float(os.environ.get("AVAILABILITY_FEED_DEBOUNCE", 0.1)))
+        stream = os.environ.get("AVAILABILITY_STREAM")
+        app.config.setdefault("AVAILABILITY_STREAM", async_workers() if stream is None else stream == "1")
+        self.app = app
+        hospital_cache.bus.subscribe(self._on_invalidate)
+
+    # --- producer side ---
+    def _on_invalidate(self, message):
+        if message.get("op") == "hospital":
+            with self._cond:
+                self._dirty.add(message["id"])
+        else:
+            self._full = True
+        self._wake.set()
+
+    def load(self, ids=None):
+        cols = [getattr(Hospital, f"{t}_available") for t in BED_TYPES]
+        q = db.session.query(Hospital.id, *cols)
+        if ids is not None:
+            q = q.filter(Hospital.id.in_(ids))
+        rows = {row[0]: {t: row[i + 1] or 0 for i, t in enumerate(BED_TYPES)} for row in q.all()}
+        db.session.remove()
+        return rows
+
+    def apply(self, rows, complete=False):
+        """Publish the counters in `rows` that differ from the current snapshot."""
+        with self._cond:
+            changed = {}
+            for hid, counts in rows.items():
+                prev = self.snapshot.get(hid, {})
+                delta = {t: v for t, v in counts.items() if prev.get(t) != v}
+                if delta:
+                    changed[hid] = delta
+            if complete:
+                for hid in set(self.snapshot) - set(rows):  # deleted hospitals
+                    changed[hid] = {t: 0 for t in BED_TYPES}
+            if not changed:
+                return None
+            for hid, delta in changed.items():
+                self.snapshot.setdefault(hid, {}).update(delta)
+            self.seq += 1
+            self.changes.append((self.seq, changed))
+            self._cond.notify_all()
+            return changed
+
+    def _run(self):
+        app = self.app
+        try:
+            with app.app_context():
+                self.apply(self.load(), complete=True)
+        except Exception:
+            app.logger.exception("availability feed initial load failed")
+        finally:
+            self._ready.set()
+        while True:
+            woke = self._wake.wait(app.config["AVAILABILITY_FEED_RESYNC"])
+            self._wake.clear()
+            if not self.subscribers:
+                continue
+            if woke:
+                time.sleep(app.config["AVAILABILITY_FEED_DEBOUNCE"])  # batch a burst of bookings
+                self._wake.clear()
+            with self._cond:
+                dirty, self._dirty = self._dirty, set()
+            full, self._full = self._full or not woke, False
+            try:
+                with app.app_context():
+                    if full:
+                        self.apply(self.load(), complete=True)
+                    elif dirty:
+                        self.apply(self.load(dirty))
+            except Exception:
+                app.logger.exception("availability feed refresh failed")
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="availability-feed", daemon=True)
+                self._thread.start()
+        self._ready.wait()
+
+    # --- subscriber side ---
+    def subscribe(self):
+        """Register a subscriber; returns the current sequence number to wait() from."""
+        self.start()
+        with self._cond:
+            self.subscribers += 1
+            if self.subscribers == 1:
+                # nobody was listening, so the snapshot may be up to a resync old
+                self._full = True
+                self._wake.set()
+            return self.seq
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def view(self, ids):
+        with self._cond:
+            return {hid: dict(self.snapshot[hid]) for hid in ids if hid in self.snapshot}
+
+    def wait(self, after, timeout):
+        """Block until there are changes after `after`; returns (seq, changes | RESYNC | None on timeout)."""
+        with self._cond:
+            if self.seq == after:
+                self._cond.wait(timeout)
+            if self.seq == after:
+                return after, None
+            if not self.changes or self.changes[0][0] > after + 1:
+                return self.seq, RESYNC
+            merged = {}
+            for seq, changed in self.changes:
+                if seq > after:
+                    for hid, delta in changed.items():
+                        merged.setdefault(hid, {}).update(delta)
+            return self.seq, merged
+
+
+availability_feed = AvailabilityFeed()
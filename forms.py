@@ -0,0 +1,58 @@
+# forms.py
+# WTForms used by the page views. Imported by the views when a form is first
+# needed rather than at startup: WTForms and email_validator are a sizeable
+# share of the import time, and CLI commands and scripts never use them.
+from flask_wtf import FlaskForm
+from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, IntegerField, FloatField
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
+
+
+class RegisterForm(FlaskForm):
+    name = StringField("Name", validators=[DataRequired(), Length(max=150)])
+    email = StringField("Email", validators=[DataRequired(), Email()])
+    phone = StringField("Phone")
+    password = PasswordField("Password", validators=[DataRequired(), Length(min=6)])
+    role = SelectField("Role", choices=[("patient", "Patient"), ("hospital", "Hospital"), ("admin", "Admin")])
+    submit = SubmitField("Register")
+
+
+class LoginForm(FlaskForm):
+    email = StringField("Email", validators=[DataRequired(), Email()])
+    password = PasswordField("Password", validators=[DataRequired()])
+    submit = SubmitField("Login")
+
+
+class HospitalForm(FlaskForm):
+    name = StringField("Hospital Name", validators=[DataRequired()])
+    address = TextAreaField("Address")
+    city = StringField("City")
+    contact = StringField("Contact")
+    icu_total = IntegerField("ICU beds", default=0, validators=[Optional(), NumberRange(min=0)])
+    oxygen_total = IntegerField("Oxygen beds", default=0, validators=[Optional(), NumberRange(min=0)])
+    normal_total = IntegerField("Normal beds", default=0, validators=[Optional(), NumberRange(min=0)])
+    ventilator_total = IntegerField("Ventilator beds", default=0, validators=[Optional(), NumberRange(min=0)])
+    latitude = FloatField("Latitude", validators=[Optional(), NumberRange(-90, 90)])
+    longitude = FloatField("Longitude", validators=[Optional(), NumberRange(-180, 180)])
+    submit = SubmitField("Save")
+
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators):
+            return False
+        if (self.latitude.data is None) != (self.longitude.data is None):
+            self.longitude.errors.append("Enter both latitude and longitude, or neither")
+            return False
+        return True
+
+
+class BookingForm(FlaskForm):
+    name = StringField("Patient Name", validators=[DataRequired()])
+    contact = StringField("Contact", validators=[DataRequired()])
+    bed_type = SelectField("Bed Type", choices=[("icu", "ICU"), ("oxygen", "Oxygen"), ("normal", "Normal"), ("ventilator", "Ventilator")])
+    doctor_id = SelectField("Doctor (optional)", coerce=int, choices=[], validate_choice=False)
+    symptoms = TextAreaField("Symptoms")
+    id_proof = StringField("ID Proof (number)")
+    submit = SubmitField("Book")
+
+
+class CancelBookingForm(FlaskForm):
+    submit = SubmitField("Cancel")
@@ -0,0 +1,221 @@
+# geo.py
+# Nearest-hospital lookup over an in-memory grid index.
+#
+# Hospitals with latitude/longitude are bucketed into GEO_CELL_DEG x
+# GEO_CELL_DEG cells. A query walks outwards ring by ring from the caller's
+# cell, asks `available(ids)` (the bed index, see bedindex.py) which
+# candidates have the requested bed type free, and stops once it holds k
+# hospitals that are closer than anything an unvisited ring could contain -
+# so it only measures the distance to hospitals near the answer, never to
+# every row.
+#
+# The index is rebuilt incrementally: cache invalidations (bookings, edits,
+# creation) mark hospitals dirty and the next query reloads just those rows;
+# "invalidate all" (ingestion) and GEO_INDEX_TTL force a full reload, which
+# also catches edits made by workers we don't share a bus with.
+import heapq
+import math
+import os
+import threading
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, select, text
+
+from models import db, Hospital
+from cache import hospital_cache
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    def __init__(self, cell_deg=0.1):
+        self.cell_deg = cell_deg
+        self.points = {}  # hospital_id -> (lat, lon)
+        self.cells = {}  # (row, col) -> set of hospital ids
+        self.app = None
+        self.loaded_at = None
+        self._dirty = set()
+        self._full = True
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault("GEO_CELL_DEG", float(os.environ.get("GEO_CELL_DEG", 0.1)))
+        app.config.setdefault("GEO_INDEX_TTL", float(os.environ.get("GEO_INDEX_TTL", 300)))
+        app.config.setdefault("GEO_MAX_K", int(os.environ.get("GEO_MAX_K", 20)))
+        app.config.setdefault("GEO_MAX_RADIUS_KM", float(os.environ.get("GEO_MAX_RADIUS_KM", 500)))
+        self.cell_deg = app.config["GEO_CELL_DEG"]
+        self.app = app
+        hospital_cache.bus.subscribe(self._on_invalidate)
+        app.cli.add_command(geo_cli)
+
+    def _on_invalidate(self, message):
+        with self._lock:
+            if message.get("op") == "hospital":
+                self._dirty.add(message["id"])
+            else:
+                self._full = True
+
+    # --- maintenance ---
+    def cell(self, lat, lon):
+        return (min(math.floor((lat + 90) / self.cell_deg), self.rows - 1),
+                math.floor((lon + 180) / self.cell_deg) % self.columns)
+
+    @property
+    def rows(self):
+        return math.ceil(180 / self.cell_deg)
+
+    @property
+    def columns(self):
+        return math.ceil(360 / self.cell_deg)
+
+    def _place(self, hid, lat, lon):
+        self._remove(hid)
+        if lat is None or lon is None:
+            return
+        self.points[hid] = (lat, lon)
+        self.cells.setdefault(self.cell(lat, lon), set()).add(hid)
+
+    def _remove(self, hid):
+        old = self.points.pop(hid, None)
+        if old is not None:
+            key = self.cell(*old)
+            bucket = self.cells[key]
+            bucket.discard(hid)
+            if not bucket:
+                del self.cells[key]
+
+    def _rows(self, ids=None):
+        q = select(Hospital.id, Hospital.latitude, Hospital.longitude)
+        if ids is None:
+            q = q.where(Hospital.latitude.isnot(None), Hospital.longitude.isnot(None))
+        else:
+            q = q.where(Hospital.id.in_(ids))
+        return db.session.execute(q).all()
+
+    def sync(self):
+        """Apply pending invalidations: reload dirty rows, or everything when due."""
+        with self._lock:
+            stale = self.loaded_at is None or time.monotonic() - self.loaded_at > self.app.config["GEO_INDEX_TTL"]
+            full, dirty = self._full or stale, self._dirty
+            self._full, self._dirty = False, set()
+        if full:
+            loaded_at = time.monotonic()
+            rows = self._rows()
+            with self._lock:
+                self.points, self.cells = {}, {}
+                for hid, lat, lon in rows:
+                    self._place(hid, lat, lon)
+                self.loaded_at = loaded_at
+        elif dirty:
+            rows = {hid: (lat, lon) for hid, lat, lon in self._rows(dirty)}
+            with self._lock:
+                for hid in dirty:
+                    if hid in rows:
+                        self._place(hid, *rows[hid])
+                    else:
+                        self._remove(hid)
+
+    # --- queries ---
+    def _ring(self, row, col, r, max_dr, max_dc):
+        """Cells at Chebyshev distance r from (row, col), at most max_dr rows / max_dc columns off (wrapping)."""
+        seen = set()
+        for dr in range(-min(r, max_dr), min(r, max_dr) + 1):
+            if abs(dr) == r:
+                offsets = range(-min(r, max_dc), min(r, max_dc) + 1)
+            else:
+                offsets = (-r, r) if r <= max_dc else ()
+            for dc in offsets:
+                key = (row + dr, (col + dc) % self.columns)
+                if 0 <= key[0] < self.rows and key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def _reach(self, lat, max_km):
+        """(rows, columns) either side of lat's cell that can hold a point within max_km."""
+        angle = max_km / EARTH_RADIUS_KM
+        rows = math.ceil(math.degrees(angle) / self.cell_deg) + 1
+        half = self.columns // 2
+        # widest longitude offset of a spherical cap of that radius; past a pole it's the full circle
+        spread = math.sin(min(angle, math.pi / 2)) / max(math.cos(math.radians(abs(lat))), 1e-12)
+        if spread >= 1:
+            return rows, half
+        return rows, min(half, math.ceil(math.degrees(math.asin(spread)) / self.cell_deg) + 1)
+
+    def _ring_bound_km(self, lat, r):
+        """Lower bound on the distance from (lat, .) to anything in ring r or beyond."""
+        if r <= 0:
+            return 0.0
+        # cells of ring r are at least r - 1 whole cells away along one axis;
+        # along longitude that shrinks with the cosine of the highest latitude reachable
+        reach = min(90.0, abs(lat) + (r + 1) * self.cell_deg)
+        return (r - 1) * self.cell_deg * KM_PER_DEG * math.cos(math.radians(reach))
+
+    def nearest(self, lat, lon, k, available, bed_type, max_km):
+        """The k closest hospitals with a free bed_type within max_km: [(distance_km, id, free)].
+
+        available(ids) returns {hospital_id: {bed_type: free}} for those ids.
+        """
+        self.sync()
+        row, col = self.cell(lat, lon)
+        # the ring bound fades to 0 near the poles, so also stop at the cells max_km can reach
+        max_dr, max_dc = self._reach(lat, max_km)
+        rings = max(max_dr, max_dc) + 1
+        best = []  # max-heap of the k closest so far, as (-distance, id, free)
+        for r in range(rings):
+            bound = self._ring_bound_km(lat, r)
+            if bound > max_km or (len(best) == k and -best[0][0] <= bound):
+                break
+            with self._lock:
+                candidates = [(hid, self.points[hid]) for key in self._ring(row, col, r, max_dr, max_dc)
+                              for hid in self.cells.get(key, ())]
+            # nearest first, so availability is only looked up for hospitals that could still make the cut
+            candidates = sorted((haversine_km(lat, lon, hlat, hlon), hid) for hid, (hlat, hlon) in candidates)
+            chunk = max(4 * k, 32)
+            for start in range(0, len(candidates), chunk):
+                batch = [(d, hid) for d, hid in candidates[start:start + chunk]
+                         if d <= max_km and (len(best) < k or d < -best[0][0])]
+                if not batch:
+                    break
+                counts = available([hid for _, hid in batch])
+                for d, hid in batch:
+                    free = counts.get(hid, {}).get(bed_type, 0)
+                    if free <= 0:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, hid, free))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, hid, free))
+        return sorted((-nd, hid, free) for nd, hid, free in best)
+
+
+geo_index = GeoIndex()
+
+
+# --- CLI: flask geo ---
+@click.group("geo")
+def geo_cli():
+    """Hospital coordinates."""
+
+
+@geo_cli.command("init")
+@with_appcontext
+def init_command():
+    """Add hospitals.latitude/longitude to an existing database."""
+    columns = {c["name"] for c in inspect(db.engine).get_columns("hospitals")}
+    with db.engine.begin() as conn:
+        for name in ("latitude", "longitude"):
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE hospitals ADD COLUMN {name} DOUBLE PRECISION"))
+                click.echo(f"added hospitals.{name}")
+    located = db.session.query(Hospital.id).filter(Hospital.latitude.isnot(None)).count()
+    click.echo(f"{located} hospitals have coordinates")
@@ -0,0 +1,44 @@
+# gunicorn.conf.py
+# Serving profiles, picked with WEB_WORKER_CLASS:
+#
+#   gevent   (default) WEB_WORKER_CONNECTIONS greenlets per worker. Idle
+#            availability streams only park a greenlet on the shared feed
+#            (feed.py), so one worker holds tens of thousands of them. DB
+#            sessions are per app context, hence per greenlet, and SQLAlchemy's
+#            pool is gevent-aware once gunicorn has monkey-patched the stdlib;
+#            mysql-connector switches to its pure-Python protocol there
+#            (dbrouting.py), as the C extension would block the hub. Falls
+#            back to gthread if gevent isn't installed.
+#   gthread  WEB_THREADS threads per worker. Pages poll availability instead
+#            of streaming (AVAILABILITY_STREAM, feed.py).
+#   sync     one request per worker process; also polls. Small deployments.
+#
+# Size DB_POOL_SIZE (dbrouting.py) to the requests a worker runs at once, not to
+# its open streams: streams give their connection back before they start
+# waiting. Raise the open-file limit (ulimit -n) above the connection target.
+#
+# WEB_PRELOAD (default on, except for gevent) builds the app once in the master
+# and forks the workers from it: a new or restarted worker serves at once
+# instead of importing Flask, SQLAlchemy and the views again, and the workers
+# share those pages of memory. post_fork() then hands each worker its own DB
+# connections and cache-bus listener (app.after_fork). gevent patches the
+# stdlib when the worker starts, which is too late for a preloaded app.
+import importlib.util
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get("WEB_WORKER_CLASS") or ("gevent" if importlib.util.find_spec("gevent") else "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("WEB_THREADS", 8 if worker_class == "gthread" else 1))
+worker_connections = int(os.environ.get("WEB_WORKER_CONNECTIONS", 20000))
+# a request must be allowed to outlive AVAILABILITY_STREAM_TIMEOUT (55s) before it counts as hung
+timeout = int(os.environ.get("WEB_TIMEOUT", 75))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+graceful_timeout = 30
+preload_app = os.environ.get("WEB_PRELOAD", "0" if worker_class == "gevent" else "1") == "1"
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import app, after_fork
+        after_fork(app)
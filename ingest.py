@@ -0,0 +1,368 @@
+# ingest.py
+# Bulk loading of hospital, doctor and bed-capacity feeds.
+#
+#   flask ingest hospitals feed.csv [--dry-run] [--batch-size 2000]
+#   flask ingest doctors doctors.jsonl
+#   flask ingest capacity beds.csv
+#
+# Input is CSV (header row) or JSONL, streamed and processed in fixed-size
+# batches, so memory stays bounded regardless of file size. Each batch costs a
+# handful of statements: one SELECT to find existing rows by natural key, one
+# executemany INSERT for new rows and one executemany UPDATE for existing ones.
+# Natural keys: hospitals (name, city); doctors (hospital name, hospital city,
+# doctor name). Invalid rows are reported with their line number and skipped;
+# --dry-run only validates.
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, update, select, tuple_, bindparam, case
+
+from models import db, BED_TYPES, Hospital, Doctor
+from cache import hospital_cache
+import search
+import rollups
+
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+# --- reading ---
+def read_rows(stream, fmt):
+    """Yield (line_no, dict) from a CSV or JSONL text stream."""
+    if fmt == "jsonl":
+        for line_no, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield line_no, RowError(f"bad JSON: {exc.msg}")
+                    continue
+                if not isinstance(row, dict):
+                    yield line_no, RowError("expected a JSON object")
+                    continue
+                yield line_no, row
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+# --- validation ---
+def text_field(row, field, required=False, max_len=None):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ""
+    if required and not value:
+        raise RowError(f"{field} is required")
+    if max_len and len(value) > max_len:
+        raise RowError(f"{field} longer than {max_len}")
+    return value or None
+
+
+def count_field(row, field, default=0):
+    value = row.get(field)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be an integer")
+    if value < 0:
+        raise RowError(f"{field} must be >= 0")
+    return value
+
+
+def coord_field(row, field, limit):
+    value = row.get(field)
+    if value is None or value == "":
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be a number")
+    if not -limit <= value <= limit:
+        raise RowError(f"{field} must be between -{limit} and {limit}")
+    return value
+
+
+def clean_hospital(row):
+    out = {
+        "name": text_field(row, "name", required=True, max_len=255),
+        "city": text_field(row, "city", required=True, max_len=100),
+        "address": text_field(row, "address"),
+        "contact": text_field(row, "contact", max_len=50),
+        "latitude": coord_field(row, "latitude", 90),
+        "longitude": coord_field(row, "longitude", 180),
+    }
+    if (out["latitude"] is None) != (out["longitude"] is None):
+        raise RowError("latitude and longitude must be given together")
+    for t in BED_TYPES:
+        out[f"{t}_total"] = count_field(row, f"{t}_total")
+    return out
+
+
+def clean_capacity(row):
+    out = {
+        "name": text_field(row, "name", required=True, max_len=255),
+        "city": text_field(row, "city", required=True, max_len=100),
+    }
+    present = [t for t in BED_TYPES if row.get(f"{t}_total") not in (None, "")]
+    if not present:
+        raise RowError("no *_total columns")
+    for t in present:
+        out[f"{t}_total"] = count_field(row, f"{t}_total")
+    return out
+
+
+def clean_doctor(row):
+    return {
+        "hospital_name": text_field(row, "hospital_name", required=True, max_len=255),
+        "hospital_city": text_field(row, "hospital_city", required=True, max_len=100),
+        "name": text_field(row, "name", required=True, max_len=150),
+        "specialization": text_field(row, "specialization", max_len=150),
+        "photo": text_field(row, "photo", max_len=255),
+        "available": count_field(row, "available", default=1),
+        "experience": count_field(row, "experience"),
+        "age": count_field(row, "age", default=None),
+    }
+
+
+# --- writing ---
+def existing_hospitals(conn, keys):
+    """{(name, city): row(id, address, contact, latitude, longitude)} for the given natural keys (one query)."""
+    if not keys:
+        return {}
+    rows = conn.execute(
+        select(Hospital.name, Hospital.city, Hospital.id, Hospital.address, Hospital.contact,
+               Hospital.latitude, Hospital.longitude)
+        .where(tuple_(Hospital.name, Hospital.city).in_(keys))
+    )
+    return {(r.name, r.city): r for r in rows}
+
+
+def hospital_ids(conn, keys):
+    return {k: r.id for k, r in existing_hospitals(conn, keys).items()}
+
+
+def capacity_update(types):
+    """executemany UPDATE setting *_total and shifting *_available by the same delta (never below 0).
+
+    Available columns come first in SET: MySQL evaluates assignments left to
+    right, so they must still see the old *_total.
+    """
+    values = []
+    for t in types:
+        total, avail = getattr(Hospital, f"{t}_total"), getattr(Hospital, f"{t}_available")
+        shifted = db.func.coalesce(avail, 0) + bindparam(f"new_{t}_total") - db.func.coalesce(total, 0)
+        values.append((avail, case((shifted < 0, 0), else_=shifted)))
+    for t in types:
+        values.append((getattr(Hospital, f"{t}_total"), bindparam(f"new_{t}_total")))
+    return update(Hospital).where(Hospital.id == bindparam("hid")).ordered_values(*values)
+
+
+def upsert_hospitals(conn, rows, insert_missing=True):
+    """Insert new hospitals and update existing ones; returns (inserted, updated, missing)."""
+    by_key = {(r["name"], r["city"]): r for r in rows}  # last row wins within a batch
+    current = existing_hospitals(conn, list(by_key))
+    existing = {k: row.id for k, row in current.items()}
+    new = [r for k, r in by_key.items() if k not in existing]
+    old = [(existing[k], r) for k, r in by_key.items() if k in existing]
+    # only rewrite details/search tokens where address or contact actually changed
+    changed = {k for k, r in by_key.items()
+               if k in current and "address" in r
+               and (r["address"], r["contact"]) != (current[k].address, current[k].contact)}
+    # rows without coordinates keep the ones already stored
+    moved = {k for k, r in by_key.items()
+             if k in current and r.get("latitude") is not None
+             and (r["latitude"], r["longitude"]) != (current[k].latitude, current[k].longitude)}
+
+    inserted = 0
+    if new and insert_missing:
+        conn.execute(insert(Hospital), [
+            dict(r, city_norm=search.normalize(r["city"]),
+                 **{f"{t}_available": r.get(f"{t}_total", 0) for t in BED_TYPES})
+            for r in new
+        ])
+        inserted = len(new)
+
+    # group updates by the set of columns they touch so each group is one executemany
+    groups = {}
+    for hid, r in old:
+        types = tuple(t for t in BED_TYPES if f"{t}_total" in r)
+        params = {"hid": hid, **{f"new_{t}_total": r[f"{t}_total"] for t in types}}
+        groups.setdefault(types, []).append(params)
+    for types, params in groups.items():
+        if types:
+            conn.execute(capacity_update(types), params)
+    if changed:
+        conn.execute(
+            update(Hospital).where(Hospital.id == bindparam("hid")).values(
+                address=bindparam("new_address"), contact=bindparam("new_contact")),
+            [{"hid": existing[k], "new_address": by_key[k]["address"], "new_contact": by_key[k]["contact"]}
+             for k in changed],
+        )
+    if moved:
+        conn.execute(
+            update(Hospital).where(Hospital.id == bindparam("hid")).values(
+                latitude=bindparam("new_latitude"), longitude=bindparam("new_longitude")),
+            [{"hid": existing[k], "new_latitude": by_key[k]["latitude"], "new_longitude": by_key[k]["longitude"]}
+             for k in moved],
+        )
+
+    if insert_missing:
+        # Core writes skip the mapper events, so refresh search tokens here
+        reindex = changed | {(r["name"], r["city"]) for r in new}
+        ids = hospital_ids(conn, list(reindex)) if inserted else existing
+        search.index_rows(conn, [(ids[k], k[0], by_key[k]["address"], k[1]) for k in reindex if k in ids])
+        return inserted, len(old), 0
+    return 0, len(old), len(new)
+
+
+def upsert_doctors(conn, rows):
+    by_key = {(r["hospital_name"], r["hospital_city"], r["name"]): r for r in rows}
+    hids = hospital_ids(conn, list({(k[0], k[1]) for k in by_key}))
+    resolved = {}
+    for key, r in by_key.items():
+        hid = hids.get((key[0], key[1]))
+        if hid is not None:
+            resolved[(hid, key[2])] = r
+    missing = len(by_key) - len(resolved)
+    if not resolved:
+        return 0, 0, missing
+
+    existing = {
+        (d.hospital_id, d.name): d.id
+        for d in conn.execute(
+            select(Doctor.hospital_id, Doctor.name, Doctor.id)
+            .where(tuple_(Doctor.hospital_id, Doctor.name).in_(list(resolved)))
+        )
+    }
+    fields = ("specialization", "photo", "available", "experience", "age")
+    new = [dict({f: r[f] for f in fields}, hospital_id=hid, name=name)
+           for (hid, name), r in resolved.items() if (hid, name) not in existing]
+    old = [dict({f"new_{f}": r[f] for f in fields}, did=existing[key])
+           for key, r in resolved.items() if key in existing]
+    if new:
+        conn.execute(insert(Doctor), new)
+    if old:
+        conn.execute(
+            update(Doctor).where(Doctor.id == bindparam("did")).values(**{f: bindparam(f"new_{f}") for f in fields}),
+            old,
+        )
+    return len(new), len(old), missing
+
+
+KINDS = {
+    "hospitals": (clean_hospital, lambda conn, rows: upsert_hospitals(conn, rows)),
+    "capacity": (clean_capacity, lambda conn, rows: upsert_hospitals(conn, rows, insert_missing=False)),
+    "doctors": (clean_doctor, upsert_doctors),
+}
+
+
+def ingest(kind, stream, fmt="csv", batch_size=2000, dry_run=False, progress=None):
+    """Stream rows from `stream` into the database; returns a stats dict."""
+    clean, write = KINDS[kind]
+    stats = {"rows": 0, "valid": 0, "invalid": 0, "inserted": 0, "updated": 0, "missing": 0, "errors": []}
+    started = time.perf_counter()
+    for chunk in batched(read_rows(stream, fmt), batch_size):
+        good = []
+        for line_no, row in chunk:
+            stats["rows"] += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                good.append(clean(row))
+            except RowError as exc:
+                stats["invalid"] += 1
+                if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                    stats["errors"].append(f"line {line_no}: {exc}")
+        stats["valid"] += len(good)
+        if good and not dry_run:
+            with db.engine.begin() as conn:
+                inserted, updated, missing = write(conn, good)
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            stats["missing"] += missing
+        if progress:
+            progress(stats, time.perf_counter() - started)
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+    if not dry_run and kind != "doctors":
+        hospital_cache.invalidate_all()
+        rollups.rebuild_occupancy()
+        db.session.commit()
+    return stats
+
+
+# --- CLI ---
+def echo_progress(stats, elapsed):
+    rate = stats["rows"] / elapsed if elapsed else 0
+    click.echo(f"  {stats['rows']} rows  ({stats['invalid']} invalid)  {rate:,.0f} rows/s", err=True)
+
+
+def run_cli(kind, path, fmt, batch_size, dry_run):
+    fmt = detect_format(path, fmt)
+    if path == "-":
+        stats = ingest(kind, sys.stdin, fmt, batch_size, dry_run, progress=echo_progress)
+    else:
+        with open(path, encoding="utf-8", newline="") as stream:
+            stats = ingest(kind, stream, fmt, batch_size, dry_run, progress=echo_progress)
+    mode = "validated" if dry_run else "ingested"
+    click.echo(f"{mode} {stats['rows']} {kind} rows in {stats['seconds']:.2f}s "
+               f"({stats['rows_per_sec']:,.0f} rows/s): {stats['valid']} valid, {stats['invalid']} invalid, "
+               f"{stats['inserted']} inserted, {stats['updated']} updated, {stats['missing']} unknown hospital")
+    for err in stats["errors"]:
+        click.echo(f"  {err}", err=True)
+    if stats["invalid"] > len(stats["errors"]):
+        click.echo(f"  ... and {stats['invalid'] - len(stats['errors'])} more invalid rows", err=True)
+
+
+def ingest_command(kind, help_text):
+    @click.argument("path")
+    @click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="default: from file extension")
+    @click.option("--batch-size", default=2000, show_default=True)
+    @click.option("--dry-run", is_flag=True, help="validate only, write nothing")
+    @with_appcontext
+    def command(path, fmt, batch_size, dry_run):
+        run_cli(kind, path, fmt, batch_size, dry_run)
+    command.__doc__ = help_text
+    return click.command(kind)(command)
+
+
+@click.group("ingest")
+def ingest_cli():
+    """Bulk load hospital, doctor and bed-capacity feeds (CSV or JSONL, '-' for stdin)."""
+
+
+ingest_cli.add_command(ingest_command(
+    "hospitals", "Upsert hospitals by (name, city); columns: name, city, address, contact, latitude, longitude, <type>_total."))
+ingest_cli.add_command(ingest_command(
+    "capacity", "Update bed totals of existing hospitals by (name, city); available shifts by the same delta."))
+ingest_cli.add_command(ingest_command(
+    "doctors", "Upsert doctors by (hospital_name, hospital_city, name)."))
+
+
+def init_app(app):
+    app.cli.add_command(ingest_cli)
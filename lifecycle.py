@@ -0,0 +1,200 @@
+# lifecycle.py
+# Booking status transitions and counter reconciliation.
+#
+# Cancelling or discharging a booking returns its bed, and the doctor slot if
+# it took one: the status change and the counter increments run in one
+# transaction, both as conditional UPDATEs (status still active / available
+# still below total), so a double click or two operators racing can't return
+# the same bed twice. Freed beds are then offered to the waitlist.
+#
+# reconcile() recomputes what *_available should be from the bookings table
+# with a single GROUP BY and reports (optionally fixes) any drift.
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, func, case, bindparam
+
+from models import db, BED_TYPES, Hospital, Doctor, Booking
+from reservations import ReservationError, available_column, MAX_ATTEMPTS, backoff
+from cache import hospital_cache
+from waitlist import waitlist_engine
+import rollups
+
+ACTIVE = ("pending", "confirmed")
+FINAL = ("cancelled", "discharged")
+
+
+class TransitionError(ReservationError):
+    message = "Booking can no longer be changed."
+
+
+def return_beds(hospital_id, bed_type, n):
+    """Add n beds back, never above *_total.
+
+    The rollup is bumped by the full n; if the cap kicked in the counter had
+    already drifted, and the next reconcile/rollup rebuild settles both.
+    """
+    avail = available_column(bed_type)
+    total = getattr(Hospital, f"{bed_type}_total")
+    raised = func.coalesce(avail, 0) + n
+    db.session.execute(
+        update(Hospital).where(Hospital.id == hospital_id)
+        .values({avail: case((raised > func.coalesce(total, 0), func.coalesce(total, 0)), else_=raised)})
+        .execution_options(synchronize_session=False)
+    )
+    rollups.bump(hospital_id, bed_type, available=n)
+
+
+def return_doctors(counts):
+    """Give back doctor slots: counts is {doctor_id: n}; NULL ids (no doctor) are skipped."""
+    params = [{"did": did, "n": n} for did, n in counts.items() if did]
+    if params:
+        doctors = Doctor.__table__
+        db.session.execute(
+            update(doctors).where(doctors.c.id == bindparam("did"))
+            .values(available=doctors.c.available + bindparam("n")),
+            params,
+        )
+
+
+def after_release(hospital_id, bed_types):
+    hospital_cache.invalidate_hospital(hospital_id, kind="counts")
+    return waitlist_engine.release(hospital_id, bed_types)
+
+
+def transition(booking_id, status):
+    """Move one active booking to cancelled/discharged and return its bed; returns the Booking."""
+    if status not in FINAL:
+        raise TransitionError(f"Unknown status: {status}")
+    b = db.session.get(Booking, booking_id)
+    if b is None:
+        raise TransitionError("Booking not found.")
+    result = db.session.execute(
+        update(Booking).where(Booking.id == booking_id, Booking.status.in_(ACTIVE))
+        .values(status=status).execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        raise TransitionError()
+    return_beds(b.hospital_id, b.bed_type, 1)
+    return_doctors({b.doctor_id: 1})
+    db.session.commit()
+    after_release(b.hospital_id, [b.bed_type])
+    return b
+
+
+def discharge_ward(hospital_id, bed_type, booking_ids=None):
+    """Discharge every active booking of one bed type at a hospital (or just booking_ids); returns the count.
+
+    The doctors to give slots back to are counted first (locking the rows on
+    MySQL); if the UPDATE then discharges a different number of bookings, a
+    concurrent cancel got in between (SQLite doesn't lock on SELECT) and the
+    whole thing is retried.
+    """
+    available_column(bed_type)
+    active = [Booking.hospital_id == hospital_id, Booking.bed_type == bed_type, Booking.status.in_(ACTIVE)]
+    if booking_ids:
+        active.append(Booking.id.in_(booking_ids))
+    for attempt in range(MAX_ATTEMPTS):
+        rows = db.session.execute(
+            select(Booking.doctor_id, func.count().label("n"), func.max(Booking.id).label("last"))
+            .where(*active).group_by(Booking.doctor_id).with_for_update()
+        ).all()
+        n = sum(r.n for r in rows)
+        if n:
+            # bookings made after the count aren't part of this discharge
+            last = max(r.last for r in rows)
+            result = db.session.execute(update(Booking).where(*active, Booking.id <= last)
+                                        .values(status="discharged").execution_options(synchronize_session=False))
+            if result.rowcount != n:
+                db.session.rollback()
+                backoff(attempt)
+                continue
+            return_beds(hospital_id, bed_type, n)
+            return_doctors({r.doctor_id: r.n for r in rows})
+        db.session.commit()
+        if n:
+            after_release(hospital_id, [bed_type])
+        return n
+    raise TransitionError("The ward kept changing; try again.")
+
+
+# --- reconciliation ---
+def reconcile(fix=False):
+    """Compare *_available with total - active bookings; returns a list of drift dicts.
+
+    One grouped aggregate over bookings plus one pass over hospitals, instead of
+    a count per hospital. With fix=True each drifted counter is reset, but only
+    if it hasn't changed since it was read (conditional UPDATE).
+    """
+    active = {
+        (r.hospital_id, r.bed_type): r.n
+        for r in db.session.execute(
+            select(Booking.hospital_id, Booking.bed_type, func.count().label("n"))
+            .where(Booking.status.in_(ACTIVE))
+            .group_by(Booking.hospital_id, Booking.bed_type)
+        )
+    }
+    cols = [Hospital.id]
+    for t in BED_TYPES:
+        cols += [getattr(Hospital, f"{t}_total"), getattr(Hospital, f"{t}_available")]
+    drift = []
+    for row in db.session.execute(select(*cols)):
+        for i, t in enumerate(BED_TYPES):
+            total, avail = row[1 + 2 * i] or 0, row[2 + 2 * i] or 0
+            used = active.get((row.id, t), 0)
+            expected = max(0, total - used)
+            if avail != expected:
+                drift.append({"hospital_id": row.id, "bed_type": t, "total": total, "active": used,
+                              "available": avail, "expected": expected})
+
+    if fix and drift:
+        fixed_hospitals = set()
+        for t in BED_TYPES:
+            params = [{"hid": d["hospital_id"], "seen": d["available"], "expected": d["expected"]}
+                      for d in drift if d["bed_type"] == t]
+            if not params:
+                continue
+            col = getattr(Hospital, f"{t}_available")
+            db.session.execute(
+                update(Hospital.__table__)
+                .where(Hospital.id == bindparam("hid"), func.coalesce(col, 0) == bindparam("seen"))
+                .values({col.key: bindparam("expected")}),
+                params,
+            )
+            fixed_hospitals.update(p["hid"] for p in params)
+        rollups.rebuild_occupancy()
+        db.session.commit()
+        for hid in fixed_hospitals:
+            hospital_cache.invalidate_hospital(hid, kind="counts")
+    return drift
+
+
+@click.group("bookings")
+def bookings_cli():
+    """Booking maintenance."""
+
+
+@bookings_cli.command("reconcile")
+@click.option("--fix", is_flag=True, help="reset drifted counters to the computed value")
+@click.option("--every", type=float, default=0, help="repeat every N seconds (for a worker dyno / cron-less hosts)")
+@with_appcontext
+def reconcile_command(fix, every):
+    """Recompute bed availability from bookings and report drift."""
+    while True:
+        started = time.perf_counter()
+        drift = reconcile(fix=fix)
+        for d in drift:
+            click.echo(f"hospital {d['hospital_id']} {d['bed_type']}: available={d['available']} "
+                       f"expected={d['expected']} (total={d['total']}, active={d['active']})")
+        click.echo(f"{len(drift)} drifted counters{' fixed' if fix and drift else ''} "
+                   f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        db.session.remove()
+        if not every:
+            break
+        time.sleep(every)
+
+
+def init_app(app):
+    app.cli.add_command(bookings_cli)
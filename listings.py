@@ -0,0 +1,52 @@
+# listings.py
+# Read paths shared by the page views (views.py) and the JSON API (api.py).
+from datetime import datetime
+
+from sqlalchemy.orm import joinedload
+
+from models import db, Hospital, Booking
+from cache import hospital_cache, hospital_snapshot
+from bedindex import bed_index
+from pagination import paginate
+import search
+
+# "STAR Hospital first" is part of the sort key (rank, id), so it stays first
+# and stable across pages instead of being re-sorted per page. The rank is a
+# generated column with its own index, so pages are read in order, unsorted.
+LISTING_ORDERS = {
+    "index": ([(Hospital.listing_rank, "asc"), (Hospital.id, "asc")],
+              lambda h: [0 if h.name == "STAR Hospital" else 1, h.id]),
+    "all": ([(Hospital.id, "asc")], lambda h: [h.id]),
+}
+
+
+def hospital_page(view, city, cursor, limit):
+    """One page of hospital snapshots for a listing view; returns (hospitals, next_cursor)."""
+    order, key = LISTING_ORDERS[view]
+
+    def load():
+        rows, next_cursor = paginate(search.filter_city(Hospital.query, city), order, key, cursor, limit)
+        return [hospital_snapshot(h) for h in rows], next_cursor
+
+    hospitals, next_cursor = hospital_cache.get_list(view, city, load, page=(cursor, limit))
+    # the cached page fixes which hospitals are listed; their counters come from the live index
+    return [bed_index.overlay(h) for h in hospitals], next_cursor
+
+
+def booking_page(patient_id, cursor, limit):
+    """Newest-first page of a patient's bookings, served by ix_bookings_patient_created."""
+    query = Booking.query.filter(Booking.patient_id == patient_id).options(
+        joinedload(Booking.hospital).load_only(Hospital.id, Hospital.name)
+    )
+    return paginate(query, [(Booking.created_at, "desc"), (Booking.id, "desc")],
+                    lambda b: [b.created_at, b.id], cursor, limit, kinds=[datetime, int])
+
+
+def load_hospital_snapshot(id):
+    # fills may read a replica (see dbrouting.py): counters come from the bed index
+    return hospital_snapshot(db.session.get(Hospital, id))
+
+
+def live_hospital(id):
+    """Cached snapshot of one hospital with live counters from the bed index, or None."""
+    return bed_index.overlay(hospital_cache.get_hospital(id, load_hospital_snapshot))
@@ -0,0 +1,255 @@
+# metrics.py
+# Prometheus metrics at /metrics, without extra dependencies.
+#
+# Per request we record total latency, time spent in SQL (from querycount) and
+# time spent rendering templates (Flask's template signals), labelled by
+# endpoint rather than path so the label set stays small. Connection-pool
+# checkout waits are timed by wrapping each engine's pool.connect(). Cache and
+# pool gauges are read when /metrics is scraped.
+#
+# Every process keeps its own registry, so with several gunicorn workers each
+# scrape sees one worker; scrape them individually or aggregate with a
+# per-instance label. Set METRICS_TOKEN to require "Authorization: Bearer ...".
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, abort, g, request, before_render_template, template_rendered
+
+from models import db
+from cache import hospital_cache
+import querycount
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labels, k), v) for k, v in sorted(self._values.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 2)
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted(self._values.items())
+            items = [(k, list(v)) for k, v in items]
+        for key, row in items:
+            cumulative = 0
+            for le, n in zip(self.buckets, row):
+                cumulative += n
+                out.append((f"{self.name}_bucket", _labels(self.labels, key, f'le="{le}"'), cumulative))
+            out.append((f"{self.name}_bucket", _labels(self.labels, key, 'le="+Inf"'), row[-1]))
+            out.append((f"{self.name}_sum", _labels(self.labels, key), row[-2]))
+            out.append((f"{self.name}_count", _labels(self.labels, key), row[-1]))
+        return out
+
+
+class Gauge:
+    """Value computed at scrape time by `fn()` -> {label values tuple: value}.
+
+    kind="counter" for monotonic totals kept elsewhere (e.g. cache hits).
+    """
+
+    def __init__(self, name, help, fn, labels=(), kind="gauge"):
+        self.name, self.help, self.labels, self.fn, self.kind = name, help, tuple(labels), fn, kind
+
+    def samples(self):
+        return [(self.name, _labels(self.labels, k), v) for k, v in sorted(self.fn().items())]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in m.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+requests_total = registry.add(Counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status")))
+request_seconds = registry.add(Histogram(
+    "http_request_duration_seconds", "Request latency until the response is returned.", ("endpoint", "method")))
+db_seconds = registry.add(Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request.", ("endpoint",)))
+db_queries = registry.add(Histogram(
+    "http_request_db_queries", "SQL statements per request.", ("endpoint",), buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55)))
+render_seconds = registry.add(Histogram(
+    "http_request_render_seconds", "Time spent rendering templates per request.", ("endpoint",)))
+checkout_seconds = registry.add(Histogram(
+    "db_pool_checkout_seconds", "Wait for a pooled DB connection (including opening new ones).", ("bind",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)))
+
+
+def _cache_stat(key):
+    return lambda: {(): hospital_cache.stats()[key]}
+
+
+registry.add(Gauge("hospital_cache_hits_total", "Hospital cache hits.", _cache_stat("hits"), kind="counter"))
+registry.add(Gauge("hospital_cache_misses_total", "Hospital cache misses.", _cache_stat("misses"), kind="counter"))
+registry.add(Gauge("hospital_cache_evictions_total", "Hospital cache evictions.", _cache_stat("evictions"), kind="counter"))
+registry.add(Gauge("hospital_cache_entries", "Entries in the hospital cache.", _cache_stat("size")))
+registry.add(Gauge("hospital_cache_hit_ratio", "Hospital cache hits / lookups.", _cache_stat("hit_rate")))
+
+
+# --- per-request hooks ---
+def endpoint_label():
+    return request.endpoint or "unmatched"
+
+
+def _render_started(sender, template, context, **extra):
+    g.setdefault("render_starts", []).append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    starts = g.get("render_starts")
+    if starts:
+        elapsed = time.perf_counter() - starts.pop()
+        if not starts:  # count nested renders once
+            g.render_time = g.get("render_time", 0.0) + elapsed
+
+
+# --- pool instrumentation ---
+def instrument_pool(bind, engine):
+    """Time checkouts from the engine's current pool (engine.dispose() swaps in a new, bare one)."""
+    pool = engine.pool
+    if getattr(pool, "_metrics_bind", None):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            checkout_seconds.observe(time.perf_counter() - started, bind)
+
+    pool.connect = timed_connect
+    pool._metrics_bind = bind
+
+
+_engines = {}  # bind name -> Engine, filled by init_app
+
+
+def after_fork():
+    """In a forked worker, after its engines were disposed: instrument the new pools."""
+    for bind, engine in _engines.items():
+        instrument_pool(bind, engine)
+
+
+def pool_gauge(method):
+    def read():
+        out = {}
+        for bind, engine in _engines.items():
+            fn = getattr(engine.pool, method, None)
+            if fn is not None:
+                try:
+                    out[(bind,)] = fn()
+                except (TypeError, NotImplementedError):
+                    pass
+        return out
+    return read
+
+
+registry.add(Gauge("db_pool_checked_out", "Connections currently checked out.", pool_gauge("checkedout"), ("bind",)))
+registry.add(Gauge("db_pool_size", "Configured pool size.", pool_gauge("size"), ("bind",)))
+registry.add(Gauge("db_pool_overflow", "Connections opened beyond pool_size.", pool_gauge("overflow"), ("bind",)))
+
+
+def init_app(app):
+    app.config.setdefault("METRICS_TOKEN", os.environ.get("METRICS_TOKEN"))
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            bind = key or "default"
+            _engines[bind] = engine
+            instrument_pool(bind, engine)
+
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.render_time = 0.0
+
+    @app.after_request
+    def _record(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        endpoint = endpoint_label()
+        count, seconds = querycount.stats()
+        request_seconds.observe(time.perf_counter() - started, endpoint, request.method)
+        requests_total.inc(endpoint, request.method, str(response.status_code))
+        db_seconds.observe(seconds, endpoint)
+        db_queries.observe(count, endpoint)
+        render_seconds.observe(g.get("render_time", 0.0), endpoint)
+        if app.config.get("QUERY_STATS_HEADERS"):
+            response.headers["X-Render-Time-ms"] = f"{g.get('render_time', 0.0) * 1000:.2f}"
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        token = app.config["METRICS_TOKEN"]
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            abort(401)
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
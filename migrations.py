@@ -0,0 +1,268 @@
+# migrations.py
+# Versioned schema migrations: `flask db upgrade`, `flask db status`.
+#
+# Each migration is a function registered with @migration(version, ...). It
+# runs once, in version order, inside one transaction together with its row
+# in schema_migrations (MySQL commits DDL implicitly, so every step checks
+# what is already there and is safe to re-run after a failure). A fresh
+# database gets the whole current schema from migration 1 and the later ones
+# find nothing left to do; an existing database is brought forward step by
+# step.
+#
+#   1  baseline: missing tables, plus the columns earlier releases added by
+#      hand (`flask search reindex`, `flask geo init`) and the waitlist's
+#      priority-queue columns
+#   2  secondary indexes: hospitals.listing_rank + ix_hospitals_listing (home
+#      page order straight off an index), ix_bookings_hospital_type_status
+#      (ward discharge, reconciliation) and any other model index missing
+#   3  CHECK constraints on bed counters, coordinates and doctor availability
+#   4  bookings.idempotency_key + its unique index (batch booking API)
+#   5  waitlist columns, for databases that ran migration 1 before it added them
+#   6  bookings.doctor_id, so cancel/discharge can return the doctor slot
+#   7  fill hospitals.city_norm and hospital_tokens, which migration 1 only
+#      created (what `flask search reindex` does)
+#   8  seed occupancy_rollup from hospitals (the admin dashboard's totals)
+#
+# explain_routes.py checks that the routes' queries actually use the indexes.
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text, select, insert
+from sqlalchemy.schema import CreateTable
+
+from models import (db, Hospital, Doctor, Booking, Waitlist, SchemaMigration, HOSPITAL_CHECKS, DOCTOR_CHECKS,
+                    LISTING_RANK_SQL)
+import rollups
+import search
+
+MIGRATIONS = {}  # version -> (description, fn(conn))
+
+
+class MigrationError(click.ClickException):
+    pass
+
+
+def migration(version, description):
+    def register(fn):
+        assert version not in MIGRATIONS, f"duplicate migration {version}"
+        MIGRATIONS[version] = (description, fn)
+        return fn
+    return register
+
+
+def columns(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def add_missing_columns(conn, table, names, defaults=None):
+    """ALTER in the named model columns the table lacks; defaults ({name: SQL literal}) fill existing rows."""
+    have = columns(conn, table.name)
+    for name in names:
+        if name in have:
+            continue
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {table.c[name].type.compile(dialect=conn.dialect)}"
+        if name in (defaults or {}):
+            ddl += f" DEFAULT {defaults[name]}"
+        conn.execute(text(ddl))
+        click.echo(f"  added {table.name}.{name}")
+
+
+# columns a later migration adds: indexes on them are created by that migration
+LATER_COLUMNS = {"bookings": {"idempotency_key"}}
+
+
+def create_missing_indexes(conn, table):
+    """Create the model's indexes on table that the database lacks."""
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+    have = columns(conn, table.name)
+    for index in table.indexes:
+        if index.name in existing:
+            continue
+        missing = {c.name for c in index.columns} - have
+        if missing and missing <= LATER_COLUMNS.get(table.name, set()):
+            continue
+        if missing:
+            raise MigrationError(f"index {index.name} needs {table.name}.{', '.join(sorted(missing))}, "
+                                 "which the database lacks")
+        index.create(conn)
+        click.echo(f"  created index {index.name}")
+
+
+def add_checks(conn, table, checks):
+    existing = {c["name"] for c in inspect(conn).get_check_constraints(table.name)}
+    missing = [(name, sql) for name, sql in checks if name not in existing]
+    for name, sql in missing:
+        bad = conn.execute(text(f"SELECT COUNT(*) FROM {table.name} WHERE NOT ({sql})")).scalar()
+        if bad:
+            raise MigrationError(f"{bad} {table.name} rows violate {name} ({sql}); correct them and re-run "
+                                 "(drifted bed counters: `flask bookings reconcile --fix`)")
+    if not missing:
+        return
+    if conn.dialect.name == "sqlite":
+        rebuild_sqlite(conn, table)
+    else:
+        for name, sql in missing:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD CONSTRAINT {name} CHECK ({sql})"))
+    click.echo(f"  {table.name}: added " + ", ".join(name for name, _ in missing))
+
+
+def rebuild_sqlite(conn, table):
+    """SQLite can't add a constraint to an existing table: copy the rows into one created from the model."""
+    if conn.exec_driver_sql("PRAGMA foreign_keys").scalar():
+        # DROP TABLE would run the ON DELETE actions of the tables referencing this one
+        raise MigrationError(f"rebuilding {table.name} needs PRAGMA foreign_keys=OFF")
+    old = columns(conn, table.name)
+    unknown = old - {c.name for c in table.columns}
+    if unknown:
+        raise MigrationError(f"{table.name} has columns the model doesn't know ({', '.join(sorted(unknown))}); "
+                             "rebuilding it would drop them")
+    copied = ", ".join(c.name for c in table.columns if c.computed is None and c.name in old)
+    new = table.to_metadata(db.metadata, name=f"{table.name}__new")
+    try:
+        conn.execute(text(f"DROP TABLE IF EXISTS {new.name}"))
+        conn.execute(CreateTable(new))
+    finally:
+        db.metadata.remove(new)
+    conn.execute(text(f"INSERT INTO {new.name} ({copied}) SELECT {copied} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))  # its indexes go with it
+    conn.execute(text(f"ALTER TABLE {new.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+# --- migrations ---
+@migration(1, "baseline schema")
+def baseline(conn):
+    db.metadata.create_all(conn, checkfirst=True)
+    have = columns(conn, "hospitals")
+    if "city_norm" not in have:
+        conn.execute(text("ALTER TABLE hospitals ADD COLUMN city_norm VARCHAR(100)"))
+        click.echo("  added hospitals.city_norm (filled by migration 7)")
+    for name in ("latitude", "longitude"):
+        if name not in have:
+            conn.execute(text(f"ALTER TABLE hospitals ADD COLUMN {name} DOUBLE PRECISION"))
+            click.echo(f"  added hospitals.{name}")
+    waitlist_columns(conn)
+
+
+def waitlist_columns(conn):
+    # the priority queue's columns (waitlist.py); existing rows were plain waiting entries
+    add_missing_columns(conn, Waitlist.__table__, ["city_norm", "priority", "status", "name", "contact", "booking_id"],
+                        defaults={"city_norm": "''", "priority": "0", "status": "'waiting'"})
+
+
+@migration(2, "secondary indexes")
+def indexes(conn):
+    if "listing_rank" not in columns(conn, "hospitals"):
+        # virtual: computed on read, stored only in ix_hospitals_listing
+        conn.execute(text("ALTER TABLE hospitals ADD COLUMN listing_rank SMALLINT "
+                          f"GENERATED ALWAYS AS ({LISTING_RANK_SQL}) VIRTUAL"))
+        click.echo("  added hospitals.listing_rank")
+    for table in db.metadata.sorted_tables:
+        create_missing_indexes(conn, table)
+
+
+@migration(3, "check constraints")
+def checks(conn):
+    add_checks(conn, Hospital.__table__, HOSPITAL_CHECKS)
+    add_checks(conn, Doctor.__table__, DOCTOR_CHECKS)
+
+
+@migration(4, "booking idempotency keys")
+def idempotency_keys(conn):
+    if "idempotency_key" not in columns(conn, "bookings"):
+        conn.execute(text("ALTER TABLE bookings ADD COLUMN idempotency_key VARCHAR(64)"))
+        click.echo("  added bookings.idempotency_key")
+    create_missing_indexes(conn, Booking.__table__)
+
+
+@migration(5, "waitlist columns")
+def waitlist_repair(conn):
+    # migration 1 didn't add them before; databases upgraded then still lack them
+    waitlist_columns(conn)
+    create_missing_indexes(conn, Waitlist.__table__)
+
+
+@migration(6, "booking doctors")
+def booking_doctors(conn):
+    # bookings made before this never give a doctor slot back; reconcile doesn't track doctors
+    add_missing_columns(conn, Booking.__table__, ["doctor_id"])
+
+
+@migration(7, "search backfill")
+def search_backfill(conn):
+    # every hospital, not just NULL city_norm: rows written outside the ORM may lack tokens
+    last_id, done = 0, 0
+    while True:
+        batch = search.reindex_batch(conn, last_id, 1000)
+        if not batch:
+            break
+        last_id = batch[-1].id
+        done += len(batch)
+    click.echo(f"  indexed {done} hospitals")
+
+
+@migration(8, "occupancy rollup")
+def occupancy_rollup(conn):
+    # the rollup was only filled for cities touched after it was added
+    rollups.rebuild_occupancy(conn)
+    click.echo("  rebuilt occupancy_rollup")
+
+
+# --- runner ---
+def applied_versions(conn):
+    return {row.version: row for row in conn.execute(select(SchemaMigration))}
+
+
+def upgrade(target=None):
+    """Apply pending migrations up to target (default: all); returns the versions applied."""
+    engine = db.engine
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    done = []
+    for version in sorted(MIGRATIONS):
+        if version in applied or (target is not None and version > target):
+            continue
+        description, fn = MIGRATIONS[version]
+        click.echo(f"applying {version}: {description}")
+        with engine.begin() as conn:
+            if conn.dialect.name == "sqlite":
+                # pysqlite only opens a transaction before DML; include the DDL too
+                conn.exec_driver_sql("BEGIN")
+            fn(conn)
+            conn.execute(insert(SchemaMigration).values(version=version, description=description))
+        done.append(version)
+    return done
+
+
+# --- CLI: flask db ---
+@click.group("db")
+def db_cli():
+    """Schema migrations."""
+
+
+@db_cli.command("upgrade")
+@click.option("--to", "target", type=int, help="stop after this version")
+@with_appcontext
+def upgrade_command(target):
+    """Apply pending schema migrations."""
+    done = upgrade(target)
+    click.echo(f"applied {len(done)} migration(s)" if done else "schema is up to date")
+
+
+@db_cli.command("status")
+@with_appcontext
+def status_command():
+    """List migrations and whether they have been applied."""
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        applied = {}
+    else:
+        with db.engine.connect() as conn:
+            applied = applied_versions(conn)
+    for version, (description, _) in sorted(MIGRATIONS.items()):
+        row = applied.get(version)
+        click.echo(f"{version:>3}  {description:<24}{row.applied_at if row else 'pending'}")
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
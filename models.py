@@ -0,0 +1,213 @@
+# models.py
+# SQLAlchemy models, kept apart from app.py so helper modules can import them
+# without importing the whole Flask app.
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+from sqlalchemy.dialects import sqlite
+
+from dbrouting import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+BED_TYPES = ("icu", "oxygen", "normal", "ventilator")
+
+# SQLite keeps datetimes as text. Store them in CURRENT_TIMESTAMP's own format
+# (no microseconds) so server-default rows and bound values compare correctly,
+# e.g. in keyset cursors on created_at.
+Timestamp = db.DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite",
+)
+
+
+# Row invariants enforced by the database (migration 3 adds them to existing
+# tables). NULL counters pass, as CHECK treats unknown as true.
+HOSPITAL_CHECKS = [
+    *[(f"ck_hospitals_{t}_beds", f"{t}_total >= 0 AND {t}_available >= 0 AND {t}_available <= {t}_total")
+      for t in BED_TYPES],
+    ("ck_hospitals_coordinates", "latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180"),
+]
+DOCTOR_CHECKS = [("ck_doctors_available", "available >= 0")]
+LISTING_RANK_SQL = "CASE WHEN name = 'STAR Hospital' THEN 0 ELSE 1 END"
+
+
+# --- MODELS ---
+class Hospital(db.Model):
+    __tablename__ = "hospitals"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    address = db.Column(db.Text)
+    city = db.Column(db.String(100))
+    # lower-cased, accent/punctuation-free copy of city, kept in sync by search.py
+    city_norm = db.Column(db.String(100))
+    contact = db.Column(db.String(50))
+    icu_total = db.Column(db.Integer, default=0)
+    oxygen_total = db.Column(db.Integer, default=0)
+    normal_total = db.Column(db.Integer, default=0)
+    ventilator_total = db.Column(db.Integer, default=0)
+    icu_available = db.Column(db.Integer, default=0)
+    oxygen_available = db.Column(db.Integer, default=0)
+    normal_available = db.Column(db.Integer, default=0)
+    ventilator_available = db.Column(db.Integer, default=0)
+    # WGS84 degrees; hospitals without them are left out of the nearest-bed finder (geo.py)
+    latitude = db.Column(db.Double)
+    longitude = db.Column(db.Double)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+    # sort key of the home page listing ("STAR Hospital" first), computed by the database
+    listing_rank = db.Column(db.SmallInteger, db.Computed(LISTING_RANK_SQL))
+
+    __table_args__ = (
+        # city filter + id order (keyset pages) in one index
+        db.Index("ix_hospitals_city_norm_id", "city_norm", "id"),
+        # natural key used by bulk ingestion upserts
+        db.Index("ix_hospitals_name_city", "name", "city"),
+        # unfiltered home page: keyset pages straight off the index, no sort
+        db.Index("ix_hospitals_listing", "listing_rank", "id"),
+        *[db.CheckConstraint(sql, name=name) for name, sql in HOSPITAL_CHECKS],
+    )
+
+    users = db.relationship("User", back_populates="hospital", lazy="dynamic")
+    bookings = db.relationship("Booking", back_populates="hospital", lazy="dynamic")
+    doctors = db.relationship("Doctor", back_populates="hospital", lazy="dynamic")
+
+
+class HospitalToken(db.Model):
+    """One row per normalized word of a hospital's name/address/city, for prefix search."""
+    __tablename__ = "hospital_tokens"
+    field = db.Column(db.String(10), primary_key=True)
+    token = db.Column(db.String(64), primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey("hospitals.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class User(UserMixin, db.Model):
+    __tablename__ = "users"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), nullable=False)
+    email = db.Column(db.String(150), unique=True, nullable=False)
+    phone = db.Column(db.String(30))
+    password = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.Enum("patient", "hospital", "admin"), default="patient")
+    hospital_id = db.Column(db.Integer, db.ForeignKey("hospitals.id"), nullable=True)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+
+    hospital = db.relationship("Hospital", back_populates="users", foreign_keys=[hospital_id])
+
+
+class Doctor(db.Model):
+    __tablename__ = "doctors"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), nullable=False)
+    specialization = db.Column(db.String(150))
+    photo = db.Column(db.String(255))
+    hospital_id = db.Column(db.Integer, db.ForeignKey("hospitals.id"))
+    available = db.Column(db.Integer, default=1)
+    experience = db.Column(db.Integer, default=0)
+    age = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+
+    __table_args__ = (
+        # doctor grid (filter by hospital, order by name) and ingestion upserts
+        db.Index("ix_doctors_hospital_name", "hospital_id", "name"),
+        *[db.CheckConstraint(sql, name=name) for name, sql in DOCTOR_CHECKS],
+    )
+
+    hospital = db.relationship("Hospital", back_populates="doctors")
+
+
+class Booking(db.Model):
+    __tablename__ = "bookings"
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    hospital_id = db.Column(db.Integer, db.ForeignKey("hospitals.id"))
+    bed_type = db.Column(db.Enum("icu", "oxygen", "normal", "ventilator"))
+    status = db.Column(db.Enum("pending", "confirmed", "cancelled", "discharged"), default="pending")
+    name = db.Column(db.String(150))
+    contact = db.Column(db.String(50))
+    symptoms = db.Column(db.Text)
+    id_proof = db.Column(db.String(255))
+    # client-chosen key of a batch API item (reservations.reserve_batch); NULL for form bookings
+    idempotency_key = db.Column(db.String(64))
+    # doctor whose slot the booking took; cancel/discharge gives it back (lifecycle.py)
+    doctor_id = db.Column(db.Integer)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+
+    __table_args__ = (
+        # "my bookings", newest first
+        db.Index("ix_bookings_patient_created", "patient_id", "created_at"),
+        # ward discharge; reconciliation's per-(hospital, bed type) count reads only this index
+        db.Index("ix_bookings_hospital_type_status", "hospital_id", "bed_type", "status"),
+        # one booking per key and account; a retried batch finds the original
+        db.Index("ix_bookings_patient_idempotency", "patient_id", "idempotency_key", unique=True),
+    )
+
+    patient = db.relationship("User", foreign_keys=[patient_id])
+    hospital = db.relationship("Hospital", back_populates="bookings")
+
+
+class Waitlist(db.Model):
+    __tablename__ = "waitlist"
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    bed_type = db.Column(db.Enum("icu", "oxygen", "normal", "ventilator"))
+    # normalized city the patient is waiting in; "" means any city
+    city_norm = db.Column(db.String(100), default="")
+    priority = db.Column(db.Integer, default=0)
+    status = db.Column(db.Enum("waiting", "allocated", "cancelled"), default="waiting")
+    name = db.Column(db.String(150))
+    contact = db.Column(db.String(50))
+    booking_id = db.Column(db.Integer, db.ForeignKey("bookings.id"), nullable=True)
+    created_at = db.Column(Timestamp, server_default=db.func.now())
+
+    __table_args__ = (
+        # startup rebuild / incremental sync load only waiting entries
+        db.Index("ix_waitlist_status_id", "status", "id"),
+        # per-patient duplicate check on enqueue
+        db.Index("ix_waitlist_patient_status", "patient_id", "status"),
+    )
+
+    patient = db.relationship("User", foreign_keys=[patient_id])
+    booking = db.relationship("Booking", foreign_keys=[booking_id])
+
+
+class SchemaMigration(db.Model):
+    """Applied schema migrations (migrations.py)."""
+    __tablename__ = "schema_migrations"
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255))
+    applied_at = db.Column(Timestamp, server_default=db.func.now())
+
+
+# --- analytics rollups (maintained by rollups.py) ---
+class OccupancyRollup(db.Model):
+    """Beds per (city, bed type), summed over hospitals; bumped in the same transaction as the counters."""
+    __tablename__ = "occupancy_rollup"
+    city_norm = db.Column(db.String(100), primary_key=True)
+    bed_type = db.Column(db.Enum("icu", "oxygen", "normal", "ventilator"), primary_key=True)
+    city = db.Column(db.String(100))
+    hospitals = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, default=0)
+    available = db.Column(db.Integer, default=0)
+
+
+class BookingHourly(db.Model):
+    """New bookings per hour and bed type, folded in by the compaction job."""
+    __tablename__ = "booking_hourly"
+    hour = db.Column(Timestamp, primary_key=True)
+    bed_type = db.Column(db.Enum("icu", "oxygen", "normal", "ventilator"), primary_key=True)
+    booked = db.Column(db.Integer, default=0)
+
+
+class UtilizationSample(db.Model):
+    """System-wide occupancy per bed type, one sample per hour (last compaction in that hour wins)."""
+    __tablename__ = "utilization_samples"
+    hour = db.Column(Timestamp, primary_key=True)
+    bed_type = db.Column(db.Enum("icu", "oxygen", "normal", "ventilator"), primary_key=True)
+    total = db.Column(db.Integer, default=0)
+    available = db.Column(db.Integer, default=0)
+
+
+class RollupState(db.Model):
+    """Compaction watermarks, e.g. the last booking id folded into booking_hourly."""
+    __tablename__ = "rollup_state"
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, default=0)
@@ -0,0 +1,73 @@
+# pagination.py
+# Keyset (cursor) pagination.
+#
+# Instead of OFFSET (which re-reads every skipped row) each page remembers the
+# sort key of its last row in an opaque cursor, and the next page starts with
+# WHERE (k1, k2) > (v1, v2) in the order's direction. With an index matching the
+# ORDER BY this costs the same on page 1000 as on page 1, and rows inserted
+# meanwhile never shift items between pages.
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, kinds):
+    """Decode a cursor into values; `kinds` gives the python type of each key (int/str/datetime)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(kinds):
+            raise ValueError("wrong cursor length")
+        return [datetime.fromisoformat(v) if kind is datetime else kind(v) for v, kind in zip(values, kinds)]
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(str(exc)) from exc
+
+
+def after(order, values):
+    """WHERE clause selecting rows strictly after `values` for an ORDER BY of (expr, "asc"|"desc") pairs."""
+    clauses = []
+    for i, (expr, direction) in enumerate(order):
+        past = expr > values[i] if direction == "asc" else expr < values[i]
+        ties = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*ties, past) if ties else past)
+    return or_(*clauses)
+
+
+def clamp_limit(limit):
+    try:
+        limit = int(limit or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        limit = DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def paginate(query, order, key, cursor=None, limit=DEFAULT_LIMIT, kinds=None):
+    """Return (rows, next_cursor) for one page.
+
+    order:  [(sql_expr, "asc"|"desc"), ...] - must end with a unique column
+    key:    function(row) -> list of sort values, matching `order`
+    kinds:  python types of the sort values, used to decode `cursor`
+    """
+    values = decode_cursor(cursor, kinds or [int] * len(order))
+    if values is not None:
+        query = query.filter(after(order, values))
+    query = query.order_by(*[e.asc() if d == "asc" else e.desc() for e, d in order])
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(key(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
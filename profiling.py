@@ -0,0 +1,157 @@
+# profiling.py
+# Opt-in per-request profiler for admins.
+#
+# With PROFILING=1, an admin request carrying "X-Profile: sample" (or just
+# "X-Profile: 1") is profiled by a background thread that samples the request
+# thread's stack every PROFILE_INTERVAL seconds and writes folded stacks
+# ("a;b;c 12" per line) - the input format of flamegraph.pl and speedscope.
+# "X-Profile: cprofile" runs cProfile instead and writes a .prof file for
+# pstats/snakeviz. The file name comes back in X-Profile-File and admins can
+# download it from /api/admin/profiles/<name>, so production hot paths can be
+# profiled without a redeploy or shell access.
+#
+# The sampler always runs on a real OS thread. Under gevent workers the
+# request is a greenlet sharing its thread with others, so the sampler reads
+# the greenlet's own suspended frame (gr_frame) while it is switched out, and
+# the thread's current frame while it runs: samples stay with the request, and
+# time it spends waiting on I/O shows up where it waits, as with threads.
+# A switch between those two reads can misattribute the odd sample.
+#
+# Only the view and template rendering are covered; a streamed response body
+# runs after the profile is closed.
+import _thread
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, abort, send_from_directory
+from flask_login import current_user, login_required
+
+from dbrouting import async_workers
+
+
+class StackSampler:
+    """Samples the calling request's Python stack on a timer; .folded() returns flamegraph input."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._running = True
+        if async_workers():
+            # threading is patched to greenlets, which would only run when the request yields
+            from gevent import monkey, getcurrent
+            self._spawn, get_ident, allocate_lock = monkey.get_original(
+                "_thread", ["start_new_thread", "get_ident", "allocate_lock"])
+            self._sleep = monkey.get_original("time", "sleep")
+            request_greenlet, thread_id = getcurrent(), get_ident()
+            self._frame = lambda: request_greenlet.gr_frame or sys._current_frames().get(thread_id)
+        else:
+            self._spawn, self._sleep, allocate_lock = _thread.start_new_thread, time.sleep, _thread.allocate_lock
+            thread_id = threading.get_ident()
+            self._frame = lambda: sys._current_frames().get(thread_id)
+        self._done = allocate_lock()
+
+    def start(self):
+        self._done.acquire()
+        self._spawn(self._run, ())
+
+    def stop(self):
+        self._running = False
+        with self._done:  # released when the sampler thread exits
+            pass
+
+    def _run(self):
+        try:
+            while True:
+                self._sleep(self.interval)
+                if not self._running:
+                    return
+                frame = self._frame()
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[";".join(reversed(stack))] += 1
+        finally:
+            self._done.release()
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def wants_profile():
+    mode = request.headers.get("X-Profile", "").lower()
+    if not mode or mode in ("0", "off"):
+        return None
+    if not (current_user.is_authenticated and current_user.role == "admin"):
+        return None
+    return "cprofile" if mode == "cprofile" else "sample"
+
+
+def profile_name(mode):
+    endpoint = (request.endpoint or "unmatched").replace(".", "-")
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.time_ns() % 10**6:06d}-{endpoint}" + (
+        ".prof" if mode == "cprofile" else ".folded")
+
+
+def stop_profile():
+    """Stop the running profiler, write its output; returns the file name (or None)."""
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return None
+    mode, p, name, directory = profiler
+    path = os.path.join(directory, name)
+    if mode == "cprofile":
+        p.disable()
+        p.dump_stats(path)
+    else:
+        p.stop()
+        with open(path, "w") as f:
+            f.write(p.folded())
+    return name
+
+
+def init_app(app):
+    app.config.setdefault("PROFILING", os.environ.get("PROFILING", "0") == "1")
+    app.config.setdefault("PROFILE_INTERVAL", float(os.environ.get("PROFILE_INTERVAL", 0.005)))
+    app.config.setdefault("PROFILE_DIR", os.environ.get("PROFILE_DIR", os.path.join(app.instance_path, "profiles")))
+
+    @app.before_request
+    def _start_profile():
+        if not app.config["PROFILING"] or "X-Profile" not in request.headers:
+            return
+        mode = wants_profile()
+        if mode is None:
+            return
+        directory = app.config["PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        if mode == "cprofile":
+            p = cProfile.Profile()
+            p.enable()
+        else:
+            p = StackSampler(app.config["PROFILE_INTERVAL"])
+            p.start()
+        g.profiler = (mode, p, profile_name(mode), directory)
+
+    @app.after_request
+    def _finish_profile(response):
+        name = stop_profile()
+        if name:
+            response.headers["X-Profile-File"] = name
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        stop_profile()
+
+    @app.route("/api/admin/profiles/<name>")
+    @login_required
+    def download_profile(name):
+        if current_user.role != "admin" or not app.config["PROFILING"]:
+            abort(404)
+        return send_from_directory(app.config["PROFILE_DIR"], name, as_attachment=True)
@@ -0,0 +1,71 @@
+# querycount.py
+# Per-request SQL query counter and timer.
+#
+# SQLAlchemy cursor events add every statement's count and duration to flask.g.
+# After each request the totals are logged, and if a route went over its query
+# budget (QUERY_BUDGET, or @query_budget(n) on the view) a warning is logged.
+# With QUERY_BUDGET_STRICT=1 (meant for tests and benchmarks) going over the
+# budget raises QueryBudgetExceeded instead, so N+1 regressions fail loudly.
+import os
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(n):
+    """Per-view override of QUERY_BUDGET."""
+    def decorator(view):
+        view.query_budget = n
+        return view
+    return decorator
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    if has_app_context() and "query_count" in g:
+        g.query_count += 1
+        g.query_time += time.perf_counter() - started
+
+
+def stats():
+    """(count, seconds) of SQL run so far in this request."""
+    return g.get("query_count", 0), g.get("query_time", 0.0)
+
+
+def init_app(app):
+    app.config.setdefault("QUERY_BUDGET", int(os.environ.get("QUERY_BUDGET", 10)))
+    app.config.setdefault("QUERY_BUDGET_STRICT", os.environ.get("QUERY_BUDGET_STRICT", "0") == "1")
+    app.config.setdefault("QUERY_STATS_HEADERS", os.environ.get("QUERY_STATS_HEADERS", "0") == "1")
+
+    @app.before_request
+    def _start_counting():
+        g.query_count = 0
+        g.query_time = 0.0
+
+    @app.after_request
+    def _check_budget(response):
+        count, seconds = stats()
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, "query_budget", app.config["QUERY_BUDGET"])
+        app.logger.debug("%s %s: %d queries, %.1f ms", request.method, request.path, count, seconds * 1000)
+        if app.config["QUERY_STATS_HEADERS"]:
+            response.headers["X-Query-Count"] = str(count)
+            response.headers["X-Query-Time-ms"] = f"{seconds * 1000:.2f}"
+        if count > budget:
+            message = f"{request.endpoint} ran {count} queries (budget {budget})"
+            if app.config["QUERY_BUDGET_STRICT"]:
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
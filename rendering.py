@@ -0,0 +1,152 @@
+# rendering.py
+# Cheaper page rendering: fragment cache, fingerprinted static URLs, page ETags.
+#
+# Fragments: templates call {{ fragment("_hospital_card.html", key, h=h) }}.
+# The rendered HTML is cached per process under (template, *key), where the
+# key carries the hospital id and a version of the data the fragment shows
+# (see version()), so a card is re-rendered only after its counters or details
+# change; superseded versions simply age out of the LRU. Fragments must not
+# depend on the current user or request.
+#
+# Static files: url_for("static", filename="css/style.css") yields
+# /static/css/style.<digest>.css, where digest is a hash of the file's
+# contents. Those URLs are served with a one-year immutable Cache-Control, so
+# browsers never revalidate them; a changed file gets a new URL. Unknown
+# digests (an old page after a deploy) fall back to the current file with the
+# normal short caching.
+#
+# Pages: views marked @etag_page get an ETag over the rendered body and answer
+# If-None-Match with 304, so an unchanged listing isn't sent again.
+#
+# Templates are compiled once per process by Jinja anyway; the compiled
+# bytecode is also kept in instance/jinja_cache (TEMPLATE_BYTECODE_CACHE) so
+# freshly started gunicorn workers skip the parse/compile step.
+import hashlib
+import os
+import re
+
+from flask import current_app, request
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from werkzeug.security import safe_join
+
+from cache import TTLCache
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+_fingerprinted = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[A-Za-z0-9]+)$")
+
+
+def etag_page(view):
+    """Serve this view's GET responses with an ETag and honour If-None-Match."""
+    view.etag_page = True
+    return view
+
+
+def version(*values):
+    """Short, process-local version of the data a fragment renders (e.g. a hospital snapshot)."""
+    parts = []
+    for v in values:
+        parts.append(tuple(v.values()) if isinstance(v, dict) else tuple(v) if isinstance(v, list) else v)
+    return hash(tuple(parts))
+
+
+class FragmentCache:
+    def __init__(self, maxsize=4096, ttl=600.0):
+        self.store = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.enabled = True
+
+    def init_app(self, app):
+        app.config.setdefault("FRAGMENT_CACHE", os.environ.get("FRAGMENT_CACHE", "1") == "1")
+        app.config.setdefault("FRAGMENT_CACHE_SIZE", int(os.environ.get("FRAGMENT_CACHE_SIZE", 4096)))
+        app.config.setdefault("FRAGMENT_CACHE_TTL", float(os.environ.get("FRAGMENT_CACHE_TTL", 600)))
+        self.enabled = app.config["FRAGMENT_CACHE"]
+        self.store.maxsize = app.config["FRAGMENT_CACHE_SIZE"]
+        self.store.ttl = app.config["FRAGMENT_CACHE_TTL"]
+        app.jinja_env.globals.update(fragment=self.fragment, version=version)
+
+    def fragment(self, template, key, **context):
+        cache_key = (template, *key)
+        html = self.store.get(cache_key) if self.enabled else None
+        if html is None:
+            html = Markup(current_app.jinja_env.get_template(template).render(context))
+            if self.enabled:
+                self.store.set(cache_key, html)
+        return html
+
+    def stats(self):
+        return self.store.stats()
+
+
+class StaticAssets:
+    def __init__(self):
+        self.app = None
+        self._digests = {}  # filename -> (mtime, digest)
+
+    def init_app(self, app):
+        self.app = app
+        app.url_defaults(self._fingerprint_url)
+        app.view_functions["static"] = self.serve
+
+    def digest(self, filename):
+        path = safe_join(self.app.static_folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        if mtime is None:
+            return None
+        cached = self._digests.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.md5(f.read()).hexdigest()[:12]
+        self._digests[filename] = (mtime, digest)
+        return digest
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint != "static" or not values.get("filename"):
+            return
+        digest = self.digest(values["filename"])
+        if digest:
+            stem, ext = os.path.splitext(values["filename"])
+            values["filename"] = f"{stem}.{digest}{ext}"
+
+    def serve(self, filename):
+        m = _fingerprinted.match(filename)
+        if m:
+            real = m["stem"] + m["ext"]
+            current = self.digest(real)
+            if current is not None:
+                response = self.app.send_static_file(real)
+                if current == m["digest"]:
+                    response.cache_control.no_cache = None
+                    response.cache_control.public = True
+                    response.cache_control.max_age = ASSET_MAX_AGE
+                    response.cache_control.immutable = True
+                return response
+        return self.app.send_static_file(filename)
+
+
+fragment_cache = FragmentCache()
+static_assets = StaticAssets()
+
+
+def init_app(app):
+    app.config.setdefault("TEMPLATE_BYTECODE_CACHE", os.environ.get("TEMPLATE_BYTECODE_CACHE", "1") == "1")
+    if app.config["TEMPLATE_BYTECODE_CACHE"]:
+        directory = os.path.join(app.instance_path, "jinja_cache")
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    fragment_cache.init_app(app)
+    static_assets.init_app(app)
+
+    @app.after_request
+    def _conditional_page(response):
+        view = app.view_functions.get(request.endpoint)
+        if (getattr(view, "etag_page", False) and request.method == "GET"
+                and response.status_code == 200 and not response.is_streamed):
+            response.add_etag()
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.vary.add("Cookie")
+            response.make_conditional(request)
+        return response
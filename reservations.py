@@ -0,0 +1,308 @@
+# reservations.py
+# Race-free bed/doctor reservation.
+#
+# Counters are decremented with a conditional UPDATE (... WHERE available > 0)
+# inside the same transaction that inserts the booking, so two workers can never
+# both take the last bed: the database serialises the row update and the loser
+# sees rowcount == 0. This behaves the same on SQLite (database-level write lock)
+# and MySQL/InnoDB (row lock). Lock conflicts (SQLite busy/locked, MySQL
+# deadlock / lock wait timeout, SQLSTATE 40001) are retried with jittered
+# backoff; see is_retryable().
+#
+# reserve_batch() books many beds for one account (dispatch, partner systems)
+# with one transaction per hospital instead of one per bed. Every item carries
+# an idempotency key stored on its booking, so a retried batch replays the
+# bookings it already made instead of taking more beds.
+import random
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import update, select, insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from models import db, BED_TYPES, Hospital, Doctor, Booking
+from cache import hospital_cache
+import rollups
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.02  # seconds; doubled per attempt
+BACKOFF_MAX = 0.5
+
+
+class ReservationError(Exception):
+    """Base class; `message` is safe to show to the user."""
+    message = "Reservation failed."
+
+    def __init__(self, message=None):
+        if message:
+            self.message = message
+        super().__init__(self.message)
+
+
+class NoBedsAvailable(ReservationError):
+    message = "No beds available of that type."
+
+
+class InvalidDoctor(ReservationError):
+    message = "Invalid doctor."
+
+
+class DoctorUnavailable(ReservationError):
+    message = "Doctor unavailable."
+
+
+def available_column(bed_type):
+    if bed_type not in BED_TYPES:
+        raise ReservationError(f"Unknown bed type: {bed_type}")
+    return getattr(Hospital, f"{bed_type}_available")
+
+
+def take_bed(hospital_id, bed_type, n=1):
+    """Atomically take n beds (all or none); returns True if they were taken."""
+    col = available_column(bed_type)
+    result = db.session.execute(
+        update(Hospital)
+        .where(Hospital.id == hospital_id, col >= n)
+        .values({col: col - n})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def take_doctor(hospital_id, doctor_id):
+    """Atomically decrement one doctor slot; raises if the doctor can't be booked."""
+    result = db.session.execute(
+        update(Doctor)
+        .where(Doctor.id == doctor_id, Doctor.hospital_id == hospital_id, Doctor.available > 0)
+        .values(available=Doctor.available - 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        return
+    doc = db.session.get(Doctor, doctor_id)
+    if not doc or doc.hospital_id != hospital_id:
+        raise InvalidDoctor()
+    raise DoctorUnavailable()
+
+
+def give_back_bed(hospital_id, bed_type):
+    """Undo take_bed() within the same transaction (the row is still locked by it)."""
+    col = available_column(bed_type)
+    db.session.execute(
+        update(Hospital).where(Hospital.id == hospital_id).values({col: col + 1})
+        .execution_options(synchronize_session=False)
+    )
+
+
+MYSQL_RETRYABLE = {1205, 1213}  # lock wait timeout, deadlock
+SQLITE_RETRYABLE = {5, 6}  # SQLITE_BUSY, SQLITE_LOCKED
+SERIALIZATION_FAILURE = "40001"
+
+
+def is_retryable(exc):
+    """Lock conflicts worth retrying, from the driver's error code rather than its message.
+
+    mysql-connector raises a deadlock as InternalError and a lock wait timeout
+    as DatabaseError (not OperationalError), so callers catch DBAPIError.
+    """
+    orig = getattr(exc, "orig", exc)
+    if getattr(orig, "errno", None) in MYSQL_RETRYABLE or getattr(orig, "sqlstate", None) == SERIALIZATION_FAILURE:
+        return True
+    code = getattr(orig, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in SQLITE_RETRYABLE  # extended codes keep the primary code in the low byte
+    return False
+
+
+def backoff(attempt):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def reserve_bed(hospital_id, bed_type, patient_id, doctor_id=None, max_attempts=MAX_ATTEMPTS, on_reserved=None,
+                **booking_fields):
+    """Take one bed (and optionally one doctor slot) and create a confirmed booking.
+
+    Everything happens in one transaction: either the booking row exists and the
+    counters were decremented, or nothing changed. `on_reserved(booking)` runs
+    inside that transaction after the booking is flushed; raising a
+    ReservationError from it rolls everything back. Returns the committed Booking.
+    """
+    available_column(bed_type)
+    for attempt in range(max_attempts):
+        try:
+            if not take_bed(hospital_id, bed_type):
+                raise NoBedsAvailable()
+            rollups.bump(hospital_id, bed_type, available=-1)
+            if doctor_id:
+                take_doctor(hospital_id, doctor_id)
+            booking = Booking(
+                patient_id=patient_id,
+                hospital_id=hospital_id,
+                bed_type=bed_type,
+                doctor_id=doctor_id or None,
+                status="confirmed",
+                **booking_fields,
+            )
+            db.session.add(booking)
+            if on_reserved:
+                db.session.flush()
+                on_reserved(booking)
+            db.session.commit()
+            hospital_cache.invalidate_hospital(hospital_id, kind="counts")
+            return booking
+        except ReservationError:
+            db.session.rollback()
+            raise
+        except DBAPIError as exc:
+            db.session.rollback()
+            if not is_retryable(exc) or attempt == max_attempts - 1:
+                raise
+            backoff(attempt)
+
+
+# --- batches ---
+MISMATCH = "Idempotency key already used for a different booking."
+
+
+def bookings_by_key(patient_id, keys):
+    """{key: row} of this account's bookings made with any of the idempotency keys."""
+    if not keys:
+        return {}
+    rows = db.session.execute(
+        select(Booking.id, Booking.idempotency_key, Booking.hospital_id, Booking.bed_type, Booking.status)
+        .where(Booking.patient_id == patient_id, Booking.idempotency_key.in_(keys))
+    )
+    return {r.idempotency_key: r for r in rows}
+
+
+def reserve_group(hospital_id, patient_id, items):
+    """Book every item at one hospital in one transaction; returns [(booking_id, error)] per item.
+
+    An item that can't be served fails alone: its conditional UPDATE changed
+    nothing (or is undone) and the others still commit. When a bed type has
+    enough beds left for all of its items, they are taken with one UPDATE.
+    Lock conflicts retry the whole group; IntegrityError (a concurrent request
+    used one of the keys) is left to reserve_batch.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            errors, rows, taken = [], [], Counter()  # errors: per item, None if booked
+            # items without a doctor take their beds in one UPDATE per bed type when
+            # there are enough; otherwise (and with a doctor) bed by bed below
+            prepaid = Counter(item["bed_type"] for item in items if not item.get("doctor_id"))
+            for bed_type, n in list(prepaid.items()):
+                if n == 1 or not take_bed(hospital_id, bed_type, n):
+                    del prepaid[bed_type]
+            for item in items:
+                bed_type = item["bed_type"]
+                try:
+                    if prepaid[bed_type] and not item.get("doctor_id"):
+                        prepaid[bed_type] -= 1
+                    elif not take_bed(hospital_id, bed_type):
+                        raise NoBedsAvailable()
+                    if item.get("doctor_id"):
+                        try:
+                            take_doctor(hospital_id, item["doctor_id"])
+                        except ReservationError:
+                            give_back_bed(hospital_id, bed_type)
+                            raise
+                except ReservationError as e:
+                    errors.append(e.message)
+                    continue
+                taken[bed_type] += 1
+                rows.append(dict(item.get("fields", {}), patient_id=patient_id, hospital_id=hospital_id,
+                                 bed_type=bed_type, doctor_id=item.get("doctor_id") or None, status="confirmed",
+                                 idempotency_key=item["key"]))
+                errors.append(None)
+            for bed_type, n in taken.items():
+                rollups.bump(hospital_id, bed_type, available=-n)
+            ids = {}
+            if rows:
+                # one executemany; the new ids come back through the (patient, key) index
+                db.session.execute(insert(Booking), rows)
+                ids = bookings_by_key(patient_id, [r["idempotency_key"] for r in rows])
+            outcomes = [(None, error) if error else (ids[item["key"]].id, None) for item, error in zip(items, errors)]
+            db.session.commit()
+            if taken:
+                hospital_cache.invalidate_hospital(hospital_id, kind="counts")
+            return outcomes
+        except IntegrityError:
+            db.session.rollback()
+            raise
+        except DBAPIError as exc:
+            db.session.rollback()
+            if not is_retryable(exc) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            backoff(attempt)
+
+
+def replay(item, row):
+    """Result for an item whose key already has a booking."""
+    if (row.hospital_id, row.bed_type) != (item["hospital_id"], item["bed_type"]):
+        return {"key": item["key"], "outcome": "failed", "error": MISMATCH}
+    return {"key": item["key"], "outcome": "replayed", "booking_id": row.id,
+            "hospital_id": row.hospital_id, "bed_type": row.bed_type, "status": row.status}
+
+
+def reserve_batch(patient_id, items):
+    """Reserve one bed per item for patient_id; returns one result dict per item, in order.
+
+    items are dicts with key, hospital_id, bed_type and optional doctor_id and
+    fields (Booking columns such as name/contact). Results have an outcome of
+    "created", "replayed" (the key was used before, in an earlier call or
+    earlier in this batch) or "failed" with an error message. Hospitals are
+    processed in id order, one transaction each. Unlike the booking form, a
+    full hospital doesn't waitlist: the caller decides where to send the patient.
+    """
+    if not items:
+        return []
+    results = [None] * len(items)
+    existing = bookings_by_key(patient_id, list({item["key"] for item in items}))
+    known = set(db.session.scalars(
+        select(Hospital.id).where(Hospital.id.in_(list({item["hospital_id"] for item in items})))
+    ))
+    first, groups = {}, defaultdict(list)  # key -> first index; hospital_id -> [index]
+    for n, item in enumerate(items):
+        if item["key"] in existing:
+            results[n] = replay(item, existing[item["key"]])
+        elif item["key"] in first:
+            continue  # settled once the first item with this key is
+        elif item["hospital_id"] not in known:
+            results[n] = {"key": item["key"], "outcome": "failed", "error": "Hospital not found."}
+        else:
+            groups[item["hospital_id"]].append(n)
+        first.setdefault(item["key"], n)
+
+    for hospital_id in sorted(groups):
+        pending = groups[hospital_id]
+        while pending:
+            try:
+                outcomes = reserve_group(hospital_id, patient_id, [items[n] for n in pending])
+            except IntegrityError:
+                # another request committed one of these keys first: replay those, book the rest
+                raced = bookings_by_key(patient_id, [items[n]["key"] for n in pending])
+                if not raced:
+                    raise
+                for n in pending:
+                    if items[n]["key"] in raced:
+                        results[n] = replay(items[n], raced[items[n]["key"]])
+                pending = [n for n in pending if results[n] is None]
+                continue
+            for n, (booking_id, error) in zip(pending, outcomes):
+                item = items[n]
+                results[n] = ({"key": item["key"], "outcome": "failed", "error": error} if error else
+                              {"key": item["key"], "outcome": "created", "booking_id": booking_id,
+                               "hospital_id": hospital_id, "bed_type": item["bed_type"], "status": "confirmed"})
+            pending = []
+
+    for n, item in enumerate(items):
+        if results[n] is None:  # repeated key within the batch
+            original = items[first[item["key"]]]
+            if (original["hospital_id"], original["bed_type"]) != (item["hospital_id"], item["bed_type"]):
+                results[n] = {"key": item["key"], "outcome": "failed", "error": MISMATCH}
+            elif results[first[item["key"]]]["outcome"] == "created":
+                results[n] = dict(results[first[item["key"]]], outcome="replayed")
+            else:
+                results[n] = results[first[item["key"]]]
+    return results
@@ -0,0 +1,266 @@
+# rollups.py
+# Pre-aggregated occupancy and booking analytics for the admin dashboard.
+#
+# occupancy_rollup holds total/available beds per (city, bed type). It is bumped
+# by the same transaction that moves a hospital counter (reserve_bed, cancel /
+# discharge, capacity edits), so it is always as fresh as the counters and the
+# dashboard reads O(cities x bed types) rows instead of scanning hospitals.
+#
+# booking_hourly (new bookings per hour) and utilization_samples (system-wide
+# occupancy per hour) are filled by compact(): it folds bookings newer than a
+# stored id watermark, so each run costs O(new bookings). Run it from a
+# scheduler with `flask rollups compact --every 60`; the dashboard also runs it
+# when the last compaction is older than ROLLUP_MAX_AGE seconds.
+#
+# compact(rebuild=True) recomputes everything from hospitals and bookings, for
+# drift (e.g. counters edited by hand) or after bulk ingestion. Migration 8
+# seeds occupancy_rollup on upgraded databases, and dashboard() rebuilds it when
+# it reads the table empty while hospitals exist, so the check costs nothing on
+# the usual path.
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, update, insert, delete, func, bindparam
+
+from models import (db, BED_TYPES, Hospital, Booking, OccupancyRollup, BookingHourly, UtilizationSample,
+                    RollupState)
+
+FOLD_BATCH = 10000
+
+
+def db_now():
+    """The database's clock, in the zone CURRENT_TIMESTAMP fills bookings.created_at with."""
+    return db.session.execute(select(func.now())).scalar()
+
+
+def current_hour():
+    """Start of the current hour by the database's clock, comparable with bookings.created_at."""
+    return db_now().replace(minute=0, second=0, microsecond=0)
+
+
+# --- state watermarks ---
+def get_state(name):
+    return db.session.execute(select(RollupState.value).where(RollupState.name == name)).scalar() or 0
+
+
+def set_state(name, value, seen=None):
+    """Store a watermark; with `seen`, only if nobody moved it meanwhile. Returns False if it had moved."""
+    q = update(RollupState).where(RollupState.name == name)
+    if seen is not None:
+        q = q.where(func.coalesce(RollupState.value, 0) == seen)
+    if db.session.execute(q.values(value=value)).rowcount == 1:
+        return True
+    if db.session.get(RollupState, name) is not None:
+        return False
+    db.session.add(RollupState(name=name, value=value))
+    return True
+
+
+# --- occupancy ---
+def city_rows(*criteria, conn=None):
+    """(city_norm, city, hospitals, {bed_type: (total, available)}) per city, aggregated from hospitals."""
+    cols = [Hospital.city_norm, func.max(Hospital.city).label("city"), func.count().label("n")]
+    for t in BED_TYPES:
+        cols += [func.sum(getattr(Hospital, f"{t}_total")), func.sum(getattr(Hospital, f"{t}_available"))]
+    q = select(*cols).where(*criteria).group_by(Hospital.city_norm)
+    for row in (conn or db.session).execute(q):
+        beds = {t: (row[3 + 2 * i] or 0, row[4 + 2 * i] or 0) for i, t in enumerate(BED_TYPES)}
+        yield row.city_norm or "", row.city, row.n, beds
+
+
+def write_city_rows(rows, conn=None):
+    params = [
+        {"city_norm": norm, "bed_type": t, "city": city, "hospitals": n, "total": total, "available": avail}
+        for norm, city, n, beds in rows
+        for t, (total, avail) in beds.items()
+    ]
+    if params:
+        (conn or db.session).execute(insert(OccupancyRollup), params)
+
+
+def refresh_cities(city_norms):
+    """Recompute the rollup rows of these cities from hospitals (caller commits)."""
+    city_norms = sorted({c or "" for c in city_norms})
+    db.session.execute(delete(OccupancyRollup).where(OccupancyRollup.city_norm.in_(city_norms)))
+    write_city_rows(list(city_rows(Hospital.city_norm.in_(city_norms))))
+
+
+def bump(hospital_id, bed_type, available=0, total=0):
+    """Shift the rollup row of this hospital's city in the current transaction (caller commits)."""
+    city = select(Hospital.city_norm).where(Hospital.id == hospital_id).scalar_subquery()
+    result = db.session.execute(
+        update(OccupancyRollup)
+        .where(OccupancyRollup.city_norm == city, OccupancyRollup.bed_type == bed_type)
+        .values(total=OccupancyRollup.total + total, available=OccupancyRollup.available + available)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        # city not rolled up yet (hospital predates the rollup, or created outside the app)
+        refresh_cities([db.session.execute(select(Hospital.city_norm).where(Hospital.id == hospital_id)).scalar()])
+
+
+def rebuild_occupancy(conn=None):
+    """Recompute every city's rollup rows from hospitals (caller commits); conn defaults to the session."""
+    (conn or db.session).execute(delete(OccupancyRollup))
+    write_city_rows(list(city_rows(conn=conn)), conn=conn)
+
+
+def occupancy_missing():
+    """True if hospitals exist but occupancy_rollup is empty (a database created outside the migrations)."""
+    return (db.session.execute(select(OccupancyRollup.city_norm).limit(1)).first() is None
+            and db.session.execute(select(Hospital.id).limit(1)).first() is not None)
+
+
+# --- bookings per hour ---
+def fold_bookings(rebuild=False):
+    """Add bookings past the watermark to booking_hourly; returns how many were folded.
+
+    The id watermark assumes bookings commit roughly in id order, which holds
+    for the short booking transactions; a rebuild re-aggregates from scratch.
+    """
+    if rebuild:
+        db.session.execute(delete(BookingHourly))
+    seen = 0 if rebuild else get_state("bookings_folded")
+    last, folded, counts = seen, 0, Counter()
+    while True:
+        rows = db.session.execute(
+            select(Booking.id, Booking.created_at, Booking.bed_type)
+            .where(Booking.id > last).order_by(Booking.id).limit(FOLD_BATCH)
+        ).all()
+        for r in rows:
+            if r.created_at and r.bed_type:
+                counts[(r.created_at.replace(minute=0, second=0, microsecond=0), r.bed_type)] += 1
+        folded += len(rows)
+        if len(rows) < FOLD_BATCH:
+            break
+        last = rows[-1].id
+    if rows:
+        last = rows[-1].id
+    if not folded:
+        if rebuild:
+            set_state("bookings_folded", 0)
+        return 0
+
+    hours = {h for h, _ in counts}
+    existing = {
+        (r.hour, r.bed_type)
+        for r in db.session.execute(select(BookingHourly.hour, BookingHourly.bed_type)
+                                    .where(BookingHourly.hour.in_(hours)))
+    }
+    old = [{"h": h, "t": t, "n": n} for (h, t), n in counts.items() if (h, t) in existing]
+    new = [{"hour": h, "bed_type": t, "booked": n} for (h, t), n in counts.items() if (h, t) not in existing]
+    if old:
+        db.session.execute(
+            update(BookingHourly.__table__)
+            .where(BookingHourly.hour == bindparam("h"), BookingHourly.bed_type == bindparam("t"))
+            .values(booked=BookingHourly.booked + bindparam("n")),
+            old,
+        )
+    if new:
+        db.session.execute(insert(BookingHourly), new)
+    if not set_state("bookings_folded", last, seen=None if rebuild else seen):
+        db.session.rollback()  # another compactor folded these first
+        return 0
+    return folded
+
+
+# --- utilization trend ---
+def sample_utilization(hour=None):
+    """Record current system-wide totals per bed type for this hour, from the rollup."""
+    hour = hour or current_hour()
+    rows = db.session.execute(
+        select(OccupancyRollup.bed_type, func.sum(OccupancyRollup.total), func.sum(OccupancyRollup.available))
+        .group_by(OccupancyRollup.bed_type)
+    ).all()
+    db.session.execute(delete(UtilizationSample).where(UtilizationSample.hour == hour))
+    if rows:
+        db.session.execute(insert(UtilizationSample), [
+            {"hour": hour, "bed_type": t, "total": total or 0, "available": avail or 0} for t, total, avail in rows
+        ])
+
+
+def compact(rebuild=False):
+    """Fold new bookings, sample utilization (and with rebuild, recompute occupancy); returns stats."""
+    started = time.perf_counter()
+    if rebuild:
+        rebuild_occupancy()
+    folded = fold_bookings(rebuild=rebuild)
+    sample_utilization()
+    set_state("compacted_at", int(time.time()))
+    db.session.commit()
+    return {"folded": folded, "rebuilt": rebuild, "seconds": time.perf_counter() - started}
+
+
+def compact_if_stale(max_age):
+    if time.time() - get_state("compacted_at") >= max_age:
+        return compact()
+    return None
+
+
+# --- reads ---
+def dashboard(hours=48):
+    """Everything the admin dashboard shows, read from the rollup tables only."""
+    since = current_hour() - timedelta(hours=hours)
+    rows = db.session.execute(
+        select(OccupancyRollup).order_by(OccupancyRollup.city_norm, OccupancyRollup.bed_type)
+    ).scalars().all()
+    if not rows and occupancy_missing():
+        rebuild_occupancy()
+        db.session.commit()
+        rows = db.session.execute(
+            select(OccupancyRollup).order_by(OccupancyRollup.city_norm, OccupancyRollup.bed_type)
+        ).scalars().all()
+    occupancy = [
+        {"city": r.city or r.city_norm, "bed_type": r.bed_type, "hospitals": r.hospitals,
+         "total": r.total or 0, "available": r.available or 0}
+        for r in rows
+    ]
+    totals = {t: {"total": 0, "available": 0} for t in BED_TYPES}
+    for o in occupancy:
+        totals[o["bed_type"]]["total"] += o["total"]
+        totals[o["bed_type"]]["available"] += o["available"]
+    hourly = [
+        {"hour": r.hour.isoformat(), "bed_type": r.bed_type, "booked": r.booked}
+        for r in db.session.execute(
+            select(BookingHourly).where(BookingHourly.hour >= since).order_by(BookingHourly.hour)
+        ).scalars()
+    ]
+    trend = [
+        {"hour": r.hour.isoformat(), "bed_type": r.bed_type, "total": r.total, "available": r.available}
+        for r in db.session.execute(
+            select(UtilizationSample).where(UtilizationSample.hour >= since).order_by(UtilizationSample.hour)
+        ).scalars()
+    ]
+    return {"occupancy": occupancy, "totals": totals, "bookings_per_hour": hourly, "utilization": trend}
+
+
+# --- CLI ---
+@click.group("rollups")
+def rollups_cli():
+    """Analytics rollups for the admin dashboard."""
+
+
+@rollups_cli.command("compact")
+@click.option("--rebuild", is_flag=True, help="recompute all rollups from hospitals and bookings")
+@click.option("--every", type=float, default=0, help="repeat every N seconds")
+@with_appcontext
+def compact_command(rebuild, every):
+    """Fold new bookings into the hourly rollup and sample utilization."""
+    while True:
+        stats = compact(rebuild=rebuild)
+        click.echo(f"folded {stats['folded']} bookings{' (rebuilt)' if rebuild else ''} "
+                   f"in {stats['seconds'] * 1000:.1f} ms")
+        db.session.remove()
+        if not every:
+            break
+        rebuild = False
+        time.sleep(every)
+
+
+def init_app(app):
+    app.config.setdefault("ROLLUP_MAX_AGE", int(os.environ.get("ROLLUP_MAX_AGE", 60)))
+    app.cli.add_command(rollups_cli)
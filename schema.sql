@@ -1,6 +1,17 @@
 CREATE DATABASE IF NOT EXISTS covid_beds CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 USE covid_beds;
 
+-- schema version (see migrations.py); this file is the schema after migration 8
+CREATE TABLE schema_migrations (
+  version INT PRIMARY KEY,
+  description VARCHAR(255),
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO schema_migrations (version, description) VALUES
+  (1, 'baseline schema'), (2, 'secondary indexes'), (3, 'check constraints'),
+  (4, 'booking idempotency keys'), (5, 'waitlist columns'), (6, 'booking doctors'),
+  (7, 'search backfill'), (8, 'occupancy rollup');
+
 CREATE TABLE users (
   id INT AUTO_INCREMENT PRIMARY KEY,
   name VARCHAR(150) NOT NULL,
@@ -17,6 +28,7 @@ CREATE TABLE hospitals (
   name VARCHAR(255) NOT NULL,
   address TEXT,
   city VARCHAR(100),
+  city_norm VARCHAR(100),
   contact VARCHAR(50),
   icu_total INT DEFAULT 0,
   oxygen_total INT DEFAULT 0,
@@ -26,7 +38,27 @@ CREATE TABLE hospitals (
   oxygen_available INT DEFAULT 0,
   normal_available INT DEFAULT 0,
   ventilator_available INT DEFAULT 0,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  latitude DOUBLE,
+  longitude DOUBLE,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  listing_rank SMALLINT GENERATED ALWAYS AS (CASE WHEN name = 'STAR Hospital' THEN 0 ELSE 1 END) VIRTUAL,
+  INDEX ix_hospitals_city_norm_id (city_norm, id),
+  INDEX ix_hospitals_name_city (name, city),
+  INDEX ix_hospitals_listing (listing_rank, id),
+  CONSTRAINT ck_hospitals_icu_beds CHECK (icu_total >= 0 AND icu_available >= 0 AND icu_available <= icu_total),
+  CONSTRAINT ck_hospitals_oxygen_beds CHECK (oxygen_total >= 0 AND oxygen_available >= 0 AND oxygen_available <= oxygen_total),
+  CONSTRAINT ck_hospitals_normal_beds CHECK (normal_total >= 0 AND normal_available >= 0 AND normal_available <= normal_total),
+  CONSTRAINT ck_hospitals_ventilator_beds CHECK (ventilator_total >= 0 AND ventilator_available >= 0 AND ventilator_available <= ventilator_total),
+  CONSTRAINT ck_hospitals_coordinates CHECK (latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180)
+);
+
+CREATE TABLE hospital_tokens (
+  field VARCHAR(10) NOT NULL,
+  token VARCHAR(64) NOT NULL,
+  hospital_id INT NOT NULL,
+  PRIMARY KEY (field, token, hospital_id),
+  INDEX ix_hospital_tokens_hospital_id (hospital_id),
+  FOREIGN KEY (hospital_id) REFERENCES hospitals(id) ON DELETE CASCADE
 );
 
 CREATE TABLE bookings (
@@ -39,7 +71,12 @@ CREATE TABLE bookings (
   contact VARCHAR(50),
   symptoms TEXT,
   id_proof VARCHAR(255),
+  idempotency_key VARCHAR(64),
+  doctor_id INT DEFAULT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_bookings_patient_created (patient_id, created_at),
+  INDEX ix_bookings_hospital_type_status (hospital_id, bed_type, status),
+  UNIQUE INDEX ix_bookings_patient_idempotency (patient_id, idempotency_key),
   FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
   FOREIGN KEY (hospital_id) REFERENCES hospitals(id) ON DELETE CASCADE
 );
@@ -48,6 +85,46 @@ CREATE TABLE waitlist (
   id INT AUTO_INCREMENT PRIMARY KEY,
   patient_id INT NOT NULL,
   bed_type ENUM('icu','oxygen','normal','ventilator') NOT NULL,
+  city_norm VARCHAR(100) DEFAULT '',
+  priority INT DEFAULT 0,
+  status ENUM('waiting','allocated','cancelled') DEFAULT 'waiting',
+  name VARCHAR(150),
+  contact VARCHAR(50),
+  booking_id INT DEFAULT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE
+  INDEX ix_waitlist_status_id (status, id),
+  INDEX ix_waitlist_patient_status (patient_id, status),
+  FOREIGN KEY (patient_id) REFERENCES users(id) ON DELETE CASCADE,
+  FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE SET NULL
+);
+
+-- analytics rollups (see rollups.py)
+CREATE TABLE occupancy_rollup (
+  city_norm VARCHAR(100) NOT NULL,
+  bed_type ENUM('icu','oxygen','normal','ventilator') NOT NULL,
+  city VARCHAR(100),
+  hospitals INT DEFAULT 0,
+  total INT DEFAULT 0,
+  available INT DEFAULT 0,
+  PRIMARY KEY (city_norm, bed_type)
+);
+
+CREATE TABLE booking_hourly (
+  hour DATETIME NOT NULL,
+  bed_type ENUM('icu','oxygen','normal','ventilator') NOT NULL,
+  booked INT DEFAULT 0,
+  PRIMARY KEY (hour, bed_type)
+);
+
+CREATE TABLE utilization_samples (
+  hour DATETIME NOT NULL,
+  bed_type ENUM('icu','oxygen','normal','ventilator') NOT NULL,
+  total INT DEFAULT 0,
+  available INT DEFAULT 0,
+  PRIMARY KEY (hour, bed_type)
+);
+
+CREATE TABLE rollup_state (
+  name VARCHAR(50) PRIMARY KEY,
+  value INT DEFAULT 0
 );
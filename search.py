@@ -0,0 +1,224 @@
+# search.py
+# Indexed hospital search.
+#
+# `ilike('%city%')` can't use an index, so every search was a full scan. Instead
+# we keep:
+#   * hospitals.city_norm  - normalized city, indexed; exact and prefix matches
+#                            become an index range scan (city_norm >= c AND < c + U+FFFF)
+#   * hospital_tokens      - (field, token, hospital_id) for every normalized word
+#                            of name/address/city; a query word is a range scan on
+#                            the primary key, multiple words are intersected.
+# Both are maintained by mapper events, so ORM inserts/updates stay in sync.
+# Bulk Core inserts must call index_rows() themselves.
+# On MySQL an optional FULLTEXT index on (name, address) is used for `q` when
+# SEARCH_FULLTEXT=1 and `flask search reindex --fulltext` has created it.
+import os
+import re
+import unicodedata
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, delete, insert, text, func, bindparam
+
+from models import db, Hospital, HospitalToken
+
+TOKEN_FIELDS = ("name", "address", "city")
+MAX_TOKEN_LEN = 64
+PREFIX_END = "\uffff"  # sorts after any real character
+_non_word = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize(value):
+    """Lower-case, strip accents and punctuation, collapse whitespace."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(_non_word.sub(" ", value.lower()).split())
+
+
+def tokenize(value):
+    return {w[:MAX_TOKEN_LEN] for w in normalize(value).split() if w}
+
+
+def token_rows(hospital_id, name, address, city):
+    rows = []
+    for field, value in zip(TOKEN_FIELDS, (name, address, city)):
+        rows.extend({"field": field, "token": t, "hospital_id": hospital_id} for t in tokenize(value))
+    return rows
+
+
+def index_rows(connection, hospitals):
+    """(Re)write tokens for an iterable of (id, name, address, city)."""
+    hospitals = list(hospitals)
+    if not hospitals:
+        return
+    ids = [h[0] for h in hospitals]
+    connection.execute(delete(HospitalToken).where(HospitalToken.hospital_id.in_(ids)))
+    rows = [r for h in hospitals for r in token_rows(*h)]
+    if rows:
+        connection.execute(insert(HospitalToken), rows)
+
+
+def reindex_batch(connection, last_id, batch_size):
+    """Refill city_norm and tokens for the next batch_size hospitals after last_id; returns the batch."""
+    batch = connection.execute(
+        select(Hospital.id, Hospital.name, Hospital.address, Hospital.city)
+        .where(Hospital.id > last_id).order_by(Hospital.id).limit(batch_size)
+    ).all()
+    if not batch:
+        return batch
+    connection.execute(
+        Hospital.__table__.update()
+        .where(Hospital.id == bindparam("hid"))
+        .values(city_norm=bindparam("norm")),
+        [{"hid": h.id, "norm": normalize(h.city)} for h in batch],
+    )
+    index_rows(connection, batch)
+    return batch
+
+
+# --- keep city_norm / tokens in sync with ORM writes ---
+@event.listens_for(Hospital, "before_insert")
+@event.listens_for(Hospital, "before_update")
+def _set_city_norm(mapper, connection, target):
+    target.city_norm = normalize(target.city)
+
+
+@event.listens_for(Hospital, "after_insert")
+def _index_inserted(mapper, connection, target):
+    index_rows(connection, [(target.id, target.name, target.address, target.city)])
+
+
+@event.listens_for(Hospital, "after_update")
+def _index_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[f].history.has_changes() for f in TOKEN_FIELDS):
+        index_rows(connection, [(target.id, target.name, target.address, target.city)])
+
+
+# --- queries ---
+def prefix_range(column, prefix):
+    return (column >= prefix) & (column < prefix + PREFIX_END)
+
+
+def token_frequency(word, fields, cap=1000):
+    """Number of tokens starting with word, counted only up to cap (an index-only probe)."""
+    probe = (select(HospitalToken.hospital_id)
+             .where(HospitalToken.field.in_(fields), prefix_range(HospitalToken.token, word))
+             .limit(cap).subquery())
+    return db.session.execute(select(func.count()).select_from(probe)).scalar()
+
+
+def token_match(words, field=None):
+    """Filter conditions matching hospitals with a token starting with every word.
+
+    The rarest word drives an index range scan; the others are checked per
+    candidate through the hospital_id index instead of intersecting large id sets.
+    """
+    fields = [field] if field else list(TOKEN_FIELDS)
+    words = sorted({w[:MAX_TOKEN_LEN] for w in words})
+    if len(words) > 1:
+        words.sort(key=lambda w: token_frequency(w, fields))
+    first, rest = words[0], words[1:]
+    conditions = [Hospital.id.in_(
+        select(HospitalToken.hospital_id)
+        .where(HospitalToken.field.in_(fields), prefix_range(HospitalToken.token, first))
+    )]
+    for word in rest:
+        conditions.append(
+            select(HospitalToken.hospital_id)
+            .where(HospitalToken.hospital_id == Hospital.id,
+                   HospitalToken.field.in_(fields),
+                   prefix_range(HospitalToken.token, word))
+            .exists()
+        )
+    return conditions
+
+
+def filter_city(query, city):
+    """Restrict a Hospital query to a city.
+
+    Fast path: exact/prefix match on the indexed city_norm ("pun" -> "Pune",
+    "new del" -> "New Delhi"). If that finds nothing, fall back to word-prefix
+    matches inside the city ("delhi" -> "New Delhi") via the token index.
+    """
+    c = normalize(city)
+    if not c:
+        return query
+    fast = query.filter(prefix_range(Hospital.city_norm, c))
+    if db.session.query(fast.with_entities(Hospital.id).limit(1).exists()).scalar():
+        return fast
+    return query.filter(*token_match(c.split(), field="city"))
+
+
+def use_fulltext():
+    return (os.environ.get("SEARCH_FULLTEXT", "0") == "1"
+            and db.engine.dialect.name == "mysql")
+
+
+def filter_text(query, q):
+    """Restrict a Hospital query to hospitals whose name/address/city words start with every word of q."""
+    words = normalize(q).split()
+    if not words:
+        return query
+    if use_fulltext():
+        boolean = " ".join(f"+{w}*" for w in words)
+        return query.filter(text("MATCH (hospitals.name, hospitals.address) AGAINST (:ft IN BOOLEAN MODE)")
+                            .bindparams(ft=boolean))
+    return query.filter(*token_match(words))
+
+
+def search_hospitals(city=None, q=None, page=1, per_page=20):
+    """Paginated search; returns (hospitals, has_next). Ordered by id for a stable page order."""
+    page = max(1, page)
+    per_page = max(1, min(per_page, 100))
+    query = filter_text(filter_city(Hospital.query, city), q)
+    rows = query.order_by(Hospital.id.asc()).offset((page - 1) * per_page).limit(per_page + 1).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+# --- CLI: flask search reindex ---
+@click.group("search")
+def search_cli():
+    """Search index maintenance."""
+
+
+@search_cli.command("reindex")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--fulltext", is_flag=True, help="also create the MySQL FULLTEXT index on name/address")
+@with_appcontext
+def reindex(batch_size, fulltext):
+    """Add city_norm/hospital_tokens if missing and rebuild them from hospitals."""
+    engine = db.engine
+    columns = {c["name"] for c in inspect(engine).get_columns("hospitals")}
+    with engine.begin() as conn:
+        if "city_norm" not in columns:
+            conn.execute(text("ALTER TABLE hospitals ADD COLUMN city_norm VARCHAR(100)"))
+            conn.execute(text("CREATE INDEX ix_hospitals_city_norm_id ON hospitals (city_norm, id)"))
+            click.echo("added hospitals.city_norm")
+    HospitalToken.__table__.create(engine, checkfirst=True)
+
+    last_id, done = 0, 0
+    while True:
+        with engine.begin() as conn:
+            batch = reindex_batch(conn, last_id, batch_size)
+        if not batch:
+            break
+        last_id = batch[-1].id
+        done += len(batch)
+        click.echo(f"indexed {done} hospitals")
+
+    if fulltext:
+        if engine.dialect.name != "mysql":
+            click.echo("FULLTEXT index only supported on MySQL; skipped")
+        else:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE FULLTEXT INDEX ft_hospitals_name_address ON hospitals (name, address)"))
+            click.echo("created FULLTEXT index (enable with SEARCH_FULLTEXT=1)")
+    count = db.session.query(func.count(HospitalToken.token)).scalar()
+    click.echo(f"done: {done} hospitals, {count} tokens")
+
+
+def init_app(app):
+    app.cli.add_command(search_cli)
@@ -1,8 +1,9 @@
 # seed.py
 from werkzeug.security import generate_password_hash
-from app import app, db, User, Hospital
+from app import create_app, db, User, Hospital
 
 def seed():
+    app = create_app(views=False)
     with app.app_context():
         # admin user
         if not User.query.filter_by(email='admin@example.com').first():
@@ -1,5 +1,6 @@
 # seed_hospitals.py
-from app import db, Hospital, app
+from app import db, Hospital, create_app
+app = create_app(views=False)
 with app.app_context():
     db.session.query(Hospital).delete()  # optional: clear existing
     hospitals = [
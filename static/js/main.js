@@ -1,27 +1,66 @@
 // static/js/main.js
-// Auto-refresh availability for cards with data-hospital-id
-async function refreshAvailability() {
-  document.querySelectorAll('[data-hospital-id]').forEach(async (card) => {
-    const id = card.dataset.hospitalId;
-    try {
-      const res = await fetch(`/api/hospital/${id}/availability`);
-      if (!res.ok) return;
-      const avail = await res.json();
-      card.querySelectorAll('.icu-count').forEach(el => el.textContent = avail.icu);
-      card.querySelectorAll('.oxygen-count').forEach(el => el.textContent = avail.oxygen);
-      card.querySelectorAll('.normal-count').forEach(el => el.textContent = avail.normal);
-      card.querySelectorAll('.vent-count').forEach(el => el.textContent = avail.ventilator);
-    } catch (e) {
-      console.error('refresh error', e);
-    }
+// Auto-refresh availability for cards with data-hospital-id.
+// Uses a single server-sent-events stream that only pushes changed counters
+// when the server runs async workers (<body data-availability-stream="1">);
+// otherwise one batch request per tick (ETag-aware, 304 when nothing changed).
+const REFRESH_MS = 8000;
+
+function availabilityIds() {
+  const ids = new Set();
+  document.querySelectorAll('[data-hospital-id]').forEach(card => ids.add(card.dataset.hospitalId));
+  return Array.from(ids);
+}
+
+function applyAvailability(hospitals) {
+  Object.entries(hospitals || {}).forEach(([id, avail]) => {
+    document.querySelectorAll(`[data-hospital-id="${id}"]`).forEach(card => {
+      if ('icu' in avail) card.querySelectorAll('.icu-count').forEach(el => el.textContent = avail.icu);
+      if ('oxygen' in avail) card.querySelectorAll('.oxygen-count').forEach(el => el.textContent = avail.oxygen);
+      if ('normal' in avail) card.querySelectorAll('.normal-count').forEach(el => el.textContent = avail.normal);
+      if ('ventilator' in avail) card.querySelectorAll('.vent-count').forEach(el => el.textContent = avail.ventilator);
+    });
   });
 }
 
+let availabilityEtag = null;
+async function refreshAvailability() {
+  const ids = availabilityIds();
+  if (!ids.length) return;
+  try {
+    const headers = availabilityEtag ? {'If-None-Match': availabilityEtag} : {};
+    const res = await fetch(`/api/availability?ids=${ids.join(',')}`, {headers, cache: 'no-store'});
+    if (res.status === 304 || !res.ok) return;
+    availabilityEtag = res.headers.get('ETag');
+    const body = await res.json();
+    applyAvailability(body.hospitals);
+  } catch (e) {
+    console.error('refresh error', e);
+  }
+}
+
 let refreshInterval = null;
-function startAutoRefresh() {
+function startPolling() {
   if (refreshInterval) clearInterval(refreshInterval);
   refreshAvailability();
-  refreshInterval = setInterval(refreshAvailability, 8000); // every 8s
+  refreshInterval = setInterval(refreshAvailability, REFRESH_MS);
+}
+
+let availabilityStream = null;
+function startAutoRefresh() {
+  const ids = availabilityIds();
+  if (!ids.length) return;
+  if (!window.EventSource || document.body.dataset.availabilityStream !== '1') return startPolling();
+  availabilityStream = new EventSource(`/api/availability/stream?ids=${ids.join(',')}`);
+  const onMessage = (e) => applyAvailability(JSON.parse(e.data).hospitals);
+  availabilityStream.addEventListener('snapshot', onMessage);
+  availabilityStream.addEventListener('update', onMessage);
+  availabilityStream.onerror = () => {
+    // EventSource reconnects on its own (sending Last-Event-ID); only give up when it is closed
+    if (availabilityStream.readyState === EventSource.CLOSED) {
+      availabilityStream = null;
+      startPolling();
+    }
+  };
 }
 window.addEventListener('load', startAutoRefresh);
 
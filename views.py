@@ -0,0 +1,297 @@
+# views.py
+# HTML pages: listings, accounts, hospital admin, bookings, admin dashboard.
+# Forms are imported inside the views (see forms.py).
+import traceback
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, abort
+from flask_login import login_user, login_required, logout_user, current_user
+from sqlalchemy.orm import joinedload
+
+from models import db, BED_TYPES, Hospital, User, Doctor, Booking
+from reservations import reserve_bed, ReservationError, NoBedsAvailable
+from cache import hospital_cache
+from pagination import clamp_limit, InvalidCursor
+from waitlist import waitlist_engine
+from lifecycle import TransitionError
+from querycount import query_budget
+from dbrouting import read_replica
+from rendering import etag_page
+from listings import hospital_page, booking_page, live_hospital
+from ingest import capacity_update
+import auth
+import lifecycle
+import rollups
+
+bp = Blueprint("pages", __name__)
+
+
+@bp.route("/")
+@read_replica
+@query_budget(4)
+@etag_page
+def index():
+    try:
+        city = request.args.get("city")
+        hospitals, next_cursor = hospital_page("index", city, request.args.get("cursor"),
+                                               clamp_limit(request.args.get("limit", current_app.config["PAGE_SIZE"])))
+        return render_template("index.html", hospitals=hospitals, next_cursor=next_cursor, city=city)
+    except InvalidCursor:
+        abort(400)
+    except Exception:
+        current_app.logger.exception("Error in index route")
+        tb = traceback.format_exc()
+        # show full traceback only in debug mode; otherwise generic message
+        if current_app.debug:
+            return f"<h1>Debug error</h1><pre>{tb}</pre>", 500
+        return render_template("500.html"), 500
+
+
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    from forms import RegisterForm
+    form = RegisterForm()
+    if form.validate_on_submit():
+        existing = auth.find_user_by_email(form.email.data)
+        if existing:
+            flash("Email already registered", "warning")
+            return redirect(url_for("pages.register"))
+        hashed = auth.hasher.hash(form.password.data)
+        user = User(name=form.name.data, email=auth.normalize_email(form.email.data), phone=form.phone.data, password=hashed, role=form.role.data)
+        db.session.add(user)
+        db.session.commit()
+        flash("Registration successful. Please login.", "success")
+        return redirect(url_for("pages.login"))
+    return render_template("register.html", form=form)
+
+
+@bp.route("/login", methods=["GET", "POST"])
+def login():
+    from forms import LoginForm
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = auth.authenticate(form.email.data, form.password.data)
+        if user:
+            login_user(user)
+            flash("Logged in", "success")
+            return redirect(url_for("pages.index"))
+        flash("Invalid credentials", "danger")
+    return render_template("login.html", form=form)
+
+
+@bp.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    flash("Logged out", "info")
+    return redirect(url_for("pages.index"))
+
+
+# HOSPITAL ROUTES
+@bp.route("/hospital/create", methods=["GET", "POST"])
+@login_required
+def create_hospital():
+    from forms import HospitalForm
+    if current_user.role not in ["hospital", "admin"]:
+        flash("Unauthorized", "danger")
+        return redirect(url_for("pages.index"))
+    form = HospitalForm()
+    if form.validate_on_submit():
+        h = Hospital(
+            name=form.name.data,
+            address=form.address.data,
+            city=form.city.data,
+            contact=form.contact.data,
+            icu_total=form.icu_total.data or 0,
+            oxygen_total=form.oxygen_total.data or 0,
+            normal_total=form.normal_total.data or 0,
+            ventilator_total=form.ventilator_total.data or 0,
+            icu_available=form.icu_total.data or 0,
+            oxygen_available=form.oxygen_total.data or 0,
+            normal_available=form.normal_total.data or 0,
+            ventilator_available=form.ventilator_total.data or 0,
+            latitude=form.latitude.data,
+            longitude=form.longitude.data,
+        )
+        db.session.add(h)
+        db.session.flush()
+        rollups.refresh_cities([h.city_norm])
+        db.session.commit()
+        hospital_cache.invalidate_hospital(h.id)
+        if current_user.role == "hospital":
+            db.session.get(User, current_user.id).hospital_id = h.id
+            db.session.commit()
+        flash("Hospital created", "success")
+        return redirect(url_for("pages.index"))
+    return render_template("hospital_dashboard.html", form=form)
+
+
+@bp.route("/hospital/<int:id>/edit", methods=["GET", "POST"])
+@login_required
+def edit_hospital(id):
+    from forms import HospitalForm
+    h = Hospital.query.get_or_404(id)
+    if current_user.role == "hospital" and current_user.hospital_id != h.id:
+        flash("Unauthorized", "danger")
+        return redirect(url_for("pages.index"))
+    form = HospitalForm(obj=h)
+    if form.validate_on_submit():
+        old_city = h.city_norm
+        totals = {t: getattr(form, f"{t}_total").data or 0 for t in BED_TYPES}
+        deltas = {t: totals[t] - (getattr(h, f"{t}_total") or 0) for t in BED_TYPES}
+        h.name = form.name.data
+        h.address = form.address.data
+        h.city = form.city.data
+        h.contact = form.contact.data
+        h.latitude = form.latitude.data
+        h.longitude = form.longitude.data
+        db.session.flush()
+        # counters shift in SQL from the row's current values: a reservation
+        # committed since the form was loaded isn't overwritten
+        db.session.connection().execute(capacity_update(BED_TYPES),
+                                        {"hid": h.id, **{f"new_{t}_total": n for t, n in totals.items()}})
+        db.session.expire(h, [f"{t}_{c}" for t in BED_TYPES for c in ("total", "available")])
+        rollups.refresh_cities([old_city, h.city_norm])
+        db.session.commit()
+        hospital_cache.invalidate_hospital(h.id)
+        freed = [t for t, d in deltas.items() if d > 0]
+        if freed:
+            allocated = waitlist_engine.release(h.id, freed)
+            if allocated:
+                flash(f"{len(allocated)} waitlisted patient(s) allocated", "info")
+        flash("Hospital updated", "success")
+        return redirect(url_for("pages.index"))
+    return render_template("hospital_dashboard.html", form=form, hospital=h)
+
+
+@bp.route("/hospitals")
+@read_replica
+@query_budget(3)
+@etag_page
+def hospitals():
+    city = request.args.get("city")
+    try:
+        hospitals, next_cursor = hospital_page("all", city, request.args.get("cursor"),
+                                               clamp_limit(request.args.get("limit", current_app.config["PAGE_SIZE"])))
+    except InvalidCursor:
+        abort(400)
+    return render_template("hospitals.html", hospitals=hospitals, next_cursor=next_cursor, city=city)
+
+
+def doctor_rows(hospital_id):
+    """Read-only doctor projection for the doctor grid/choices (no ORM objects)."""
+    return db.session.query(
+        Doctor.id, Doctor.name, Doctor.specialization, Doctor.photo,
+        Doctor.available, Doctor.experience, Doctor.age,
+    ).filter(Doctor.hospital_id == hospital_id).order_by(Doctor.name).all()
+
+
+def doctor_label(d):
+    avail_text = "Available" if (d.available or 0) > 0 else "Unavailable"
+    return f"{d.name} — {d.specialization or 'Doctor'} | {d.experience or 0} yrs | Age {d.age or '-'} | {avail_text}"
+
+
+@bp.route("/hospital/<int:id>/beds")
+@read_replica
+@query_budget(3)
+@etag_page
+def hospital_beds(id):
+    h = live_hospital(id)
+    if not h:
+        abort(404)
+    docs = doctor_rows(id)
+    return render_template("hospital_beds.html", hospital=h, doctors=docs)
+
+
+# BOOKINGS
+@bp.route("/book/<int:hospital_id>", methods=["GET", "POST"])
+@query_budget(12)
+@login_required
+def book(hospital_id):
+    from forms import BookingForm
+    h = Hospital.query.get_or_404(hospital_id)
+    form = BookingForm()
+    docs = doctor_rows(h.id)
+    form.doctor_id.choices = [(0, "No preference")] + [(d.id, doctor_label(d)) for d in docs]
+
+    if form.validate_on_submit():
+        try:
+            b = reserve_bed(
+                h.id,
+                form.bed_type.data,
+                patient_id=current_user.id,
+                doctor_id=form.doctor_id.data or None,
+                name=form.name.data,
+                contact=form.contact.data,
+                symptoms=form.symptoms.data,
+                id_proof=form.id_proof.data,
+            )
+        except NoBedsAvailable as e:
+            waitlist_engine.enqueue(current_user.id, form.bed_type.data, city=h.city,
+                                    name=form.name.data, contact=form.contact.data)
+            flash(f"{e.message} You have been added to the waitlist for {h.city or 'any city'}.", "warning")
+            return redirect(url_for("pages.book", hospital_id=h.id))
+        except ReservationError as e:
+            flash(e.message, "danger")
+            return redirect(url_for("pages.book", hospital_id=h.id))
+        flash("Booking Confirmed", "success")
+        return redirect(url_for("pages.booking_success", booking_id=b.id))
+
+    return render_template("book.html", form=form, hospital=h, doctors=docs)
+
+
+@bp.route("/booking/success/<int:booking_id>")
+@query_budget(2)
+@login_required
+def booking_success(booking_id):
+    b = Booking.query.options(joinedload(Booking.hospital).load_only(Hospital.name)).get_or_404(booking_id)
+    if current_user.role == "patient" and b.patient_id != current_user.id:
+        flash("Not authorized", "danger")
+        return redirect(url_for("pages.index"))
+    return render_template("booking_success.html", booking=b)
+
+
+@bp.route("/my_bookings")
+@read_replica
+@query_budget(3)
+@login_required
+def my_bookings():
+    from forms import CancelBookingForm
+    try:
+        bookings, next_cursor = booking_page(current_user.id, request.args.get("cursor"),
+                                             clamp_limit(request.args.get("limit", current_app.config["PAGE_SIZE"])))
+    except InvalidCursor:
+        abort(400)
+    return render_template("my_bookings.html", bookings=bookings, next_cursor=next_cursor,
+                           cancel_form=CancelBookingForm())
+
+
+# BOOKING LIFECYCLE
+@bp.route("/booking/<int:booking_id>/cancel", methods=["POST"])
+@login_required
+@query_budget(20)  # includes waitlist allocation for the freed bed
+def cancel_booking(booking_id):
+    from forms import CancelBookingForm
+    b = Booking.query.get_or_404(booking_id)
+    if b.patient_id != current_user.id and not auth.can_manage_booking(b):
+        flash("Not authorized", "danger")
+        return redirect(url_for("pages.index"))
+    form = CancelBookingForm()
+    if form.validate_on_submit():
+        try:
+            lifecycle.transition(b.id, "cancelled")
+            flash("Booking cancelled", "info")
+        except TransitionError as e:
+            flash(e.message, "warning")
+    return redirect(url_for("pages.my_bookings"))
+
+
+# ADMIN ANALYTICS
+@bp.route("/admin")
+@login_required
+@query_budget(20)  # 5 when the rollups are fresh; a due compaction adds a few
+def admin_dashboard():
+    if current_user.role != "admin":
+        flash("Unauthorized", "danger")
+        return redirect(url_for("pages.index"))
+    rollups.compact_if_stale(current_app.config["ROLLUP_MAX_AGE"])
+    return render_template("admin_dashboard.html", data=rollups.dashboard())
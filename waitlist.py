@@ -0,0 +1,191 @@
+# waitlist.py
+# Waitlist allocation.
+#
+# Patients who find no bed are queued by (bed_type, city). When beds free up
+# (capacity raised, booking cancelled/discharged) the release event pops the
+# best waiting entry - highest priority first, then FIFO - and books it through
+# reservations.reserve_bed(), so allocation obeys the same no-oversell rule as
+# the booking form.
+#
+# Matching uses an in-memory index: one heap per (bed_type, city) plus one per
+# bed_type for patients who accept any city, so a release costs O(log n) and
+# never scans the waitlist table. Each worker keeps its own index, rebuilt from
+# the DB on first use and topped up incrementally (id > last seen) on every
+# event. Entries are claimed with a conditional UPDATE (status 'waiting' ->
+# 'allocated') inside the booking transaction, so two workers can never
+# allocate the same entry; a worker holding a stale entry just drops it.
+import heapq
+import itertools
+import threading
+
+from sqlalchemy import select, update
+
+from models import db, Hospital, Waitlist
+from reservations import reserve_bed, ReservationError, NoBedsAvailable
+import search
+
+ANY_CITY = ""
+
+
+class EntryTaken(ReservationError):
+    message = "Waitlist entry already allocated or cancelled."
+
+
+class WaitlistIndex:
+    """Priority index of waiting entries; pure in-memory, no DB access."""
+
+    def __init__(self):
+        self._heaps = {}
+        self._entries = {}  # id -> entry tuple, only for live entries
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entries
+
+    def push(self, entry_id, bed_type, city, priority=0, payload=None):
+        """Add an entry; lower sort key wins: higher priority, then older id."""
+        entry = (-(priority or 0), entry_id, next(self._seq), bed_type, city or ANY_CITY, payload)
+        self._entries[entry_id] = entry
+        heapq.heappush(self._heaps.setdefault((bed_type, city or ANY_CITY), []), entry)
+
+    def remove(self, entry_id):
+        """Lazy delete: the heap slot is skipped when it reaches the top."""
+        return self._entries.pop(entry_id, None) is not None
+
+    def _head(self, key):
+        heap = self._heaps.get(key)
+        while heap:
+            entry = heap[0]
+            if self._entries.get(entry[1]) is entry:
+                return entry
+            heapq.heappop(heap)  # removed or superseded
+        return None
+
+    def pop(self, bed_type, city):
+        """Best live entry waiting for this bed type in `city` or in any city; None if nobody waits."""
+        heads = (self._head((bed_type, city or ANY_CITY)), self._head((bed_type, ANY_CITY)))
+        candidates = [e for e in heads if e]
+        if not candidates:
+            return None
+        best = min(candidates)
+        heapq.heappop(self._heaps[(best[3], best[4])])
+        del self._entries[best[1]]
+        return best
+
+    def restore(self, entry):
+        """Put back an entry returned by pop() (e.g. the bed was taken meanwhile)."""
+        priority, entry_id, _, bed_type, city, payload = entry
+        self.push(entry_id, bed_type, city, -priority, payload)
+
+    def clear(self):
+        self._heaps.clear()
+        self._entries.clear()
+
+
+class WaitlistEngine:
+    def __init__(self):
+        self.index = WaitlistIndex()
+        self.last_id = 0
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    # --- index maintenance ---
+    def sync(self):
+        """Load waiting entries we haven't seen yet (all of them on first call)."""
+        with self._lock:
+            if not self.loaded:
+                self.index.clear()
+                self.last_id = 0
+            rows = db.session.execute(
+                select(Waitlist.id, Waitlist.bed_type, Waitlist.city_norm, Waitlist.priority,
+                       Waitlist.patient_id, Waitlist.name, Waitlist.contact)
+                .where(Waitlist.status == "waiting", Waitlist.id > self.last_id)
+                .order_by(Waitlist.id)
+            ).all()
+            for r in rows:
+                self.index.push(r.id, r.bed_type, r.city_norm, r.priority, (r.patient_id, r.name, r.contact))
+            if rows:
+                self.last_id = rows[-1].id
+            self.loaded = True
+
+    def rebuild(self):
+        with self._lock:
+            self.loaded = False
+            self.sync()
+
+    # --- commands ---
+    def enqueue(self, patient_id, bed_type, city=None, priority=0, name=None, contact=None):
+        """Add a patient to the waitlist (idempotent per patient/bed type/city); returns the entry."""
+        city_norm = search.normalize(city)
+        entry = Waitlist.query.filter_by(patient_id=patient_id, bed_type=bed_type, city_norm=city_norm,
+                                         status="waiting").first()
+        if entry:
+            return entry
+        entry = Waitlist(patient_id=patient_id, bed_type=bed_type, city_norm=city_norm, priority=priority,
+                         status="waiting", name=name, contact=contact)
+        db.session.add(entry)
+        db.session.commit()
+        return entry
+
+    def cancel(self, entry_id):
+        result = db.session.execute(
+            update(Waitlist).where(Waitlist.id == entry_id, Waitlist.status == "waiting")
+            .values(status="cancelled").execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        with self._lock:
+            self.index.remove(entry_id)
+        return result.rowcount == 1
+
+    def release(self, hospital_id, bed_types):
+        """Beds of these types may have been freed at this hospital: allocate to waiting patients.
+
+        Returns the list of (waitlist_id, booking_id) allocated.
+        """
+        city = db.session.execute(select(Hospital.city_norm).where(Hospital.id == hospital_id)).scalar()
+        allocated = []
+        with self._lock:
+            self.sync()
+            for bed_type in bed_types:
+                while True:
+                    entry = self.index.pop(bed_type, city)
+                    if entry is None:
+                        break
+                    try:
+                        booking = self._allocate(hospital_id, entry)
+                    except NoBedsAvailable:
+                        self.index.restore(entry)
+                        break
+                    if booking:
+                        allocated.append((entry[1], booking.id))
+        return allocated
+
+    def _allocate(self, hospital_id, entry):
+        """Book one bed for an entry; returns None (entry dropped) if it was taken elsewhere.
+
+        Raises NoBedsAvailable when the hospital has no bed of that type left.
+        """
+        _, entry_id, _, bed_type, _, (patient_id, name, contact) = entry
+
+        def claim(booking):
+            result = db.session.execute(
+                update(Waitlist).where(Waitlist.id == entry_id, Waitlist.status == "waiting")
+                .values(status="allocated", booking_id=booking.id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise EntryTaken()
+
+        try:
+            return reserve_bed(hospital_id, bed_type, patient_id=patient_id, on_reserved=claim,
+                               name=name, contact=contact, symptoms="Allocated from waitlist")
+        except NoBedsAvailable:
+            raise
+        except ReservationError:
+            return None
+
+
+waitlist_engine = WaitlistEngine()